@@ -5,11 +5,9 @@ Data pre-processing for FIFA dataset
 """
 
 import numpy as np
-import pandas as pd
 import random
 import math
-from FBTP import players
-from collections import OrderedDict
+from FBTP import players, modules
 
 
 # URLs's from CSV data in GitHub
@@ -17,12 +15,20 @@ url_goalkeepers = 'https://raw.githubusercontent.com/ShenbaoYu/TCFPACN/main/Data
 url_back = 'https://raw.githubusercontent.com/ShenbaoYu/TCFPACN/main/Data/FIFA/Back.csv'
 url_forward = 'https://raw.githubusercontent.com/ShenbaoYu/TCFPACN/main/Data/FIFA/Forward.csv'
 
+# the valid positions of each category
+POSITIONS = {'Back': ['LWB','RWB','LB','LCB','CB','RCB','RB'],
+             'Forward': ['LS','LF','CF','RF','RS','ST','LW','SS','RW',  # Forward
+                         'LAM','CAM','RAM','CM','LM','LCM','RCM','RM','LDM','CDM','RDM']}
+GK_ABILITIES = ['gk_diving', 'gk_handling', 'gk_kicking', 'gk_reflexes', 'gk_speed', 'gk_positioning']
+ABILITY_COLUMNS = slice(44, 73)  # the columns of the players' abilities
+INFO_COLUMNS = ['sofifa_id', 'overall', 'club', 'nationality', 'team_position']  # read with the abilities
+
 def read_criteria(path, criteria_file):
-"""
-- Reads a file containing player evaluation criteria
-(e.g. importance of specific skills for each position).
-- Normalizes the criteria values so that the total sum is 1.
-"""
+    """
+    - Reads a file containing player evaluation criteria
+    (e.g. importance of specific skills for each position).
+    - Normalizes the criteria values so that the total sum is 1.
+    """
     criteria = {}
     with open(path + criteria_file, 'r') as cf:
         while True:
@@ -56,115 +62,143 @@ def get_goalkeepers(url_goalkeepers):
     """
 
     goal_keepers = []
-    
+
     # error handling if reading the CSV file fails
     try:
-        _meta = pd.read_csv(url_goalkeepers, delimiter=',')  # Read the CSV once
+        columns = read_goalkeeper_columns(url_goalkeepers)
     except Exception as e:
         print(f"Error reading the CSV file: {e}")
         return goal_keepers  # Returns an empty list in case of error
 
-    for idx, _data in _meta.iterrows(): # Use the DataFrame read in try-except
-        gk_id = _data['sofifa_id']
+    for gk_id, rating, ability in zip(columns['ids'].tolist(), columns['rating'].tolist(),
+                                      columns['abilities'].tolist()):
         gk = players.Goalkeeper(gk_id)
-        gk.rating = _data['overall']  # the rating
-        # gk.salary = _data['value_eur']  # salary (Euro)
+        gk.rating = rating  # the rating
         gk.salary = 0.0006375 * math.exp(0.1029*gk.rating)  # calculate salary
-        gk.ability = _data.loc[['gk_diving', 'gk_handling', 'gk_kicking',
-                                'gk_reflexes', 'gk_speed', 'gk_positioning']
-                              ].tolist()
+        gk.ability = ability
         goal_keepers.append(gk)
-	
+
     return goal_keepers
 
 
-def read_info(url):
-"""
-- Reads information about players from a CSV file, differentiating between
-defensive (Back) and attacking/midfield (Forward) players.
-- Creates dictionaries to store:
---> Player attributes (club, nationality).
---> Player skills (with their respective values).
---> Player positions.
---> Player ratings.
---> Player IDs.
-- Fills these dictionaries with the data read from the file.
-- For players without a defined position, assigns a random position of the
-list of possible positions for your category (Back or Forward).
+def read_goalkeeper_columns(url_goalkeepers):
+    """
+    - Columnar counterpart of <get_goalkeepers>: reads only the ID, rating and
+    goalkeeping columns, with compact dtypes.
 
     Args:
-        url: URL of the CSV file containing player data.
+        url_goalkeepers: URL of the CSV file containing the goalkeepers' data.
 
     Returns:
-        A tuple containing: ability_name_id, player_attributes, player_abilities_name,
-        player_position, player_rating, player_no_id.
-"""
+        A dict of arrays: ids, rating, salary, abilities (goalkeepers x GK_ABILITIES).
+    """
+    import pandas as pd  # imported on first use, so importing this module stays cheap
+
+    dtype = {'sofifa_id': np.int64, 'overall': np.int16}
+    dtype.update({name: np.float32 for name in GK_ABILITIES})
+    _meta = pd.read_csv(url_goalkeepers, delimiter=',', usecols=['sofifa_id', 'overall'] + GK_ABILITIES,
+                        dtype=dtype)
+
+    rating = _meta['overall'].to_numpy()
+    # math.exp, not np.exp: the salaries must be those of <get_goalkeepers> to the last bit
+    salary = np.array([0.0006375 * math.exp(0.1029*r) for r in rating.tolist()], dtype=np.float64)
+    return {'ids': _meta['sofifa_id'].to_numpy(),
+            'rating': rating,
+            'salary': salary,  # calculate salary
+            'abilities': modules.compact_abilities(_meta[GK_ABILITIES].to_numpy())}
 
-    DIV = 'Back' if 'Back' in url else 'Forward'  # Determines DIV based on URL
 
-    player_attributes = {}  # players attributes, including club and nationality
-    player_abilities_name = OrderedDict()  # personal abilities
-    player_position = {}  # players' position {id:position}
-    player_rating = {}  # players' rating {id:rating}
-    # player_salary = {}  # players' salary {id:salary}
+def read_info(url):
+    """
+    - Reads information about players from a CSV file, differentiating between
+    defensive (Back) and attacking/midfield (Forward) players.
+    - Creates dictionaries to store:
+    --> Player attributes (club, nationality).
+    --> Player skills (with their respective values).
+    --> Player positions.
+    --> Player ratings.
+    --> Player IDs.
+    - The dictionaries are read-only views (modules.ColumnView / RowView) over the
+    arrays of <read_info_columns>.
+    - For players without a defined position, assigns a random position of the
+    list of possible positions for your category (Back or Forward).
+
+        Args:
+            url: URL of the CSV file containing player data.
+
+        Returns:
+            A tuple containing: ability_name_id, player_attributes, player_abilities_name,
+            player_position, player_rating, player_no_id.
+    """
 
+    # error handling if reading the CSV file fails
     try:
-        _meta = pd.read_csv(url, delimiter=',')
+        columns, attrs = read_info_columns(url)
     except Exception as e:
         print(f"Error reading the CSV file: {e}")
         return {}, {}, {}, {}, {}, {}  # Returns empty dictionaries in case of error
 
-    attrs = [column for column in _meta][44:73]
-    ability_name_id = dict(zip(attrs, [i for i in range(len(attrs))]))
-    for att in attrs:
-        player_abilities_name[att] = {}
-
-    player_no_id = {}  # player's number : id
-    for idx, _data in _meta.iterrows():
-        player_no_id[idx] = _data['sofifa_id']  # player's id
-        player_position[idx] = get_position(_data, DIV)  # player's position
-        player_rating[idx] = _data['overall']  # player's rating
-        
-        # player's attributes, including club and nationality
-        player_attributes[idx] = [_data['club'], _data['nationality']]
-        abis = dict(_data.iloc[44:73])
-        for abi, val in abis.items():
-            player_abilities_name[abi][idx] = val
-
-    return ability_name_id,       \
-           player_attributes,     \
-           player_abilities_name, \
-           player_position,       \
-           player_rating,         \
-           player_no_id
+    # the dictionaries are read-only views over the columns
+    return modules.info_views(columns, attrs)
+
+
+def read_info_columns(url):
+    """
+    - Columnar counterpart of <read_info>: reads only the ID, rating, club,
+    nationality, position and ability columns, with compact dtypes.
+    - The positions are validated in one pass; the players without a valid position
+    get a random one, drawn in the same order as <get_position>.
+
+        Args:
+            url: URL of the CSV file containing player data.
+
+        Returns:
+            A dict of arrays: ids, club, nationality, position, rating,
+            abilities (players x abilities), and the ability names.
+    """
+
+    import pandas as pd  # imported on first use, so importing this module stays cheap
+
+    DIV = 'Back' if 'Back' in url else 'Forward'  # Determines DIV based on URL
+
+    attrs = pd.read_csv(url, delimiter=',', nrows=0).columns.tolist()[ABILITY_COLUMNS]
+    dtype = {'sofifa_id': np.int64, 'overall': np.int16,
+             'club': object, 'nationality': object, 'team_position': object}
+    dtype.update({att: np.float32 for att in attrs})  # float, in case of missing values
+    _meta = pd.read_csv(url, delimiter=',', dtype=dtype,
+                        usecols=INFO_COLUMNS + attrs)
+
+    position = _meta['team_position'].to_numpy(dtype=object, copy=True)
+    for idx in np.flatnonzero(~_meta['team_position'].isin(POSITIONS[DIV]).to_numpy()):
+        position[idx] = random.choice(POSITIONS[DIV])  # choose a position randomly
+
+    columns = {'ids': _meta['sofifa_id'].to_numpy(),
+               'club': _meta['club'].to_numpy(dtype=object),
+               'nationality': _meta['nationality'].to_numpy(dtype=object),
+               'position': position,
+               'rating': _meta['overall'].to_numpy(),
+               'abilities': modules.compact_abilities(_meta[attrs].to_numpy())}
+
+    return columns, attrs
 
 
 def get_position(data, div):
-"""
-- Helper function used by <read_info> to get a player's position.
-- If the player's position in the file is valid for their category (Back or Forward), return that position.
-- Otherwise, it randomly chooses a valid position from the list of positions for your category.
-"""
-    if div == 'Back':
-        BA = ['LWB','RWB','LB','LCB','CB','RCB','RB']
-        if not data['team_position'] in BA:
-            return random.choice(BA)  # choose a position randomly
-        else:
-            return data['team_position']
-    elif div == 'Forward':
-        FM = ['LS','LF','CF','RF','RS','ST','LW','SS','RW',  # Forward
-              'LAM','CAM','RAM','CM','LM','LCM','RCM','RM','LDM','CDM','RDM']
-        if not data['team_position'] in FM:
-            return random.choice(FM)  # choose a position randomly
-        else:
-            return data['team_position']
+    """
+    - Helper function used by <read_info> to get a player's position.
+    - If the player's position in the file is valid for their category (Back or Forward), return that position.
+    - Otherwise, it randomly chooses a valid position from the list of positions for your category.
+    """
+    if not data['team_position'] in POSITIONS[div]:
+        return random.choice(POSITIONS[div])  # choose a position randomly
+    else:
+        return data['team_position']
 
 
 def normalize(dict_type):
-"""
-- Helper function used by read_criteria to normalize the values of a dictionary.
-- Divides each value by the total sum of the values, ensuring that the sum of the normalized values is 1.
-"""
+    """
+    - Helper function used by read_criteria to normalize the values of a dictionary.
+    - Divides each value by the total sum of the values, ensuring that the sum of the normalized values is 1.
+    """
     total = sum(v for v in dict_type.values())
     tmp = {}
     for key, value in dict_type.items():
@@ -14,35 +14,61 @@ Data Sources:
 
 Original Data Location:
 https://github.com/ShenbaoYu/TCFPACN 
+(a local copy is read from Data/PES; nothing is downloaded or parsed at import, see <download>)
 
 Note: This script requires the 'FBTP' module (presumably a custom module for football 
 data analysis). Make sure it's installed and accessible within your project.
 """
 
 import os, sys
-BASE_DIR = os.path.dirname(os.path.dirname(os.getcwd())) 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(BASE_DIR)
-sys.path.append('TCFPACN')  # Add the TCFPACN module's path to the search path
 
-import openpyxl  # Library for working with Excel files
 import math
-from FBTP import players  # Custom module for handling player objects
-from collections import OrderedDict  # For maintaining order of player abilities
-import requests # To download the Excel files
+import numpy as np
+from FBTP import players, modules  # Custom module for handling player objects
 
-# URLs of the Excel files to download
+# the local copy of the data; a bare file name is looked up here
+DATA_DIR = os.path.join(BASE_DIR, 'Data', 'PES')
+
+# URLs of the Excel files (see <download>)
 urls = [
     'https://github.com/ShenbaoYu/TCFPACN/raw/main/Data/PES/Goalkeeper.xlsx',
     'https://github.com/ShenbaoYu/TCFPACN/raw/main/Data/PES/Back.xlsx',
     'https://github.com/ShenbaoYu/TCFPACN/raw/main/Data/PES/Forward.xlsx',
 ]
 
-# Download each file and save it locally
-for url in urls:
-    filename = url.split('/')[-1]  
-    response = requests.get(url)
-    with open(filename, 'wb') as f:
-        f.write(response.content)
+# the columns of the "Players" and "GoalKeeper" sheets (0-based)
+ID_COLUMN = 0
+POSITION_COLUMN = 1
+TEAM_COLUMN = 3
+NATIONALITY_COLUMN = 4
+RATING_COLUMN = 9
+ABILITY_COLUMNS = slice(10, 28)  # the target abilities
+GK_ABILITY_COLUMNS = slice(28, None)  # the goalkeepers' skills
+
+
+def download(dest=DATA_DIR):
+    """
+    Downloads the Excel files from GitHub into <dest>.
+    Nothing is downloaded at import; call this once when the local copy is missing.
+    """
+    import requests  # To download the Excel files
+
+    os.makedirs(dest, exist_ok=True)
+    for url in urls:
+        filename = url.split('/')[-1]
+        response = requests.get(url)
+        response.raise_for_status()
+        with open(os.path.join(dest, filename), 'wb') as f:
+            f.write(response.content)
+
+
+def data_path(file_name):
+    """ The path of a data file: <file_name> itself if it exists, else the file in DATA_DIR """
+    if os.path.exists(file_name):
+        return file_name
+    return os.path.join(DATA_DIR, file_name)
 
 
 def read_criteria(path, criteria_file):
@@ -80,23 +106,59 @@ def get_goalkeepers(file_name):
         A list of Goalkeeper objects, each representing a goalkeeper with their 
         ID, rating, calculated salary, and skills.
     """
-    wb = openpyxl.load_workbook(file_name) 
-    ws = wb["GoalKeeper"]
-    
+    columns = read_goalkeeper_columns(file_name)
+
     goal_keepers = []
-    for row in range(2, ws.max_row + 1):  # Start from row 2 to skip headers
-        gk_id = ws.cell(row=row, column=1).value
-        gk = players.Goalkeeper(gk_id)  
-        gk.rating = ws.cell(row=row, column=10).value
+    for gk_id, rating, ability in zip(columns['ids'].tolist(), columns['rating'].tolist(),
+                                      columns['abilities'].tolist()):
+        gk = players.Goalkeeper(gk_id)
+        gk.rating = rating
         gk.salary = 0.0006375 * math.exp(0.1029 * gk.rating)  # Calculate salary based on rating
-        
-        for column in range(29, ws.max_column + 1):  # Read skill values
-            gk.ability.append(ws.cell(row=row, column=column).value)
-        goal_keepers.append(gk)  
+        gk.ability = ability  # skill values
+        goal_keepers.append(gk)
 
     return goal_keepers
 
 
+def read_goalkeeper_columns(file_name):
+    """
+    Columnar counterpart of <get_goalkeepers>, streaming the "GoalKeeper" sheet.
+
+    Args:
+        file_name: The name of the XLSX file containing goalkeeper data.
+
+    Returns:
+        A dict of arrays: ids, rating, salary, abilities (goalkeepers x skills).
+    """
+    wb = _open(file_name)
+    try:
+        ws = wb["GoalKeeper"]
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows)
+        no = _row_count(ws)
+        ids = np.zeros(no, dtype=np.int64)
+        rating = np.zeros(no, dtype=np.int16)
+        abilities = np.full((no, len(header[GK_ABILITY_COLUMNS])), np.nan, dtype=np.float32)
+
+        c = 0
+        for row in rows:
+            if row[ID_COLUMN] is None:
+                continue  # an empty row
+            ids[c] = row[ID_COLUMN]
+            rating[c] = row[RATING_COLUMN]
+            abilities[c] = _numbers(row[GK_ABILITY_COLUMNS])
+            c += 1
+    finally:
+        wb.close()
+
+    # math.exp, as in <get_goalkeepers>
+    salary = np.array([0.0006375 * math.exp(0.1029 * r) for r in rating[:c].tolist()], dtype=np.float64)
+    return {'ids': ids[:c],
+            'rating': rating[:c],
+            'salary': salary,
+            'abilities': modules.compact_abilities(abilities[:c])}
+
+
 def read_info(file_name):
     """
     Reads and organizes player information (non-goalkeepers) from an Excel file.
@@ -113,74 +175,87 @@ def read_info(file_name):
             - player_rating: Player ratings
             - player_no_id: Mapping of player numbers to IDs
     """
-    
-    ability_name_id = {}  # ability {name:id}
-    player_attributes = {}  # playbers attributes, including club and nationality
-    player_abilities_name = OrderedDict()  # personal abilities
-    player_position = {}  # players' position {id:position}
-    player_rating = {}  # players' rating {id:rating}
-
-    wb = openpyxl.load_workbook(file_name)
-    ws = wb["Players"]
-
-    player_no_id = {}  # player's number : id
-    no = 0  # number of player
-    ability_id = 0  # number of ability
-
-    for row in range(1, ws.max_row + 1):
-        if row == 1:
-            for column in range(11, 29):  # target ability
-                player_abilities_name[ws.cell(row=row, column=column).value] = {}
-
-            for ability_name in player_abilities_name.keys():
-                ability_name_id[ability_name] = ability_id
-                ability_id += 1
-        else:
-            player_id = ws.cell(row=row, column=1).value  # get player's ID
-            player_no_id[no] = player_id
-            position = ws.cell(row=row, column=2).value  # get player's position
-            player_position[no] = position
-            rating = ws.cell(row=row, column=10).value  # get player's rating
-            player_rating[no] = rating
-
-            # player's attributes, including club and nationality
-            team_name = ws.cell(row=row, column=4).value  # player's team name
-            nationality = ws.cell(row=row, column=5).value  # player's nationality
-            player_attributes[no] = []
-            player_attributes[no].append(team_name)
-            player_attributes[no].append(nationality)
-            
-            # player's abilities
-            _ = []
-            for column in range(11, 29):  # range of target abilities
-                _.append(ws.cell(row=row, column=column).value)
-            c = 0
-            for ability in player_abilities_name:
-                player_abilities_name[ability][no] = _[c]
-                c += 1
-            
-            no += 1
-
-    return ability_name_id,       \
-           player_attributes,     \
-           player_abilities_name, \
-           player_position,       \
-           player_rating,         \
-           player_no_id
+    columns, names = read_info_columns(file_name)
+
+    # the dictionaries are read-only views over the columns
+    return modules.info_views(columns, names)
+
+
+def read_info_columns(file_name):
+    """
+    Columnar counterpart of <read_info>.
+
+    The "Players" sheet is streamed row by row (read-only, values only) into
+    preallocated arrays, so the workbook is never held in memory as a whole.
+
+    Args:
+        file_name: The name of the XLSX file containing player data.
+
+    Returns:
+        A dict of arrays: ids, club, nationality, position, rating,
+        abilities (players x abilities), and the ability names.
+    """
+    wb = _open(file_name)
+    try:
+        ws = wb["Players"]
+        rows = ws.iter_rows(values_only=True)
+        names = list(next(rows)[ABILITY_COLUMNS])  # target ability
+        no = _row_count(ws)
+        ids = np.zeros(no, dtype=np.int64)
+        club = np.empty(no, dtype=object)
+        nationality = np.empty(no, dtype=object)
+        position = np.empty(no, dtype=object)
+        rating = np.zeros(no, dtype=np.int16)
+        abilities = np.full((no, len(names)), np.nan, dtype=np.float32)
+
+        c = 0  # number of player
+        for row in rows:
+            if row[ID_COLUMN] is None:
+                continue  # an empty row
+            ids[c] = row[ID_COLUMN]
+            position[c] = row[POSITION_COLUMN]
+            rating[c] = row[RATING_COLUMN]
+            club[c] = row[TEAM_COLUMN]
+            nationality[c] = row[NATIONALITY_COLUMN]
+            abilities[c] = _numbers(row[ABILITY_COLUMNS])
+            c += 1
+    finally:
+        wb.close()
+
+    columns = {'ids': ids[:c],
+               'club': club[:c],
+               'nationality': nationality[:c],
+               'position': position[:c],
+               'rating': rating[:c],
+               'abilities': modules.compact_abilities(abilities[:c])}
+
+    return columns, names
+
+
+def _open(file_name):
+    import openpyxl  # Library for working with Excel files, imported on first use
+
+    return openpyxl.load_workbook(data_path(file_name), read_only=True, data_only=True)
+
+
+def _row_count(ws):
+    """ The number of data rows of a read-only sheet (without the header) """
+    if ws.max_row is not None:
+        return max(ws.max_row - 1, 0)
+    return sum(1 for _ in ws.iter_rows(min_row=2, values_only=True))  # no dimension recorded
+
+
+def _numbers(values):  # empty cells --> NaN
+    return [np.nan if value is None else value for value in values]
 
 
 def normalize(dict_type):
-"""
-- Helper function used by read_criteria to normalize the values of a dictionary.
-- Divides each value by the total sum of the values, ensuring that the sum of the normalized values is 1.
-"""
+    """
+    - Helper function used by read_criteria to normalize the values of a dictionary.
+    - Divides each value by the total sum of the values, ensuring that the sum of the normalized values is 1.
+    """
     total = sum(v for v in dict_type.values())
     tmp = {}
     for key, value in dict_type.items():
         tmp[key] = value / total
     return tmp
-    
-    
-goalkeepers = get_goalkeepers('Goalkeeper.xlsx')
-ability_name_id, player_attributes, player_abilities_name, player_position, player_rating, player_no_id = read_info('Back.xlsx')
-ability_name_id, player_attributes, player_abilities_name, player_position, player_rating, player_no_id = read_info('Forward.xlsx')
@@ -0,0 +1,300 @@
+# coding=utf-8
+
+"""
+Content-addressed cache of the pre-processed data (replaces the pickles under FBTP/params/)
+
+Each stage is stored in its own directory <root>/<stage>-<key>/ as .npy arrays plus a
+meta.json, where <key> is a hash of the source files' contents, the pre-processing
+parameters and the keys of the stages it depends on:
+
+    info (data file) --> similarity --> graph --> scores (+ criteria file)
+    goalkeepers (goalkeeper file)
+
+A stage is rebuilt only when its key changes, and the arrays are loaded memory-mapped,
+so a warm start neither parses the data nor copies the matrices into RAM.
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import hashlib
+import json
+import random
+import shutil
+
+import numpy as np
+
+from FBTP import players, instrument
+
+
+CACHE_VERSION = 1  # bump when the layout or the pre-processing changes
+
+
+class ArtifactCache:
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._digests_file = os.path.join(root, "digests.json")
+        self._digests = None
+
+    def file_digest(self, filepath):
+        """
+        The SHA-256 of a file's content, memoized by (path, size, mtime)
+        so an unchanged file is not read again
+        """
+        if self._digests is None:
+            try:
+                with open(self._digests_file, 'r') as file:
+                    self._digests = json.load(file)
+            except (OSError, ValueError):
+                self._digests = {}
+
+        filepath = os.path.abspath(filepath)
+        st = os.stat(filepath)
+        memo = self._digests.get(filepath)
+        if memo is not None and memo[0] == st.st_size and memo[1] == st.st_mtime_ns:
+            return memo[2]
+
+        sha = hashlib.sha256()
+        with open(filepath, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                sha.update(block)
+        self._digests[filepath] = [st.st_size, st.st_mtime_ns, sha.hexdigest()]
+        with open(self._digests_file, 'w') as file:
+            json.dump(self._digests, file)
+
+        return sha.hexdigest()
+
+    @staticmethod
+    def key(stage, *parts):
+        """ The key of a stage from its inputs (digests, parameters, upstream keys) """
+        sha = hashlib.sha256(json.dumps([CACHE_VERSION, stage] + list(parts)).encode('utf8'))
+        return sha.hexdigest()[:20]
+
+    def path(self, stage, key):
+        return os.path.join(self.root, "%s-%s" % (stage, key))
+
+    def load(self, stage, key):
+        """ The (arrays, meta) of a stage, arrays memory-mapped; None if not cached """
+        path = self.path(stage, key)
+        if not os.path.isdir(path):
+            return None
+        with open(os.path.join(path, "meta.json"), 'r') as file:
+            meta = json.load(file)
+        arrays = {}
+        for name in meta["arrays"]:
+            arrays[name] = np.load(os.path.join(path, name + ".npy"), mmap_mode='r')
+        return arrays, meta
+
+    def save(self, stage, key, arrays, meta=None):
+        """ Store the arrays (and the JSON-serializable meta) of a stage atomically """
+        path = self.path(stage, key)
+        tmp = "%s.tmp-%d" % (path, os.getpid())
+        os.makedirs(tmp, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp, name + ".npy"), np.asarray(array))
+        meta = dict(meta or {})
+        meta["arrays"] = list(arrays.keys())
+        with open(os.path.join(tmp, "meta.json"), 'w') as file:
+            json.dump(meta, file)
+        try:
+            os.rename(tmp, path)
+        except OSError:  # built concurrently by another process
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def get_or_build(self, stage, key, build):
+        """ Load a stage, or build it with build() --> (arrays, meta) and store it """
+        with instrument.timer("artifact:" + stage):
+            cached = self.load(stage, key)
+            if cached is None:
+                instrument.count("artifact_builds")
+                arrays, meta = build()
+                self.save(stage, key, arrays, meta)
+                cached = self.load(stage, key)
+            else:
+                instrument.count("artifact_hits")
+        return cached
+
+
+def reader(datasource):
+    if datasource == 'FIFA':
+        from FBTP import FIFApre
+        return FIFApre
+    elif datasource == 'PES':
+        from FBTP import PESpre
+        return PESpre
+    raise ValueError("unknown data source: %s" % datasource)
+
+
+def info_key(cache, datasource, data_file, seed=0):
+    return cache.key("info", datasource, cache.file_digest(data_file), seed)
+
+
+def load_info(cache, datasource, data_file, seed=0):
+    """
+    The output of FIFApre.read_info / PESpre.read_info as arrays:
+        ids, club, nationality, position, rating, abilities (players x abilities);
+        meta["abilities"] --> the ability names in the order of their IDs
+    <seed> seeds the random positions given by FIFApre to the players without one.
+    """
+
+    def build():
+        random.seed(seed)
+        pre = reader(datasource)
+        if hasattr(pre, "read_info_columns"):  # columnar loader, no dicts in between
+            columns, names = pre.read_info_columns(data_file)
+            arrays = {"ids": columns["ids"],
+                      "club": columns["club"].astype(str),
+                      "nationality": columns["nationality"].astype(str),
+                      "position": columns["position"].astype(str),
+                      "rating": columns["rating"].astype(np.float64),
+                      "abilities": columns["abilities"].astype(np.float64)}
+            return arrays, {"abilities": names}
+
+        abi_name_id, p_attrs, p_abis_name, p_pos, p_r, p_no_id = pre.read_info(data_file)
+        no = len(p_no_id)
+        names = sorted(abi_name_id, key=abi_name_id.get)
+        abilities = np.array([[p_abis_name[name][i] for name in names] for i in range(0, no)],
+                             dtype=np.float64).reshape(no, len(names))
+        arrays = {"ids": np.array([p_no_id[i] for i in range(0, no)]),
+                  "club": np.array([str(p_attrs[i][0]) for i in range(0, no)], dtype=str),
+                  "nationality": np.array([str(p_attrs[i][1]) for i in range(0, no)], dtype=str),
+                  "position": np.array([p_pos[i] for i in range(0, no)], dtype=str),
+                  "rating": np.array([p_r[i] for i in range(0, no)], dtype=np.float64),
+                  "abilities": abilities}
+        return arrays, {"abilities": names}
+
+    return cache.get_or_build("info", info_key(cache, datasource, data_file, seed), build)
+
+
+def info_dicts(arrays, meta):
+    """
+    The legacy outputs of <read_info> rebuilt from the arrays of <load_info>:
+    ability_name_id, player_attributes, player_abilities_name, player_position,
+    player_rating, player_no_id
+    """
+    from collections import OrderedDict
+
+    names = meta["abilities"]
+    no = len(arrays["ids"])
+    abi_name_id = {name: i for i, name in enumerate(names)}
+    p_attrs = {i: [c, n] for i, (c, n) in enumerate(zip(arrays["club"].tolist(),
+                                                         arrays["nationality"].tolist()))}
+    p_abis_name = OrderedDict()
+    for c, name in enumerate(names):
+        p_abis_name[name] = dict(zip(range(0, no), arrays["abilities"][:, c].tolist()))
+    p_pos = dict(enumerate(arrays["position"].tolist()))
+    p_r = dict(enumerate(arrays["rating"].tolist()))
+    p_no_id = dict(enumerate(arrays["ids"].tolist()))
+
+    return abi_name_id, p_attrs, p_abis_name, p_pos, p_r, p_no_id
+
+
+def similarity_key(cache, datasource, data_file, seed=0, minhash=None):
+    """ The key of the <similarity> stage, exact or MinHash with (bands, rows) """
+    ikey = info_key(cache, datasource, data_file, seed)
+    if minhash is None:
+        return cache.key("similarity", ikey)
+    from FBTP import modules
+    return cache.key("similarity", ikey, "minhash", list(minhash), modules.MINHASH_MAX_BUCKET)
+
+
+def load_similarity(cache, datasource, data_file, network_name, seed=0, minhash=None):
+    """
+    The sparse similarity matrix of a network (modules.cal_similarity_sparse, or
+    modules.cal_similarity_minhash with minhash=(bands, rows)),
+    built from the <info> stage only when it is not cached
+
+    :return the stage key, the scipy.sparse CSR matrix
+    """
+    from scipy import sparse
+
+    skey = similarity_key(cache, datasource, data_file, seed, minhash)
+
+    def build():
+        from FBTP import modules
+        arrays, meta = load_info(cache, datasource, data_file, seed)
+        p_attrs = info_dicts(arrays, meta)[1]
+        if minhash is None:
+            sim = modules.cal_similarity_sparse(network_name, p_attrs)
+        else:
+            sim = modules.cal_similarity_minhash(network_name, p_attrs, bands=minhash[0], rows=minhash[1])
+        return {"indptr": sim.indptr, "indices": sim.indices, "data": sim.data}, {"shape": list(sim.shape)}
+
+    s, smeta = cache.get_or_build("similarity", skey, build)
+
+    return skey, sparse.csr_matrix((s["data"], s["indices"], s["indptr"]), shape=tuple(smeta["shape"]))
+
+
+def load_graph(cache, datasource, data_file, network_name, seed=0, minhash=None):
+    """
+    The players.CSRGraph of a network, built from the <info> and <similarity> stages
+    only when it is not cached (they are not even loaded otherwise)
+    :params minhash --> (bands, rows) for the approximate similarity, see <load_similarity>
+
+    :return abi_name_id, the player number --> ID list, the graph
+    """
+    gkey = cache.key("graph", similarity_key(cache, datasource, data_file, seed, minhash))
+
+    def build_graph():
+        from FBTP import greedy, modules
+        arrays, meta = load_info(cache, datasource, data_file, seed)
+        abi_name_id, p_attrs, p_abis_name, p_pos, p_r, p_no_id = info_dicts(arrays, meta)
+        _, sim = load_similarity(cache, datasource, data_file, network_name, seed, minhash)
+        pg = greedy.players_csr_graph_construction(sim, modules.cal_ability_avg(p_abis_name),
+                                                   p_abis_name, abi_name_id, p_pos, p_r)
+        graph = {"indptr": pg.indptr, "indices": pg.indices, "weights": pg.weights,
+                 "position_code": pg.position_code, "salary": pg.salary,
+                 "abilities": pg.abilities, "ids": arrays["ids"]}
+        return graph, {"position_names": pg.position_names, "ability_ids": pg.ability_ids,
+                       "ability_names": meta["abilities"]}
+
+    g, meta = cache.get_or_build("graph", gkey, build_graph)
+    pg = players.CSRGraph(g["indptr"], g["indices"], g["weights"], g["position_code"],
+                          g["salary"], g["abilities"], meta["ability_ids"],
+                          position_names=meta["position_names"])
+    abi_name_id = {name: i for i, name in enumerate(meta["ability_names"])}
+    pg.graph_key = gkey
+
+    return abi_name_id, g["ids"].tolist(), pg
+
+
+def load_scores(cache, pg, criteria, criteria_file, abi_name_id):
+    """
+    Seed the ability scores of a graph from <load_graph> for a criteria file
+    (see players.CSRGraph.ability_scores); a graph patched since it was loaded
+    (see roster.Roster) has no cache key, its scores are computed directly
+    """
+    if pg.graph_key is None:
+        return pg.ability_scores(criteria, abi_name_id)
+    key = cache.key("scores", pg.graph_key, cache.file_digest(criteria_file))
+
+    def build():
+        return {"scores": pg.ability_scores(criteria, abi_name_id)}, {}
+
+    arrays, _ = cache.get_or_build("scores", key, build)
+    pg.set_ability_scores(criteria, abi_name_id, arrays["scores"])
+
+    return arrays["scores"]
+
+
+def load_goalkeepers(cache, datasource, gk_file):
+    """ The players.GoalkeeperTable of FIFApre.get_goalkeepers / PESpre.get_goalkeepers """
+    key = cache.key("goalkeepers", datasource, cache.file_digest(gk_file))
+
+    def build():
+        pre = reader(datasource)
+        if hasattr(pre, "read_goalkeeper_columns"):
+            columns = pre.read_goalkeeper_columns(gk_file)
+            table = players.GoalkeeperTable(columns["ids"], columns["rating"], columns["salary"],
+                                            columns["abilities"])
+        else:
+            table = players.GoalkeeperTable.from_goalkeepers(pre.get_goalkeepers(gk_file))
+        return {"ids": table.ids, "rating": table.rating, "salary": table.salary,
+                "abilities": table.abilities}, {}
+
+    arrays, _ = cache.get_or_build("goalkeepers", key, build)
+
+    return players.GoalkeeperTable(arrays["ids"], arrays["rating"], arrays["salary"], arrays["abilities"])
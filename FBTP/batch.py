@@ -0,0 +1,133 @@
+# coding=utf-8
+
+"""
+Batch team composition: many <fbtp.FBTP> requests against the same networks
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import contextlib
+import io
+import time
+from collections import OrderedDict
+
+from FBTP import fbtp, greedy, teamstats, instrument
+from FBTP import players as ps
+
+
+class CompositionRequest:
+    """
+    One team to compose: the budget, the weights alpha / beta and, optionally,
+    the criteria of the Back and Forward networks (the batch defaults otherwise)
+    """
+
+    def __init__(self, budget, alpha, beta, cri_back=None, cri_forward=None):
+        self.budget = budget
+        self.alpha = alpha
+        self.beta = beta
+        self.cri_back = cri_back
+        self.cri_forward = cri_forward
+
+    def __repr__(self):
+        return "CompositionRequest(budget=%r, alpha=%r, beta=%r)" % (self.budget, self.alpha, self.beta)
+
+
+@instrument.timed("compose_batch")
+def compose_batch(requests, gks, abi_name_id,
+                  p_no_id_back, pg_back, cri_back,
+                  p_no_id_forward, pg_forward, cri_forward,
+                  datasource, quiet=True, timings=None):
+    """
+    FUNCTION: <fbtp.FBTP> for a list of requests, sharing what does not change between them
+    - the goalkeeper table and the best goalkeeper;
+    - the degrees of the players (players.Graph.node_stats);
+    - per criteria set: the ability scores, their min-max bounds and the centre player
+      (the requests are grouped by criteria, so the score caches of the graphs are
+      filled once per set);
+    - per (criteria, alpha, beta): the team without budget constraint and a single
+      pruning run, from the highest budget down to the lowest.
+    On players.CSRGraph networks the candidates are scored in batches
+    (greedy.select_opt_players_batch, fbtp.select_candidate_batch).
+    Each team is the one <fbtp.FBTP> returns for the same request.
+
+    :params requests --> <CompositionRequest>s or (budget, alpha, beta) tuples
+    :params cri_back, cri_forward --> the criteria of the requests that give none
+    :params quiet --> hide the output of <fbtp.FBTP>
+    :params timings --> a list, filled with the seconds spent on each request: the first
+                        (highest budget) request of a chain also pays for its team without
+                        budget constraint, a lower one only for the pruning it adds
+
+    :return one (team_real, metrics) per request, in order; metrics as <fbtp.FBTP> with
+            details=True, plus "error" (None, or the exception of a failed request)
+    """
+
+    requests = [r if isinstance(r, CompositionRequest) else CompositionRequest(*r) for r in requests]
+    if not isinstance(gks, ps.GoalkeeperTable):
+        gks = ps.GoalkeeperTable.from_goalkeepers(gks)
+    best_gk = gks.best()
+    networks = {"Back": (p_no_id_back, pg_back), "Forward": (p_no_id_forward, pg_forward)}
+
+    # group the requests by criteria set
+    groups = OrderedDict()
+    for i, r in enumerate(requests):
+        cri = {"Back": r.cri_back if r.cri_back is not None else cri_back,
+               "Forward": r.cri_forward if r.cri_forward is not None else cri_forward}
+        key = tuple(ps.criteria_vector(cri[pos], abi_name_id).tobytes() for pos in ("Back", "Forward"))
+        groups.setdefault(key, (cri, []))[1].append(i)
+
+    results = [None] * len(requests)
+    seconds = [0.0] * len(requests)
+    for cri, members in groups.values():
+        stars = {pos: pg.node_stats(cri[pos], abi_name_id).star() for pos, (_, pg) in networks.items()}
+        instrument.count("batch_criteria_sets")
+
+        # the requests with the same (alpha, beta) start from the same team, and the pruning
+        # is deterministic: the team of a lower budget is reached by going on pruning
+        # the team of the next higher budget, so each chain is pruned once
+        chains = OrderedDict()
+        for i in members:
+            chains.setdefault((requests[i].alpha, requests[i].beta), []).append(i)
+        for (alpha, beta), chain in chains.items():
+            chain.sort(key=lambda i: -requests[i].budget)
+            out = io.StringIO() if quiet else sys.stdout
+            start = time.perf_counter()
+            try:
+                with contextlib.redirect_stdout(out):
+                    instrument.count("batch_unconstrained_teams")
+                    team = {"GK": [best_gk]}
+                    for pos, (p_no_id, pg) in networks.items():
+                        team[pos] = greedy.player_opt_subgraph(p_no_id, pg, cri[pos], abi_name_id,
+                                                               alpha, beta, pos, datasource,
+                                                               batch=isinstance(pg, ps.CSRGraph),
+                                                               star=stars[pos])
+                    batch = isinstance(pg_back, ps.CSRGraph) and isinstance(pg_forward, ps.CSRGraph)
+                    state = teamstats.TeamState(team, gks, pg_back, pg_forward,
+                                                cri["Back"], cri["Forward"], abi_name_id)
+                    pruning = 0
+                    for i in chain:
+                        print("The Budget Constraint is:%.3f" % requests[i].budget)
+                        team_real, rounds = fbtp.prune(team, state, requests[i].budget,
+                                                       p_no_id_back, pg_back, cri["Back"],
+                                                       p_no_id_forward, pg_forward, cri["Forward"],
+                                                       gks, abi_name_id, batch=batch)
+                        pruning += rounds
+                        metrics = fbtp.team_metrics(state, pruning)
+                        metrics["error"] = None
+                        results[i] = (team_real, metrics)
+                        now = time.perf_counter()
+                        seconds[i], start = now - start, now
+            except Exception as e:
+                # FBTP fails the same way for this budget and every lower one
+                for i in chain:
+                    if results[i] is None:
+                        results[i] = (None, {"error": "%s: %s" % (type(e).__name__, e)})
+                        now = time.perf_counter()
+                        seconds[i], start = now - start, now
+
+    if timings is not None:
+        timings[:] = seconds
+
+    return results
+
@@ -0,0 +1,259 @@
+# coding=utf-8
+
+"""
+Benchmark of the pipeline stages on synthetic rosters
+
+    python FBTP/benchmark.py --sizes 1000 10000 100000 1000000 --out FBTP/results/benchmark.json
+
+A seeded generator builds the rosters in the FIFA schema of FIFApre.read_info_columns
+(club, nationality, position, rating and the 29 ability columns) with <n> players
+in each of the Back and Forward networks. Each size runs in its own process. For each
+stage the wall time and the peak resident memory of that process so far are recorded,
+and the results are written as JSON.
+
+The rosters scale the number of clubs and nationalities with <n> (see --club-size and
+--nationality-size), so the average degree of the networks stays constant instead of
+growing to the dense n x n of a handful of nationalities.
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing as mp
+import platform
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+
+# the ability columns of the FIFA data (Back.csv, columns 44:73) and their average
+ABILITY_MEANS = {
+    'attacking_crossing': 51, 'attacking_finishing': 35, 'attacking_heading_accuracy': 61,
+    'attacking_short_passing': 59, 'attacking_volleys': 35, 'skill_dribbling': 53,
+    'skill_curve': 43, 'skill_fk_accuracy': 38, 'skill_long_passing': 53,
+    'skill_ball_control': 58, 'movement_acceleration': 64, 'movement_sprint_speed': 65,
+    'movement_agility': 60, 'movement_reactions': 62, 'movement_balance': 61,
+    'power_shot_power': 51, 'power_jumping': 69, 'power_stamina': 68, 'power_strength': 71,
+    'power_long_shots': 39, 'mentality_aggression': 65, 'mentality_interceptions': 64,
+    'mentality_positioning': 44, 'mentality_vision': 46, 'mentality_penalties': 43,
+    'mentality_composure': 58, 'defending_marking': 64, 'defending_standing_tackle': 67,
+    'defending_sliding_tackle': 65,
+}
+ABILITY_NAMES = list(ABILITY_MEANS)
+RATING_MEAN = 66
+RATING_STD = 6.5
+
+
+def synthetic_columns(n, div, seed=0, club_size=8, nationality_size=40):
+    """
+    A synthetic network in the layout of FIFApre.read_info_columns
+
+    :params n --> the number of players
+    :params div --> 'Back' or 'Forward', the positions drawn from FIFApre.POSITIONS
+    :params club_size, nationality_size --> the average number of players per club / nationality
+
+    :return the columns dict, the ability names
+    """
+    from FBTP import FIFApre, modules
+
+    rng = np.random.default_rng([seed, 0 if div == 'Back' else 1])
+    clubs = max(1, n // club_size)
+    nationalities = max(1, n // nationality_size)
+
+    rating = np.clip(np.rint(rng.normal(RATING_MEAN, RATING_STD, n)), 40, 95)
+    # the abilities follow the rating around the average of each ability
+    means = np.array([ABILITY_MEANS[name] for name in ABILITY_NAMES], dtype=np.float64)
+    abilities = means[None, :] + 0.8 * (rating - RATING_MEAN)[:, None] + rng.normal(0, 8, (n, len(means)))
+
+    columns = {'ids': np.arange(1, n + 1, dtype=np.int64) + (0 if div == 'Back' else 10 * n),
+               'club': np.array(["Club %d" % c for c in range(0, clubs)], dtype=object)[rng.integers(0, clubs, n)],
+               'nationality': np.array(["Nation %d" % c for c in range(0, nationalities)],
+                                       dtype=object)[rng.integers(0, nationalities, n)],
+               'position': np.array(FIFApre.POSITIONS[div], dtype=object)[
+                   rng.integers(0, len(FIFApre.POSITIONS[div]), n)],
+               'rating': rating.astype(np.int16),
+               'abilities': modules.compact_abilities(np.clip(np.rint(abilities), 10, 99))}
+
+    return columns, list(ABILITY_NAMES)
+
+
+def synthetic_goalkeepers(n, seed=0):
+    """ A synthetic players.GoalkeeperTable of <n> goalkeepers """
+    import math
+    from FBTP import players
+
+    rng = np.random.default_rng([seed, 2])
+    rating = np.clip(np.rint(rng.normal(RATING_MEAN, RATING_STD, n)), 40, 95)
+    abilities = np.clip(np.rint(rating[:, None] + rng.normal(0, 6, (n, 6))), 10, 99)
+    salary = [0.0006375 * math.exp(0.1029*r) for r in rating.tolist()]  # as FIFApre.get_goalkeepers
+
+    return players.GoalkeeperTable(np.arange(1, n + 1) + 20 * n, rating, salary, abilities)
+
+
+def synthetic_criteria(div, abi_name_id):
+    """ The FIFA criteria of <div>, with 0 for the abilities they do not mention """
+    from FBTP import FIFApre
+
+    criteria = FIFApre.read_criteria(os.path.join(BASE_DIR, 'Data', 'FIFA') + os.sep, "Criteria_%s.txt" % div)
+    for name in abi_name_id:
+        criteria.setdefault(name, 0.0)
+
+    return criteria
+
+
+class Recorder:
+    """ The wall time and peak memory of the stages of one benchmark run """
+
+    def __init__(self, players):
+        self.players = players
+        self.rows = []
+
+    @contextlib.contextmanager
+    def stage(self, name, network=None, **extra):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  # the stages print their progress
+            yield extra
+        row = {"players": self.players, "stage": name, "network": network,
+               "seconds": time.perf_counter() - start, "peak_rss_mb": peak_rss_mb()}
+        row.update(extra)
+        self.rows.append(row)
+
+
+def peak_rss_mb():
+    """ The peak resident memory of this process so far, in MB (None if unknown) """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024  # bytes on macOS, KB on Linux
+
+
+def run_size(n, seed=0, dense_max=2000, club_size=8, nationality_size=40,
+             alpha=0.5, beta=0.3, budget_ratio=0.7):
+    """
+    FUNCTION: time every stage of the pipeline on a synthetic roster of <n> players per network
+    - similarity: modules.cal_similarity_sparse (modules.cal_similarity if n <= dense_max);
+    - graph: greedy.players_csr_graph_construction (greedy.players_graph_construction if n <= dense_max);
+    - scores, select_star, player_opt_subgraph for the Back and Forward networks;
+    - pruning: fbtp.prune with a budget of <budget_ratio> x the cost of the unconstrained team.
+
+    :return the rows of the results table
+    """
+    from FBTP import fbtp, greedy, modules, teamstats
+
+    rec = Recorder(n)
+    nets = {}
+    for div in ("Back", "Forward"):
+        with rec.stage("generate", div):
+            columns, names = synthetic_columns(n, div, seed, club_size, nationality_size)
+            abi_name_id, p_attrs, p_abis_name, p_pos, p_r, p_no_id = modules.info_views(columns, names)
+
+        with rec.stage("similarity", div) as extra:
+            sim = modules.cal_similarity_sparse(div, p_attrs)
+            extra["edges"] = modules.cal_similarity_stats(sim)[1]
+        if n <= dense_max:
+            with rec.stage("similarity_dense", div):
+                sim_dense = modules.cal_similarity(div, p_attrs)
+
+        abi_avg = modules.cal_ability_avg(p_abis_name)
+        with rec.stage("graph", div):
+            pg = greedy.players_csr_graph_construction(sim, abi_avg, p_abis_name, abi_name_id, p_pos, p_r)
+        del sim
+        if n <= dense_max:
+            with rec.stage("graph_dense", div):
+                greedy.players_graph_construction(sim_dense, abi_avg, p_abis_name, abi_name_id, p_pos, p_r)
+            del sim_dense
+
+        criteria = synthetic_criteria(div, abi_name_id)
+        with rec.stage("scores", div):
+            scores = pg.ability_scores(criteria, abi_name_id)
+            pg.ability_matrix()
+        with rec.stage("select_star", div):
+            greedy.select_star(p_no_id, pg.vertexList, criteria, abi_name_id, alpha=0.8,
+                               stats=pg.node_stats(criteria, abi_name_id))
+        with rec.stage("player_opt_subgraph", div):
+            team = greedy.player_opt_subgraph(p_no_id, pg, criteria, abi_name_id, alpha, beta, div, 'FIFA')
+
+        nets[div] = (p_no_id, pg, criteria, team)
+
+    gks = synthetic_goalkeepers(max(50, n // 5), seed)
+    team = {"GK": [gks.best()], "Back": list(nets["Back"][3]), "Forward": list(nets["Forward"][3])}
+    state = teamstats.TeamState(team, gks, nets["Back"][1], nets["Forward"][1],
+                                nets["Back"][2], nets["Forward"][2], abi_name_id)
+    budget = budget_ratio * state.cost
+    with rec.stage("pruning", budget=budget) as extra:
+        _, extra["rounds"] = fbtp.prune(team, state, budget,
+                                        nets["Back"][0], nets["Back"][1], nets["Back"][2],
+                                        nets["Forward"][0], nets["Forward"][1], nets["Forward"][2],
+                                        gks, abi_name_id)
+
+    return rec.rows
+
+
+def _run_size(kwargs):
+    try:
+        return run_size(**kwargs)
+    except MemoryError as e:
+        return [{"players": kwargs["n"], "stage": None, "error": "MemoryError: %s" % e}]
+
+
+def run(sizes, seed=0, **options):
+    """
+    Run <run_size> for each size, each in a fresh process so the peak memory is its own
+
+    :return the results: {"meta": the environment, "results": the rows of every size}
+    """
+    import scipy
+
+    results = []
+    for n in sizes:
+        with mp.get_context().Pool(1, maxtasksperchild=1) as pool:
+            rows = pool.apply(_run_size, (dict(options, n=n, seed=seed),))
+        for row in rows:
+            print("%8d  %-20s %-8s %9.3f s  %8.1f MB" % (row["players"], row.get("stage"), row.get("network") or "",
+                                                         row.get("seconds") or 0, row.get("peak_rss_mb") or 0),
+                  file=sys.stderr)
+        results.extend(rows)
+
+    meta = {"date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "numpy": np.__version__, "scipy": scipy.__version__,
+            "platform": platform.platform(), "cpus": os.cpu_count(), "seed": seed, "sizes": list(sizes),
+            "options": options}
+
+    return {"meta": meta, "results": results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic rosters")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000],
+                        help="the numbers of players per network")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dense-max", type=int, default=2000,
+                        help="also time the dense (legacy) similarity and graph up to this size")
+    parser.add_argument("--club-size", type=int, default=8)
+    parser.add_argument("--nationality-size", type=int, default=40)
+    parser.add_argument("--out", default=os.path.join(BASE_DIR, "FBTP", "results", "benchmark.json"))
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, seed=args.seed, dense_max=args.dense_max,
+                  club_size=args.club_size, nationality_size=args.nationality_size)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, 'w') as file:
+        json.dump(results, file, indent=1)
+    print("--> %s" % args.out, file=sys.stderr)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
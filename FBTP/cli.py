@@ -0,0 +1,281 @@
+# coding=utf-8
+
+"""
+Command line entry point of the TC-FPACN + FBTP model
+
+    python FBTP/cli.py ingest     --dataset PES
+    python FBTP/cli.py similarity --dataset PES
+    python FBTP/cli.py graph      --dataset PES
+    python FBTP/cli.py compose    --dataset PES --budget 100 --alpha 0.6 --beta 0.2
+    python FBTP/cli.py compose    --dataset FIFA --deltas Data/FIFA/deltas/Back-0801.csv
+    python FBTP/cli.py similarity --dataset PES --minhash 32 4
+    python FBTP/cli.py sweep      --dataset PES --budgets 100 80 --out parm@PES.csv
+
+Every stage goes through the artifact cache (see artifacts.py), so a stage only
+builds what is missing and a warm "compose" loads the prebuilt graphs directly.
+The modules are imported inside the stages; the wall time of each stage is
+reported on stderr.
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import argparse
+import contextlib
+import time
+
+
+# the defaults of each dataset, as in main.py
+DATASETS = {
+    'PES': {"goalkeeper": "Goalkeeper.xlsx", "back": "Back.xlsx", "forward": "Forward.xlsx",
+            "alpha": 0.6, "beta": 0.2, "budget": 100},
+    'FIFA': {"goalkeeper": "Goalkeeper.csv", "back": "Back.csv", "forward": "Forward.csv",
+             "alpha": 0.5, "beta": 0.3, "budget": 8},
+}
+CRITERIA_BACK = "Criteria_Back.txt"
+CRITERIA_FORWARD = "Criteria_Forward.txt"
+
+
+class Run:
+    """ The options of a command, its artifact cache and the wall time of its stages """
+
+    def __init__(self, args):
+        self.args = args
+        self.dataset = args.dataset
+        self.data_dir = args.data_dir or os.path.join(BASE_DIR, "Data", args.dataset)
+        self.times = []  # (stage, seconds)
+        self.result = {}  # written with the instrumentation record (see --instrument)
+        self._cache = None
+
+    def file(self, name):
+        return os.path.join(self.data_dir, name)
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            from FBTP import artifacts
+            self._cache = artifacts.ArtifactCache(self.args.cache or
+                                                  os.path.join(BASE_DIR, "FBTP", "params", self.dataset))
+        return self._cache
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times.append((name, time.perf_counter() - start))
+
+    def report(self):
+        for name, seconds in self.times:
+            print("[%s] %.3f s" % (name, seconds), file=sys.stderr)
+
+
+def ingest(run):
+    """ Parse the data files into the <info> and <goalkeepers> stages """
+    from FBTP import artifacts
+
+    files = DATASETS[run.dataset]
+    with run.stage("goalkeepers"):
+        gks = artifacts.load_goalkeepers(run.cache, run.dataset, run.file(files["goalkeeper"]))
+    print("%d goalkeepers" % len(gks))
+    for network in ("back", "forward"):
+        with run.stage("info:" + network):
+            arrays, meta = artifacts.load_info(run.cache, run.dataset, run.file(files[network]),
+                                               run.args.seed)
+        print("%s: %d players, %d abilities" % (network, len(arrays["ids"]), len(meta["abilities"])))
+
+
+def similarity(run):
+    """ Build the sparse similarity matrices """
+    from FBTP import artifacts, modules
+
+    files = DATASETS[run.dataset]
+    for network in ("back", "forward"):
+        with run.stage("similarity:" + network):
+            _, sim = artifacts.load_similarity(run.cache, run.dataset, run.file(files[network]),
+                                               network.capitalize(), run.args.seed, run.args.minhash)
+        print("%s: %d vertex, %d edges, density %f" % ((network,) + modules.cal_similarity_stats(sim)))
+        if run.args.minhash:
+            with run.stage("similarity_error:" + network):
+                arrays, meta = artifacts.load_info(run.cache, run.dataset, run.file(files[network]), run.args.seed)
+                run.result[network] = modules.cal_similarity_error(
+                    sim, artifacts.info_dicts(arrays, meta)[1], above=modules.lsh_threshold(*run.args.minhash))
+
+
+def graph(run):
+    """ Build the players' graphs """
+    networks = load_networks(run)
+    for network in ("back", "forward"):
+        pg = networks["pg_" + network]
+        print("%s: %d vertex, %d edges" % (network, len(pg.position_code), len(pg.indices) // 2))
+
+
+def compose(run):
+    """ Compose a team with <fbtp.FBTP> """
+    from FBTP import fbtp
+
+    args = run.args
+    networks = load_networks(run, scores=True)
+    if args.deltas:
+        apply_deltas(run, networks, args.deltas)
+    with run.stage("compose"):
+        team, metrics = fbtp.FBTP(networks["gks"], networks["abi_name_id"],
+                                  networks["p_no_id_back"], networks["pg_back"], networks["cri_back"],
+                                  networks["p_no_id_forward"], networks["pg_forward"], networks["cri_forward"],
+                                  default(args.budget, run.dataset, "budget"),
+                                  default(args.alpha, run.dataset, "alpha"),
+                                  default(args.beta, run.dataset, "beta"), run.dataset, details=True)
+    run.result = {"team": team, "metrics": metrics}
+
+
+def sweep(run):
+    """ Run the sensitivity analysis over (alpha, beta) and the budgets """
+    from FBTP import sweep as sw
+
+    args = run.args
+    networks = load_networks(run, scores=True)
+    budgets = args.budgets or [DATASETS[run.dataset]["budget"]]
+    with run.stage("sweep"):
+        rows = sw.run_sweep(networks["gks"], networks["abi_name_id"],
+                            networks["p_no_id_back"], networks["pg_back"], networks["cri_back"],
+                            networks["p_no_id_forward"], networks["pg_forward"], networks["cri_forward"],
+                            budgets, run.dataset, grid=sw.alpha_beta_grid(args.step),
+                            processes=args.processes)
+    out = args.out or os.path.join(BASE_DIR, "FBTP", "results", "parm@%s.csv" % run.dataset)
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    sw.save_table(rows, out)
+    print("%d runs (%d failed) --> %s" % (len(rows), sum(1 for row in rows if row["error"]), out))
+
+
+def load_networks(run, scores=False):
+    """
+    The goalkeeper table and both graphs (with their criteria and scores if <scores>),
+    as the arguments of <fbtp.FBTP>
+    """
+    from FBTP import artifacts
+
+    files = DATASETS[run.dataset]
+    pre = artifacts.reader(run.dataset)  # for read_criteria (pandas / openpyxl are imported lazily)
+    networks = {}
+    with run.stage("goalkeepers"):
+        networks["gks"] = artifacts.load_goalkeepers(run.cache, run.dataset, run.file(files["goalkeeper"]))
+    for network, criteria_file in (("back", CRITERIA_BACK), ("forward", CRITERIA_FORWARD)):
+        with run.stage("graph:" + network):
+            abi_name_id, p_no_id, pg = artifacts.load_graph(run.cache, run.dataset, run.file(files[network]),
+                                                            network.capitalize(), run.args.seed, run.args.minhash)
+        networks["abi_name_id"] = abi_name_id
+        networks["p_no_id_" + network] = p_no_id
+        networks["pg_" + network] = pg
+        if scores:
+            with run.stage("scores:" + network):
+                criteria = pre.read_criteria(run.data_dir + os.sep, criteria_file)
+                artifacts.load_scores(run.cache, pg, criteria, run.file(criteria_file), abi_name_id)
+            networks["cri_" + network] = criteria
+
+    return networks
+
+
+def apply_deltas(run, networks, paths):
+    """
+    Apply FIFA delta files (see delta.py) to the graphs of <load_networks>,
+    the network of a file is in its name ("Back" or else "Forward"), as in FIFApre.read_info
+    """
+    from FBTP import artifacts, delta, roster
+
+    if run.dataset != 'FIFA':
+        raise SystemExit("FBTP compose: the delta files are FIFA CSV files")
+    files = DATASETS[run.dataset]
+    streams = {}
+    for path in paths:
+        network = "back" if "Back" in os.path.basename(path) else "forward"
+        if network not in streams:
+            arrays, meta = artifacts.load_info(run.cache, run.dataset, run.file(files[network]), run.args.seed)
+            streams[network] = delta.DeltaStream(roster.Roster.from_info(networks["pg_" + network], arrays, meta),
+                                                 network.capitalize(), meta["abilities"])
+        with run.stage("deltas:" + network):
+            stats = streams[network].ingest(path)
+        print("%s: %s" % (path, stats))
+    for network, stream in streams.items():
+        networks["p_no_id_" + network] = stream.roster.ids
+        for path, line, reason in stream.rejected:
+            print("rejected %s:%d: %s" % (path, line, reason), file=sys.stderr)
+
+
+def default(value, dataset, name):
+    return DATASETS[dataset][name] if value is None else value
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="FBTP", description=__doc__.strip().splitlines()[0])
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--dataset", choices=sorted(DATASETS), default="PES",
+                        help="the dataset (default: PES, the one shipped with all three data files)")
+    common.add_argument("--data-dir", help="the directory of the data files (default: Data/<dataset>)")
+    common.add_argument("--cache", help="the artifact cache directory (default: FBTP/params/<dataset>)")
+    common.add_argument("--seed", type=int, default=0,
+                        help="the seed of the random positions given to the players without one")
+    common.add_argument("--minhash", type=int, nargs=2, metavar=("BANDS", "ROWS"),
+                        help="the approximate (MinHash/LSH) similarity instead of the exact one, its edges are"
+                             " mostly the pairs of similarity >= (1/BANDS)^(1/ROWS) (e.g. 64 2 for the weaker ones)")
+    common.add_argument("--instrument", metavar="FILE",
+                        help="write the stage timers and algorithm counters as JSON ('-' for stderr)")
+
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("ingest", parents=[common], help=ingest.__doc__.strip())
+    commands.add_parser("similarity", parents=[common], help=similarity.__doc__.strip())
+    commands.add_parser("graph", parents=[common], help=graph.__doc__.strip())
+
+    cmd = commands.add_parser("compose", parents=[common], help=compose.__doc__.strip())
+    cmd.add_argument("--budget", type=float)
+    cmd.add_argument("--alpha", type=float)
+    cmd.add_argument("--beta", type=float)
+    cmd.add_argument("--deltas", nargs="+", metavar="FILE",
+                     help="FIFA delta CSV files applied to the networks first (see delta.py)")
+
+    cmd = commands.add_parser("sweep", parents=[common], help=sweep.__doc__.strip())
+    cmd.add_argument("--budgets", type=float, nargs="+")
+    cmd.add_argument("--step", type=float, default=0.1, help="the step of the (alpha, beta) grid")
+    cmd.add_argument("--processes", type=int, help="the number of workers (default: all the CPUs)")
+    cmd.add_argument("--out", help="the CSV results table (default: FBTP/results/parm@<dataset>.csv)")
+
+    return parser
+
+
+COMMANDS = {"ingest": ingest, "similarity": similarity, "graph": graph,
+            "compose": compose, "sweep": sweep}
+
+
+@contextlib.contextmanager
+def recording(run):
+    """ Record the instrumentation (instrument.py) of a command if --instrument is given """
+    if run.args.instrument is None:
+        yield
+        return
+
+    from FBTP import instrument
+
+    sink = instrument.JsonSink(None if run.args.instrument == "-" else run.args.instrument,
+                               command=run.args.command)
+    with instrument.recording() as rec:
+        yield
+    sink(dict(run.result, instrumentation=rec.to_dict()))
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    run = Run(args)
+    try:
+        with run.stage("total"), recording(run):
+            COMMANDS[args.command](run)
+    except FileNotFoundError as e:
+        print("FBTP %s: %s" % (args.command, e), file=sys.stderr)
+        return 1
+    finally:
+        run.report()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+# coding=utf-8
+
+"""
+Streaming ingestion of the FIFA delta files into a loaded network
+
+A delta file is an append-only CSV of changed rows, in the schema of the snapshots
+(Data/FIFA/Back.csv, Forward.csv) as read by FIFApre.read_info_columns: the columns
+sofifa_id, overall, club, nationality, team_position and the ability columns, the
+others are ignored. An optional "op" column marks the departures ("delete");
+any other row is an upsert (a new player or the new state of a known one).
+
+    arrays, meta = artifacts.load_info(cache, 'FIFA', FILE_PATH + FILE_BACK)
+    stream = DeltaStream(roster.Roster.from_info(pg_back, arrays, meta), 'Back', meta["abilities"], window=1000)
+    stream.ingest("Data/FIFA/deltas/Back-2020-08.csv")            # a file
+    stream.ingest("Data/FIFA/deltas/Back.csv", follow=True, idle=60)  # tail a growing file
+
+The rows are read one by one (never the whole file), validated, and coalesced by
+sofifa_id in a window of at most <window> players (the last row of a player wins).
+A full window is applied to the roster as one batch (roster.Roster.batch), so the
+memory stays bounded by the window whatever the size of the stream.
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import csv
+import math
+import random
+import time
+from collections import OrderedDict
+
+from FBTP import FIFApre, instrument
+
+
+DELETE = "delete"
+MAX_EXAMPLES = 10  # the rejected rows kept as examples
+
+
+class DeltaError(ValueError):
+    """ A delta file that does not follow the schema of read_info (e.g. a missing column) """
+
+
+class DeltaStream:
+    """
+    Apply the rows of delta files to a roster.Roster, a window at a time
+    - validate: each row against the schema of read_info, the invalid rows are rejected
+      (counted, with a few examples in <rejected>);
+    - coalesce: the rows of the same sofifa_id within a window, the last one wins;
+    - apply: the window in a single roster batch: delete --> remove, known player -->
+      modify, new player --> add. As in read_info, a new player without a valid position
+      for the network gets a random one; a known player keeps his current position.
+    """
+
+    def __init__(self, roster, div, abilities, window=1000):
+        """
+        :params roster --> the roster.Roster of the network
+        :params div --> 'Back' or 'Forward', the network of the delta files
+        :params abilities --> the ability names (the meta["abilities"] of artifacts.load_info)
+        :params window --> the maximum number of players coalesced before they are applied
+        """
+        self.roster = roster
+        self.div = div
+        self.abilities = list(abilities)
+        self.window = window
+
+        self.pending = OrderedDict()  # sofifa_id --> the last valid row, in the order of the first one
+        self.stats = {"rows": 0, "rejected": 0, "coalesced": 0, "windows": 0,
+                      "added": 0, "modified": 0, "removed": 0, "unknown_removed": 0}
+        self.rejected = []  # (file, line, reason) of the first rejected rows
+
+    def ingest(self, path, follow=False, poll=1.0, idle=None):
+        """
+        Read a delta file to its end and apply it
+        :params follow --> keep reading the rows appended to the file (tail), until it
+                           has not grown for <idle> seconds (None: until interrupted)
+        :params poll --> the seconds between two checks of a followed file
+        :return the counters of the stream (see <stats>)
+        """
+        with open(path, newline='', encoding='utf-8-sig') as file:
+            reader = csv.reader(_lines(file, follow, poll, idle, self.flush))
+            header = next(reader, None)
+            if header is None:
+                return self.stats
+            columns = self.columns(header)
+            last = reader.line_num
+            for row in reader:
+                # the first line of the row, a quoted field may span several lines
+                line, last = last + 1, reader.line_num
+                self.stats["rows"] += 1
+                record, reason = self.validate(row, columns)
+                if record is None:
+                    self.reject(path, line, reason)
+                    continue
+                if record["sofifa_id"] in self.pending:
+                    self.stats["coalesced"] += 1
+                    self.pending[record["sofifa_id"]] = record
+                    continue
+                if len(self.pending) >= self.window:
+                    self.flush()
+                self.pending[record["sofifa_id"]] = record
+        self.flush()
+
+        return self.stats
+
+    def columns(self, header):
+        """ The index of each column of the schema in <header> """
+        index = {name: i for i, name in enumerate(header)}
+        missing = [name for name in FIFApre.INFO_COLUMNS + self.abilities if name not in index]
+        if missing:
+            raise DeltaError("the delta file misses the columns %s" % ", ".join(missing))
+        return index
+
+    def validate(self, row, columns):
+        """
+        A row as a record (sofifa_id, op, club, nationality, position, rating, abilities),
+        or None and the reason it is rejected
+        """
+        def field(name):
+            return row[columns[name]].strip() if columns[name] < len(row) else ""
+
+        try:
+            sofifa_id = int(field('sofifa_id'))
+        except ValueError:
+            return None, "sofifa_id: %r is not an integer" % field('sofifa_id')
+        op = field('op').lower() if 'op' in columns else ""
+        if op == DELETE:
+            return {"sofifa_id": sofifa_id, "op": DELETE}, None
+        if op not in ("", "upsert"):
+            return None, "op: %r is neither upsert nor delete" % op
+
+        try:
+            rating = float(field('overall'))
+        except ValueError:
+            return None, "overall: %r is not a number" % field('overall')
+        if not (0 <= rating <= 100 and rating == int(rating)):
+            return None, "overall: %r is not an integer rating" % field('overall')
+        for name in ('club', 'nationality'):
+            if not field(name):
+                return None, "%s: empty" % name
+
+        abilities = {}
+        for name in self.abilities:
+            value = field(name)
+            try:
+                # a missing value: NaN for a new player (as in read_info), unchanged for a known one
+                abilities[name] = float(value) if value else math.nan
+            except ValueError:
+                return None, "%s: %r is not a number" % (name, value)
+
+        position = field('team_position')
+        return {"sofifa_id": sofifa_id, "op": "upsert", "club": field('club'), "nationality": field('nationality'),
+                "position": position if position in FIFApre.POSITIONS[self.div] else None,
+                "rating": int(rating), "abilities": abilities}, None
+
+    def reject(self, path, line, reason):
+        self.stats["rejected"] += 1
+        instrument.count("delta_rejected")
+        if len(self.rejected) < MAX_EXAMPLES:
+            self.rejected.append((path, line, reason))
+
+    def flush(self):
+        """ Apply the pending window to the roster """
+        if not self.pending:
+            return
+        roster = self.roster
+        with instrument.timer("delta_window"), roster.batch():
+            for sofifa_id, record in self.pending.items():
+                if record["op"] == DELETE:
+                    if sofifa_id in roster:
+                        roster.remove(sofifa_id)
+                        self.stats["removed"] += 1
+                    else:
+                        self.stats["unknown_removed"] += 1
+                elif sofifa_id in roster:
+                    roster.modify(sofifa_id, club=record["club"], nationality=record["nationality"],
+                                  position=record["position"], rating=record["rating"],
+                                  abilities=record["abilities"])
+                    self.stats["modified"] += 1
+                else:
+                    position = record["position"] or random.choice(FIFApre.POSITIONS[self.div])
+                    roster.add(sofifa_id, record["club"], record["nationality"], position,
+                               record["rating"], record["abilities"])
+                    self.stats["added"] += 1
+        instrument.count("delta_players", len(self.pending))
+        self.stats["windows"] += 1
+        self.pending = OrderedDict()
+
+
+def _lines(file, follow, poll, idle, on_idle):
+    """
+    The complete lines of <file>; with <follow>, wait for the lines appended to it
+    (a partial last line is read again once complete) and call <on_idle> while waiting
+    """
+    waited = 0.0
+    while True:
+        position = file.tell()
+        line = file.readline()
+        if line.endswith('\n'):
+            waited = 0.0
+            yield line
+            continue
+        if not follow:
+            if line:
+                yield line  # the last line of a file without a final newline
+            return
+        file.seek(position)  # an incomplete line: wait for the rest
+        if idle is not None and waited >= idle:
+            return
+        on_idle()
+        time.sleep(poll)
+        waited += poll
@@ -8,25 +8,31 @@ import os, sys
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(BASE_DIR)
 
-from FBTP import greedy
+import numpy as np
+from FBTP import greedy, teamstats, frontier, instrument
 from FBTP import players as ps
 
 
 
 
+@instrument.timed("fbtp")
 def FBTP(gks, abi_name_id,
          p_no_id_back, pg_back, cri_back,
          p_no_id_forward, pg_forward, cri_forward,
-         budget, alpha, beta, datasource):
+         budget, alpha, beta, datasource, details=False):
     """
     FUNCTION: team composition based on Finding Best Team with Pruning (FBTP) model
     (1) we first discover the team without budget constraint;
     (2) we prune the team if the cost exceeds the budget
+    With <details> the metrics of the final team are returned as well:
+        team_real, {"cost", "ability", "homo_back", "homo_forward", "pruning"}
     """
 
     print("The Budget Constraint is:%.3f" % budget)
 
     team = {}
+    if not isinstance(gks, ps.GoalkeeperTable):
+        gks = ps.GoalkeeperTable.from_goalkeepers(gks)
 
     # +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
     # +                                                                 +
@@ -59,10 +65,10 @@ def FBTP(gks, abi_name_id,
     # 1. calculate the total cost
     # 2. calculate the  average team ability
     # 3. calculate the heterogeneity
-    team_cost, team_ability, homo_back, homo_forward, opt_player_cf \
-        = cal_cost_abi_homo(team, gks, pg_back, pg_forward, cri_back, 
-                            cri_forward, abi_name_id
-                           )
+    # the metrics are updated by delta while pruning
+    state = teamstats.TeamState(team, gks, pg_back, pg_forward, cri_back,
+                                cri_forward, abi_name_id
+                               )
 
 
     # +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
@@ -71,11 +77,44 @@ def FBTP(gks, abi_name_id,
     # +                                                                 +
     # +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
+    team_real, pruning = prune(team, state, budget, p_no_id_back, pg_back, cri_back,
+                               p_no_id_forward, pg_forward, cri_forward, gks, abi_name_id)
+
+    if details:
+        return team_real, team_metrics(state, pruning)
+
+    return team_real
+
+
+def team_metrics(state, pruning):
+    """ The metrics of a final team from its teamstats.TeamState """
+    return {"cost": state.cost,
+            "ability": state.ability(),
+            "homo_back": state.homogeneity("Back"),
+            "homo_forward": state.homogeneity("Forward"),
+            "pruning": pruning}
+
+
+@instrument.timed("pruning")
+def prune(team, state, budget,
+          p_no_id_back, pg_back, cri_back,
+          p_no_id_forward, pg_forward, cri_forward,
+          gks, abi_name_id, batch=False):
+    """
+    FUNCTION: the pruning loop of <FBTP>
+    The player with the lowest cost performance is replaced until the cost is within
+    the budget; <team> and <state> (a teamstats.TeamState of <team>) are updated in place.
+    With <batch> the candidates are scored at once by <select_candidate_batch>.
+
+    :return the team with the real player IDs, the number of pruning rounds
+    """
+
     team_real = {"GK": [], "Back": [], "Forward": []}
+    pruning = 0
 
     while True:
 
-        if team_cost < budget:
+        if state.cost < budget:
             team_real["GK"].append(team["GK"][0])  # goalkeeper ID
     
             for i in team["Back"]:
@@ -85,37 +124,36 @@ def FBTP(gks, abi_name_id,
                 team_real["Forward"].append(p_no_id_forward[j])
             print("\n",
                   "\t", "The optimal players are:", team_real, "\n",
-                  "\t", "The total cost is:", round(team_cost, 3), "\n",
-                  "\t", "The average team ability is:", round(team_ability, 3), "\n",
-                  "\t", "The cost performance is:", opt_player_cf, "\n",
-                  "\t", "The homogeneity of backward is: %.4f" % homo_back, "\n",
-                  "\t", "The heterogeneity of forward/midfielder is: %.4f" % homo_forward,
+                  "\t", "The total cost is:", round(state.cost, 3), "\n",
+                  "\t", "The average team ability is:", round(state.ability(), 3), "\n",
+                  "\t", "The cost performance is:", state.cost_performance(), "\n",
+                  "\t", "The homogeneity of backward is: %.4f" % state.homogeneity("Back"), "\n",
+                  "\t", "The heterogeneity of forward/midfielder is: %.4f" % state.homogeneity("Forward"),
                   "\n")
 
             break
         else:
             # Pruning
-            team_update = cut_base_cf(opt_player_cf, team, pg_back, pg_forward, gks,
-                                      cri_back, cri_forward, abi_name_id,
-                                      alpha=0.7, beta=0.15)
-            # calculate cost, average ability and homogeneity
-            team_up_cost, team_up_ability, homo_up_back, homo_up_forward, opt_player_cf_up\
-                = cal_cost_abi_homo(team, gks, pg_back, pg_forward, cri_back, cri_forward, abi_name_id)
-
-            # update
-            team = team_update
-            team_cost = team_up_cost
-            team_ability = team_up_ability
-            homo_back = homo_up_back
-            homo_forward = homo_up_forward
-            opt_player_cf = opt_player_cf_up
-
-            print('Pruning... the current team cost is %.2f' % team_cost)
+            cut_pos, cut_id = state.next_cut()
+            team = cut_base_cf(state.cf, team, pg_back, pg_forward, gks,
+                               cri_back, cri_forward, abi_name_id,
+                               alpha=0.7, beta=0.15, cut=(cut_pos, cut_id), batch=batch)
+            # update cost, average ability and homogeneity by delta
+            state.swap(cut_pos, cut_id, team[cut_pos][-1])
+            pruning += 1
+            instrument.count("pruning_rounds")
 
-    return team_real
+            print('Pruning... the current team cost is %.2f' % state.cost)
+
+    return team_real, pruning
 
 
 def best_goalkeeper(gks):
+    if isinstance(gks, ps.GoalkeeperTable):
+        opt_gk = gks.get(gks.best())
+        print("The best goalkeeper without budget constraint is:", opt_gk.id)
+        return opt_gk
+
     opt_gk = ''
     score_max = 0
     for gk in gks:
@@ -149,19 +187,21 @@ def cal_cost_abi_homo(team, gks, pg_back, pg_forward, cri_back, cri_for, abi_nam
 
         elif pos == "Back":
             homo_back = cal_homo(team[pos], pg_back)
+            scores = pg_back.ability_scores(cri_back, abi_name_id)
             for i in team[pos]:
                 cost = pg_back.vertexList[i].salary
                 team_cost += cost
-                abi = greedy.cal_player_ability(pg_back.vertexList[i].abilities, cri_back, abi_name_id)
+                abi = float(scores[i])
                 team_ability += abi
                 opt_player_cf[i] = round(abi/cost, 3)
 
         elif pos == "Forward":
             homo_forward = cal_homo(team[pos], pg_forward)
+            scores = pg_forward.ability_scores(cri_for, abi_name_id)
             for j in team[pos]:
                 cost = pg_forward.vertexList[j].salary
                 team_cost += cost
-                abi = greedy.cal_player_ability(pg_forward.vertexList[j].abilities, cri_for, abi_name_id)
+                abi = float(scores[j])
                 team_ability += abi
                 opt_player_cf[j] = round(abi/cost, 3)
 
@@ -170,22 +210,29 @@ def cal_cost_abi_homo(team, gks, pg_back, pg_forward, cri_back, cri_for, abi_nam
     return team_cost, team_ability, homo_back, homo_forward, opt_player_cf
 
 
-def cut_base_cf(player_cf, team, pg_back, pg_forward, gks, cri_back, cri_for, abi_name_id, alpha, beta):
+def cut_base_cf(player_cf, team, pg_back, pg_forward, gks, cri_back, cri_for, abi_name_id, alpha, beta, cut=None,
+                batch=False):
     """
     FUNCTION: Pruning based on the cost performance
+    <cut> is the (position, ID) of the player to cut if already known (see teamstats.TeamState)
+    With <batch> the replacement is chosen by <select_candidate_batch> on a players.CSRGraph.
     """
+    select = select_candidate_batch if batch else select_candidate
 
     # 1. find the player with the lowest of cost performance
     cut_player = ps.CutPlayer(None)
-    cf_min = sys.maxsize
-    for p, cf in player_cf.items():
-        if cf < cf_min:
-            cf_min = cf
-            cut_player.id = p
+    if cut is None:
+        cf_min = sys.maxsize
+        for p, cf in player_cf.items():
+            if cf < cf_min:
+                cf_min = cf
+                cut_player.id = p
+    else:
+        cut_player.id = cut[1]
 
     # 2. delete the player
     for pos, players in team.items():
-        if cut_player.id in players:
+        if cut_player.id in players and (cut is None or pos == cut[0]):
             players.remove(cut_player.id)
             cut_player.cut_pos = pos
             break
@@ -197,18 +244,23 @@ def cut_base_cf(player_cf, team, pg_back, pg_forward, gks, cri_back, cri_for, ab
 
         cut_player.cut_salary = pg_back.vertexList[cut_player.get_id()].salary
         cut_player.cut_position = pg_back.vertexList[cut_player.get_id()].position
-        candidate = select_candidate(team[cut_player.get_cut_pos()], pg_back, cut_player,
-                                     cri_back, abi_name_id, alpha, beta)
+        candidate = select(team[cut_player.get_cut_pos()], pg_back, cut_player,
+                           cri_back, abi_name_id, alpha, beta)
         team[cut_player.get_cut_pos()].append(candidate)
 
     elif cut_player.get_cut_pos() == "Forward":
 
         cut_player.cut_salary = pg_forward.vertexList[cut_player.get_id()].salary
         cut_player.cut_position = pg_forward.vertexList[cut_player.get_id()].position
-        candidate = select_candidate(team[cut_player.get_cut_pos()], pg_forward, cut_player,
-                                     cri_for, abi_name_id, alpha, beta)
+        candidate = select(team[cut_player.get_cut_pos()], pg_forward, cut_player,
+                           cri_for, abi_name_id, alpha, beta)
         team[cut_player.get_cut_pos()].append(candidate)
 
+    elif isinstance(gks, ps.GoalkeeperTable):
+        # the player to be cut is goalkeeper, find the best cheaper one
+        candidate = gks.best_under_salary(gks.get_salary(cut_player.get_id()))
+        team["GK"].append(candidate)
+
     else:
         # the player to be cut is goalkeeper
         opt_abi = 0
@@ -225,35 +277,40 @@ def cut_base_cf(player_cf, team, pg_back, pg_forward, gks, cri_back, cri_for, ab
     return team
 
 
+@instrument.timed("select_candidate")
 def select_candidate(team_sub, pg, cut_player, criteria, abi_name_id, alpha, beta):
 
-    neighbor = list()
+    # focus only on the position to be cut and neglect the players has been selected
+    neighbors = frontier.Frontier(pg.neighbors,
+                                  lambda p: pg.vertexList[p].position,
+                                  {cut_player.get_cut_position(): 1}, index=pg.position_index())
+    neighbors.exclude(cut_player.get_id())
     for player in team_sub:
-        for key in pg.vertexList[player].connectedTo.keys():
-            # focus only on the position to be cut and neglect the players has been selected
-            if key.id not in neighbor and\
-                    key.id not in team_sub and key.id != cut_player.get_id() and\
-                    key.position == cut_player.get_cut_position():
-                neighbor.append(key.id)
+        neighbors.exclude(player)
+    for player in team_sub:
+        neighbors.extend(player)
+    neighbor = neighbors.candidates()
+    instrument.count("candidates_scored", len(neighbor))
 
     # function = ability + density + homogeneity
     density = {}
     team_ability = {}
     team_gini = {}
     team_homo = {}
+    scores = pg.ability_scores(criteria, abi_name_id)
+    team_stats = teamstats.TeamHomogeneity(pg.ability_matrix()[0], team_sub)
     for ne in neighbor:
        
-        ne_abi = greedy.cal_player_ability(
-            pg.vertexList[ne].abilities, criteria, abi_name_id)
+        ne_abi = scores[ne]
         
         weight = 0
         te_abi = ne_abi
         for op in team_sub:
             if pg.vertexList[op] in pg.vertexList[ne].connectedTo:
                 weight += pg.vertexList[ne].get_weight(pg.vertexList[op])
-                te_abi += greedy.cal_player_ability(pg.vertexList[op].abilities, criteria, abi_name_id)
+                te_abi += scores[op]
 
-        gini = greedy.cal_homogeneity(pg.vertexList, ne, team_sub)
+        gini = team_stats.gini(ne)
 
         d = weight / (len(team_sub) + 1)
         density[ne] = d
@@ -291,6 +348,47 @@ def select_candidate(team_sub, pg, cut_player, criteria, abi_name_id, alpha, bet
     return candidate
 
 
+@instrument.timed("select_candidate")
+def select_candidate_batch(team_sub, pg, cut_player, criteria, abi_name_id, alpha, beta):
+    """
+    The batched counterpart of <select_candidate> on a players.CSRGraph: the terms of
+    all the candidates are computed at once by <greedy.score_frontier>, and the
+    candidate is the same (the first best score among the cheaper players)
+    """
+    # one player at the position to be cut, over the raw position codes of the graph
+    quota = np.zeros(len(pg.position_names), dtype=np.int64)
+    if cut_player.get_cut_position() in pg.position_names:
+        quota[pg.position_names.index(cut_player.get_cut_position())] = 1
+    neighbors = frontier.CodedFrontier(pg.neighbors, pg.position_code, quota, index=pg.position_index(),
+                                       group_positions=[[code] for code in range(len(quota))])
+    neighbors.exclude(cut_player.get_id())
+    for player in team_sub:
+        neighbors.exclude(player)
+    for player in team_sub:
+        neighbors.extend(player)
+    neighbor = neighbors.candidate_array()
+    instrument.count("candidates_scored", len(neighbor))
+
+    scores = pg.ability_scores(criteria, abi_name_id)
+    team_stats = teamstats.TeamHomogeneity(pg.ability_matrix()[0], team_sub)
+    density, team_ability, team_gini = greedy.score_frontier(pg, neighbor, team_sub, scores, team_stats)
+
+    if cut_player.get_cut_pos() == "Back":
+        team_homo = 1 / team_gini
+    else:
+        team_homo = team_gini
+
+    # a constant term is 0/0 (NaN) in <select_candidate>, so no candidate wins on it
+    score = alpha * greedy.normalize_min_max_array(team_ability, constant=np.nan) +\
+            beta * density +\
+            (1 - alpha - beta) * greedy.normalize_min_max_array(team_homo, constant=np.nan)
+    eligible = (score > 0) & (pg.salary[neighbor] < cut_player.get_cut_salary())
+    if not eligible.any():
+        return None
+
+    return int(neighbor[int(np.argmax(np.where(eligible, score, -np.inf)))])
+
+
 def cal_homo(team, pg):
     homo = 0
     diff = {}
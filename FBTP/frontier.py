@@ -0,0 +1,199 @@
+# coding=utf-8
+
+"""
+The frontier (the neighbors of the current team) of the greedy selection
+"""
+
+import heapq
+import numpy as np
+
+
+class Frontier:
+    """
+    The neighbors of a team, maintained incrementally
+    - only the neighbors of a newly accepted player are scanned (hash membership);
+    - the candidates are bucketed by position group, and the bucket of a group
+      is dropped as a whole once its quota reaches 0;
+    - the candidates keep the order in which they were first met, i.e. the
+      order of the neighbor list rebuilt from scratch by <greedy.select_opt_players>;
+    - with a position index (posindex.PositionIndex), only the buckets of the groups
+      with a quota left are read, the neighbors at the full positions are never scanned.
+    """
+
+    def __init__(self, neighbors, group_of, quota, index=None, position_group=None):
+        """
+        :params neighbors --> function, player ID --> iterable of the neighbors' IDs
+        :params group_of --> function, player ID --> position group
+        :params quota --> dict(), position group: the number of players still needed
+                          (updated in place by <accept>)
+        :params index --> posindex.PositionIndex of the graph of <neighbors>, optional
+        :params position_group --> function, position --> position group, for the index
+                                   (the position itself by default)
+        """
+        self.neighbors = neighbors
+        self.group_of = group_of
+        self.quota = quota
+        self.index = index
+        self.codes = index.codes(position_group) if index is not None else None  # group --> position codes
+
+        self.team = set()  # the players of the team (or excluded)
+        self.seen = set()  # the players met so far
+        self.buckets = {}  # position group --> {player ID: sequence number}
+        self.seq = 0
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+    def __contains__(self, player):
+        return player in self.seen and player not in self.team and \
+            self.group_of(player) in self.buckets and player in self.buckets[self.group_of(player)]
+
+    def exclude(self, player):
+        """ Never offer <player> as a candidate """
+        self.team.add(player)
+        self.seen.add(player)
+        bucket = self.buckets.get(self.group_of(player))
+        if bucket is not None:
+            bucket.pop(player, None)
+
+    def accept(self, player):
+        """ Add <player> to the team: update the quota, then add its new neighbors """
+        self.exclude(player)
+        group = self.group_of(player)
+        self.quota[group] -= 1
+        if self.quota[group] == 0:
+            self.buckets.pop(group, None)  # drop the whole bucket
+        self.extend(player)
+
+    def extend(self, player):
+        """ Add the new neighbors of a team member, without touching the quota """
+        if self.index is not None:
+            self._extend_index(player)
+            return
+        nbrs = self.neighbors(player)
+        if isinstance(nbrs, np.ndarray):
+            nbrs = nbrs.tolist()
+        for nbr in nbrs:
+            if nbr in self.seen:
+                continue
+            self.seen.add(nbr)
+            group = self.group_of(nbr)
+            if self.quota.get(group, 0) == 0:
+                continue  # the position is full, and stays full
+            self.buckets.setdefault(group, {})[nbr] = self.seq
+            self.seq += 1
+
+    def _extend_index(self, player):
+        """ <extend> over the buckets of the position index (the sequence number follows the neighbor list) """
+        for group, codes in self.codes.items():
+            if self.quota.get(group, 0) == 0:
+                continue
+            bucket = None
+            for code in codes:
+                nbrs, offsets = self.index.bucket(player, code)
+                for nbr, offset in zip(nbrs.tolist(), offsets.tolist()):
+                    if nbr in self.seen:
+                        continue
+                    self.seen.add(nbr)
+                    if bucket is None:
+                        bucket = self.buckets.setdefault(group, {})
+                    bucket[nbr] = self.seq + offset
+        self.seq += int(self.index.degrees[player])
+
+    def candidates(self):
+        """ The candidates, in the order they were first met """
+        if self.index is not None:  # the bucket of a group of several positions is not in that order
+            return self.candidate_array().tolist()
+        merged = heapq.merge(*[[(seq, player) for player, seq in bucket.items()]
+                               for bucket in self.buckets.values()])
+        return [player for _, player in merged]
+
+    def candidate_array(self):
+        """ The candidates as an index array, in the order they were first met """
+        if not self.buckets:
+            return np.zeros(0, dtype=np.int64)
+        players = np.fromiter((p for bucket in self.buckets.values() for p in bucket),
+                              dtype=np.int64, count=len(self))
+        seqs = np.fromiter((s for bucket in self.buckets.values() for s in bucket.values()),
+                           dtype=np.int64, count=len(self))
+        return players[np.argsort(seqs, kind='stable')]
+
+
+class CodedFrontier:
+    """
+    The <Frontier> of a players.CSRGraph over integer position codes
+    - the group of each player is an integer array, the quota an integer array indexed
+      by the group (see positions.py), and the groups with a quota left a boolean mask;
+    - the seen players and the team are boolean masks over the players: the new neighbors
+      of a player are one mask over its neighbor array, not a loop over its edges;
+    - the candidates are the arrays of new neighbors in the order met, filtered by the
+      open groups and the team when they are read (a group never reopens).
+    The candidates are the ones of <Frontier>, in the same order.
+    """
+
+    def __init__(self, neighbors, group, quota, index=None, group_positions=None):
+        """
+        :params neighbors --> function, player ID --> array of the neighbors' IDs
+        :params group --> the group code of every player (negative: no group)
+        :params quota --> integer array, group code: the number of players still needed
+                          (updated in place by <accept>)
+        :params index --> posindex.PositionIndex of the graph of <neighbors>, optional
+        :params group_positions --> the position codes of the index of each group
+        """
+        self.neighbors = neighbors
+        self.group = np.asarray(group)
+        self.quota = quota
+        self.open = np.append(np.asarray(quota) > 0, False)  # the last one for the players without a group
+        self.index = index
+        self.group_positions = group_positions
+
+        self.team = np.zeros(len(self.group), dtype=bool)  # the players of the team (or excluded)
+        self.seen = np.zeros(len(self.group), dtype=bool)  # the players met so far
+        self.met = []  # the arrays of new neighbors, in the order met
+
+    def __len__(self):
+        return len(self.candidate_array())
+
+    def __contains__(self, player):
+        return bool(self.seen[player] and not self.team[player] and self.open[self.group[player]])
+
+    def exclude(self, player):
+        """ Never offer <player> as a candidate """
+        self.team[player] = True
+        self.seen[player] = True
+
+    def accept(self, player):
+        """ Add <player> to the team: update the quota, then add its new neighbors """
+        self.exclude(player)
+        group = int(self.group[player])
+        if group < 0:
+            raise KeyError("player %s has no position group" % player)
+        self.quota[group] -= 1
+        self.open[group] = self.quota[group] > 0
+        self.extend(player)
+
+    def extend(self, player):
+        """ Add the new neighbors of a team member, without touching the quota """
+        if self.index is not None:
+            codes = [code for group in np.flatnonzero(self.open[:-1]).tolist()
+                     for code in self.group_positions[group]]
+            nbrs = self.index.neighbors(player, codes)
+            new = nbrs[~self.seen[nbrs]]
+        else:
+            nbrs = np.asarray(self.neighbors(player), dtype=np.int64)
+            new = nbrs[~self.seen[nbrs] & self.open[self.group[nbrs]]]
+        self.seen[nbrs] = True
+        self.met.append(new)
+
+    def candidates(self):
+        """ The candidates, in the order they were first met """
+        return self.candidate_array().tolist()
+
+    def candidate_array(self):
+        """ The candidates as an index array, in the order they were first met """
+        if not self.met:
+            return np.zeros(0, dtype=np.int64)
+        met = np.concatenate(self.met)
+        met = met[self.open[self.group[met]] & ~self.team[met]]
+        self.met = [met]  # the filtered players never come back
+        return met
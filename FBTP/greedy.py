@@ -25,12 +25,12 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.getcwd()))
 sys.path.append(BASE_DIR)
 sys.path.append('TCFPACN')  # Ensure the custom module is accessible
 
-from FBTP import players, modules
-import re  # For regular expression matching of positions
+from FBTP import players, modules, teamstats, frontier, positions, instrument
 import math
 import numpy as np
 
 
+@instrument.timed("graph")
 def players_graph_construction(sim, abi_avg, abis_name, abi_name_id, pos, rating):
     """
     Constructs a graph representation of football players based on their similarities and abilities.
@@ -80,15 +80,53 @@ def players_graph_construction(sim, abi_avg, abis_name, abi_name_id, pos, rating
     return players_graph
 
 
+@instrument.timed("graph")
+def players_csr_graph_construction(sim, abi_avg, abis_name, abi_name_id, pos, rating):
+    """
+    Constructs the compact (CSR backed) counterpart of <players_graph_construction>.
+    Every row of <sim> is a vertex, the last one included: the loop of
+    <players_graph_construction> stops at the second last row and leaves the last player out.
+
+    Args:
+        sim: A (dense or scipy.sparse) similarity matrix, e.g. from modules.cal_similarity_sparse.
+        abi_avg, abis_name, abi_name_id, pos, rating: as in <players_graph_construction>.
+
+    Returns:
+        A players.CSRGraph object representing the constructed graph.
+    """
+
+    # the top 10 abilities, kept in the order of <abis_name>
+    tmp_sorted = sorted(abi_avg.items(), key=lambda x: x[1], reverse=True)
+    ability_major = [abl[0] for abl in tmp_sorted[:10]]
+    ability_names = [name for name in abis_name if name in ability_major]
+
+    no = sim.shape[0]
+    abilities = np.full((no, len(ability_names)), np.nan)
+    for c, name in enumerate(ability_names):
+        for i, value in abis_name[name].items():
+            if i < no:
+                abilities[i, c] = value
+
+    position = [pos[i] for i in range(0, no)]
+    salary = cal_player_salary(np.arange(no), np.array([rating[i] for i in range(0, no)]))
+
+    return players.CSRGraph.from_similarity(sim, position, salary, abilities,
+                                            [abi_name_id[name] for name in ability_names])
+
+
 # Calculate a player's salary based on his rating, using an exponential formula.
 def cal_player_salary(i, player_rating):
     eta = 0.0006375
     theta = 0.1029
+    if isinstance(i, np.ndarray):  # vectorised, for the rows <i> of the rating array
+        return eta * np.exp(theta*player_rating[i])
     salary = eta * math.exp(theta*player_rating[i])
     return salary
 
 
-def player_opt_subgraph(player_no_id, pg, criteria, abi_name_id, alpha, beta, network_name, datasource):
+@instrument.timed("player_opt_subgraph")
+def player_opt_subgraph(player_no_id, pg, criteria, abi_name_id, alpha, beta, network_name, datasource, batch=False,
+                        star=None, beam_width=None, starts=None, processes=1):
     """
     FUNCTION: find the optimal subgraph based on greedy algorithm
     STEP 1:
@@ -98,22 +136,59 @@ def player_opt_subgraph(player_no_id, pg, criteria, abi_name_id, alpha, beta, ne
     STEP 3:
         Returns the list of selected players (opt_players).
 
+    With <batch> the whole frontier is scored at once by <select_opt_players_batch>
+    (a players.Graph is converted to a players.CSRGraph first).
+    <star> is the centre player if already known (it depends on the criteria only).
+    With <beam_width> the team is the best of a beam search (see search.beam_search)
+    expanded by <processes> workers.
+    With <starts> the team is the best of the greedy selections from that many centre
+    players (see search.multi_start), run by <processes> workers; search.SearchError
+    (with the error of each start) if none of them gave a team.
     """
 
+    # the criteria-weighted abilities, cached on the graph
+    scores = pg.ability_scores(criteria, abi_name_id)
+
+    if starts is not None:
+        from FBTP import search
+        return search.multi_start(player_no_id, pg, criteria, abi_name_id, alpha, beta, network_name, datasource,
+                                  k=starts, processes=processes)[0]
+
     # pick a centre player
-    star = select_star(player_no_id, pg.vertexList, criteria, abi_name_id, alpha=0.8)
+    if star is None:
+        star = select_star(player_no_id, pg.vertexList, criteria, abi_name_id, alpha=0.8,
+                           stats=pg.node_stats(criteria, abi_name_id))
     # find the best player set
+    if beam_width is not None:
+        from FBTP import search
+        return search.beam_search(player_no_id, pg, scores, alpha, beta, star, network_name, datasource,
+                                  width=beam_width, processes=processes)
+    if batch:
+        if not isinstance(pg, players.CSRGraph):
+            pg = players.CSRGraph.from_graph(pg)
+        return select_opt_players_batch(player_no_id, pg, scores, alpha, beta, star, network_name, datasource)
+
     opt_players = select_opt_players(player_no_id, pg.vertexList, criteria, abi_name_id,
-                                     alpha, beta, star, network_name, datasource
+                                     alpha, beta, star, network_name, datasource, scores=scores,
+                                     abilities=pg.ability_matrix()[0]
                                     )
 
     return opt_players
 
 
-def select_star(player_num_id, vertex_list, criteria, abi_name_id, alpha):
-"""
-Select the core player based on skill and grade.
-"""
+@instrument.timed("select_star")
+def select_star(player_num_id, vertex_list, criteria, abi_name_id, alpha, scores=None, stats=None):
+    """
+    Select the core player based on skill and grade.
+    <scores> are the precomputed player abilities (see players.Graph.ability_scores).
+    <stats> is the nodestats.NodeStats of the graph for the criteria (see players.Graph.node_stats):
+    the centre player is then an argmax over its cached arrays.
+    """
+    if stats is not None:
+        star = stats.star(alpha)
+        print("alpha = %.1f, the centre player is: %s" % (alpha, player_num_id[star]))
+        return star
+
     star = None
     star_score = 0
 
@@ -129,7 +204,10 @@ Select the core player based on skill and grade.
         player_pa_de[player_id] = []
 
         # calculate the football players' ability - player ability(pa)
-        pa = cal_player_ability(vertex.abilities, criteria, abi_name_id)
+        if scores is None:
+            pa = cal_player_ability(vertex.abilities, criteria, abi_name_id)
+        else:
+            pa = scores[player_id]
         player_pa_de[player_id].append(pa)
         if pa > pa_max:
             pa_max = pa
@@ -160,31 +238,40 @@ Select the core player based on skill and grade.
 
 
 def cal_player_ability(abilities, criteria, abi_name_id):
-"""
-Calculates a player's ability by weighting their skills individual assessment criteria.
-"""
+    """
+    Calculates a player's ability by weighting their skills individual assessment criteria.
+    """
     player_ability = 0
+    abi_id_name = {abi_id: name for name, abi_id in abi_name_id.items()}
 
     for abi_id, score in abilities.items():
-        abi_name = list(abi_name_id.keys())[list(abi_name_id.values()).index(abi_id)]
-        player_ability += criteria[abi_name] * score
+        player_ability += criteria[abi_id_name[abi_id]] * score
 
     return player_ability
 
 
 def cal_player_degree(player_co):
-"""
-Calculates a player's degree (number of connections in the graph).
-"""
+    """
+    Calculates a player's degree (number of connections in the graph).
+    """
     degree = len(player_co)
     return degree
 
 
-def select_opt_players(player_num_id, vertex_list, criteria, ability_name_id, alpha, beta, star, network_name, datasource, k=1):
+def select_opt_players(player_num_id, vertex_list, criteria, ability_name_id, alpha, beta, star, network_name, datasource, k=1,
+                       scores=None, abilities=None):
     """
     FUNCTION: Find the players
     Selects team players iteratively.
+    <scores> are the precomputed player abilities (see players.Graph.ability_scores).
+    <abilities> is the players x abilities matrix (see players.Graph.ability_matrix), if given
+    the Gini coefficients are computed incrementally with teamstats.TeamHomogeneity.
     """
+    if scores is None:
+        scores = {}
+        for player_id, vertex in vertex_list.items():
+            scores[player_id] = cal_player_ability(vertex.abilities, criteria, ability_name_id)
+
     # the number of players in each position
     if datasource == 'PES':
         position_num = {"CB": 2, "LB": 1, "RB": 1, "CF/SS": 1, "LWF": 1, "RWF": 1, "*MF": 3}
@@ -197,7 +284,14 @@ def select_opt_players(player_num_id, vertex_list, criteria, ability_name_id, al
 
     opt_players.append(star)  # add the centre player
     opt_players_position[player_num_id[star]] = vertex_list[star].position
-    update_position(position_num, vertex_list[star].position, datasource)
+    # the neighbors of opt_players, updated with the neighbors of each accepted player
+    group_of = position_group_of(vertex_list, datasource)
+    neighbors = frontier.Frontier(lambda p: [key.id for key in vertex_list[p].connectedTo.keys()],
+                                  group_of, position_num)
+    neighbors.accept(star)
+    team_stats = None
+    if abilities is not None:
+        team_stats = teamstats.TeamHomogeneity(abilities, opt_players)
 
     threshold = 4  # the maximum number of players to be selected
     if network_name == "Forward":
@@ -205,12 +299,9 @@ def select_opt_players(player_num_id, vertex_list, criteria, ability_name_id, al
 
     while k < threshold:
         # get all neighbors of opt_players
-        neighbor = list()
-        for player in opt_players:
-            for key in vertex_list[player].connectedTo.keys():
-                if key.id not in neighbor and key.id not in opt_players and \
-                   position_num[position_trans(key.position, datasource)] != 0:
-                    neighbor.append(key.id)
+        neighbor = neighbors.candidates()
+        instrument.observe("frontier_size:" + network_name, len(neighbor))
+        instrument.count("candidates_scored", len(neighbor))
 
         # function = ability + density + homogeneity
         density = {}
@@ -219,7 +310,7 @@ def select_opt_players(player_num_id, vertex_list, criteria, ability_name_id, al
         team_homo = {}
         for ne in neighbor:  # walk through all neighbors
             # calculate the personal ability of neighbor
-            ne_abi = cal_player_ability(vertex_list[ne].abilities, criteria, ability_name_id)
+            ne_abi = scores[ne]
             # calculate the weights and abilities of neighbor with opt_players
             weight = 0
             te_abi = ne_abi
@@ -228,10 +319,13 @@ def select_opt_players(player_num_id, vertex_list, criteria, ability_name_id, al
                     # cumulate the weight
                     weight += vertex_list[ne].get_weight(vertex_list[op]) 
                     # cumulate the team ability
-                    te_abi += cal_player_ability(vertex_list[op].abilities, criteria, ability_name_id)
+                    te_abi += scores[op]
 
             # calculate the Gini coefficient
-            gini = cal_homogeneity(vertex_list, ne, opt_players)
+            if team_stats is None:
+                gini = cal_homogeneity(vertex_list, ne, opt_players)
+            else:
+                gini = team_stats.gini(ne)
 
             d = weight / (len(opt_players)+1)  # calculate the density
             density[ne] = d
@@ -264,7 +358,9 @@ def select_opt_players(player_num_id, vertex_list, criteria, ability_name_id, al
 
         # add the best player
         opt_players.append(candidate)
-        update_position(position_num, vertex_list[candidate].position, datasource)
+        if team_stats is not None:
+            team_stats.add(candidate)
+        neighbors.accept(candidate)
         opt_players_position[player_num_id[candidate]] = vertex_list[candidate].position
 
         k += 1
@@ -280,44 +376,141 @@ def select_opt_players(player_num_id, vertex_list, criteria, ability_name_id, al
     return opt_players
 
 
-def update_position(position_num, player_position, datasource):
-    """ Update the number of players in position"""
-    position = position_trans(player_position, datasource)
-    position_num[position] -= 1
+def select_opt_players_batch(player_num_id, pg, scores, alpha, beta, star, network_name, datasource):
+    """
+    FUNCTION: the batched counterpart of <select_opt_players> on a players.CSRGraph
+    In each iteration the frontier is an index array, and the density, team ability,
+    homogeneity, min-max normalisation and score of all the candidates are NumPy
+    reductions over the adjacency and ability arrays. The selected team is the same.
+    There is no lazy (CELF-style) variant: the team ability and the homogeneity are
+    min-max normalised over the whole frontier, so one new Gini coefficient can move
+    the score of every candidate and a cached score is no bound; the Gini coefficients
+    of the whole frontier are one <teamstats.TeamHomogeneity.gini_batch> call.
+    The selection differs from <select_opt_players> when a term is constant over the
+    frontier (a single candidate, say): the term is normalised to 0 here, where the legacy
+    selection raises ZeroDivisionError (or scores NaN and finds no candidate). The
+    candidate is then the one of the best density, and there is none if no score is positive.
+    """
+    opt_players = [star]  # initialize the optimal player set
+    opt_players_position = {player_num_id[star]: pg.position_of(star)}
+    neighbors = position_frontier(pg, datasource, positions.quota(datasource))
+    neighbors.accept(star)
+    team_stats = teamstats.TeamHomogeneity(pg.abilities, opt_players)
 
-    return position_num
+    threshold = 4  # the maximum number of players to be selected
+    if network_name == "Forward":
+        threshold = 6
+
+    for k in range(1, threshold):
+        # the neighbors of opt_players, in the order of <select_opt_players>
+        neighbor = neighbors.candidate_array()
+        instrument.observe("frontier_size:" + network_name, len(neighbor))
+        instrument.count("candidates_scored", len(neighbor))
+
+        density, team_ability, team_gini = score_frontier(pg, neighbor, opt_players, scores, team_stats)
+
+        if network_name == "Back":
+            team_homo = 1/team_gini  # homogeneity
+        elif network_name == "Forward":
+            team_homo = team_gini  # heterogeneity
+
+        # find the best player with maximum team ability + density + homogeneity
+        score = alpha * normalize_min_max_array(team_ability) + \
+                beta * density + \
+                (1-alpha-beta) * normalize_min_max_array(team_homo)
+        best = int(np.argmax(score)) if len(score) else None
+        if best is None or score[best] <= 0:
+            candidate = None
+        else:
+            candidate = int(neighbor[best])
+
+        # add the best player
+        player_no = player_num_id[candidate]  # a KeyError if there is none
+        opt_players.append(candidate)
+        team_stats.add(candidate)
+        neighbors.accept(candidate)
+        opt_players_position[player_no] = pg.position_of(candidate)
+
+    # get the player ID
+    opt_players_real = []
+    for player_id in opt_players:
+        opt_players_real.append(player_num_id[player_id])
+
+    print("The best players are:", opt_players_real)
+    print("The positions of each players are:", opt_players_position)
+
+    return opt_players
+
+
+def score_frontier(pg, neighbor, opt_players, scores, team_stats):
+    """
+    The raw terms of the objective for every candidate of the frontier <neighbor>
+    - density: the similarities to opt_players / (len(opt_players)+1);
+    - team ability: the candidate's ability + the abilities of its neighbors in opt_players;
+    - Gini coefficient of "opt_players + candidate".
+    The team is accumulated member by member, as in <select_opt_players>.
+    """
+    weight = np.zeros(len(neighbor))
+    team_ability = scores[neighbor].astype(np.float64)
+    for op in opt_players:
+        row = pg.neighbors(op)
+        pos = np.minimum(np.searchsorted(row, neighbor), len(row)-1)
+        hit = row[pos] == neighbor if len(row) else np.zeros(len(neighbor), dtype=bool)
+        weight += np.where(hit, pg.neighbor_weights(op)[pos], 0)
+        team_ability += np.where(hit, scores[op], 0)
+
+    density = weight / (len(opt_players)+1)
+    team_gini = team_stats.gini_batch(neighbor)
+
+    return density, team_ability, team_gini
+
+
+def position_group_of(pg, datasource):
+    """
+    The function player ID --> translated position (see <position_trans>),
+    <position_trans> is called once per distinct position.
+    :params pg --> players.CSRGraph or a vertex list
+    """
+    if isinstance(pg, players.CSRVertexList):
+        pg = pg.graph
+    if isinstance(pg, players.CSRGraph):
+        code_position = [position_trans(name, datasource) for name in pg.position_names]
+        return lambda player: code_position[pg.position_code[player]]
+
+    translated = {}
+
+    def group_of(player):
+        position = pg[player].position
+        if position not in translated:
+            translated[position] = position_trans(position, datasource)
+        return translated[position]
+
+    return group_of
+
+
+def position_frontier(pg, datasource, quota):
+    """
+    The frontier.CodedFrontier of a sub-team on a players.CSRGraph: the position groups are
+    integer codes (positions.py), and the neighbors at a full position are dropped by a mask
+    over the neighbor array (faster than the union of the position index buckets of the
+    several open groups)
+    :params quota --> integer array, the number of players in each group (positions.quota)
+    """
+    return frontier.CodedFrontier(pg.neighbors, pg.position_groups(datasource), quota)
 
 
 def position_trans(player_position, datasource):
-"""
-Translates a player's position to a standard format
-"""
-    if datasource == 'PES':
-        if re.match(r".+MF", player_position):
-            player_position = "*MF"
-        elif player_position == "CF" or player_position == "SS":
-            player_position = "CF/SS"
-    elif datasource == 'FIFA':
-        FOR = ['LS','LF','CF','RF','RS','ST','LW','SS','RW']  # Forward
-        MID = ['LAM','CAM','RAM','CM','LM','LCM','RCM','RM','LDM','CDM','RDM']  # Midfielder
-        RBS = ['RWB','RCB','RB']  # RB
-        LBS = ['LWB','LCB','LB']  # LB
-        if player_position in FOR:
-            player_position = 'FOR'
-        elif player_position in MID:
-            player_position = 'MID'
-        elif player_position in RBS:
-            player_position = 'RB'
-        elif player_position in LBS:
-            player_position = 'LB'
-
-    return player_position
+    """
+    Translates a player's position to a standard format
+    """
+    return positions.translate(player_position, datasource)
 
 
 def cal_homogeneity(vertex_list, neighbor, opt_players):
-"""
-Calculate the homogeneity (or heterogeneity, depending on the type of network) of a set of players using the Gini index.
-"""
+    """
+    Calculate the homogeneity (or heterogeneity, depending on the type of network) of a set of players using the Gini index.
+    """
+    instrument.count("cal_homogeneity")
 
     homo = 0
     com_players = list()
@@ -375,9 +568,9 @@ def normalize(dict_type):
 
 
 def normalize_min_max(dict_type):
-"""
-Normalizes the values of a dictionary between 0 and 1.
-"""
+    """
+    Normalizes the values of a dictionary between 0 and 1.
+    """
 
     value_min = sys.maxsize
     value_max = 0
@@ -393,3 +586,18 @@ Normalizes the values of a dictionary between 0 and 1.
         tmp[key] = (value-value_min)/(value_max-value_min)
 
     return tmp
+
+
+def normalize_min_max_array(values, constant=0.0):
+    """
+    <normalize_min_max> over an array, a constant array is normalized to <constant>
+    (NaN, as the 0/0 of <normalize_min_max> on NumPy floats, or 0); <normalize_min_max>
+    raises ZeroDivisionError instead on a constant dict of Python floats
+    """
+    if len(values) == 0:
+        return values
+    value_min = min(values.min(), sys.maxsize)
+    value_max = max(values.max(), 0)
+    if value_max == value_min:
+        return np.full(len(values), constant)
+    return (values-value_min)/(value_max-value_min)
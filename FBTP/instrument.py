@@ -0,0 +1,145 @@
+# coding=utf-8
+
+"""
+Opt-in instrumentation of the pipeline: stage timers and algorithm counters
+
+    from FBTP import instrument
+
+    with instrument.recording(sink=instrument.JsonSink("run.json")) as rec:
+        team = fbtp.FBTP(...)
+    rec.to_dict()  # {"timers": ..., "counters": ..., "series": ...}
+
+The hot paths call <timer>, <count> and <observe> unconditionally. Outside a
+<recording> they return at once (a None test and a shared no-op context), so
+the instrumentation costs nothing measurable when it is disabled.
+
+- timers: name --> {"calls", "wall", "cpu"} in seconds, accumulated over the calls;
+- counters: name --> the sum of the counted values;
+- series: name --> the list of the observed values, in order
+  (e.g. the size of the frontier at each iteration of the greedy selection).
+"""
+
+import contextlib
+import functools
+import json
+import sys
+import time
+
+
+_recorder = None  # the active <Recorder>, None when the instrumentation is disabled
+_NULL = contextlib.nullcontext()
+
+
+class Recorder:
+
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self.series = {}
+
+    def add_time(self, name, wall, cpu):
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = {"calls": 0, "wall": 0.0, "cpu": 0.0}
+        timer["calls"] += 1
+        timer["wall"] += wall
+        timer["cpu"] += cpu
+
+    def to_dict(self):
+        return {"timers": self.timers, "counters": self.counters, "series": self.series}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+class _Timer:
+
+    __slots__ = ("recorder", "name", "wall", "cpu")
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.add_time(self.name, time.perf_counter() - self.wall, time.process_time() - self.cpu)
+        return False
+
+
+def enabled():
+    return _recorder is not None
+
+
+def timer(name):
+    """ A context manager timing the stage <name> (wall and CPU time) """
+    if _recorder is None:
+        return _NULL
+    return _Timer(_recorder, name)
+
+
+def timed(name):
+    """ A decorator timing every call of a function as the stage <name> """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return func(*args, **kwargs)
+            with _Timer(_recorder, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    """ Add <value> to the counter <name> """
+    if _recorder is None:
+        return
+    _recorder.counters[name] = _recorder.counters.get(name, 0) + value
+
+
+def observe(name, value):
+    """ Append <value> to the series <name> """
+    if _recorder is None:
+        return
+    _recorder.series.setdefault(name, []).append(value)
+
+
+@contextlib.contextmanager
+def recording(sink=None):
+    """
+    Enable the instrumentation within the block and yield its <Recorder>;
+    on exit the record is passed to <sink> (any callable taking the dict), if given.
+    Recordings nest: an inner one gets only the events of its block.
+    """
+    global _recorder
+
+    previous, _recorder = _recorder, Recorder()
+    recorder = _recorder
+    try:
+        yield recorder
+    finally:
+        _recorder = previous
+        if sink is not None:
+            sink(recorder.to_dict())
+
+
+class JsonSink:
+    """ A sink writing the record as JSON to a file path or an open file (stderr by default) """
+
+    def __init__(self, file=None, **extra):
+        """ :params extra --> other entries written with the record, e.g. the team """
+        self.file = file
+        self.extra = extra
+
+    def __call__(self, record):
+        record = dict(self.extra, **record)
+        if self.file is None or hasattr(self.file, "write"):
+            json.dump(record, self.file or sys.stderr, indent=1, default=str)
+            (self.file or sys.stderr).write("\n")
+        else:
+            with open(self.file, 'w') as file:
+                json.dump(record, file, indent=1, default=str)
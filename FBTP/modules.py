@@ -1,10 +1,14 @@
 # coding=utf-8
 
 import numpy as np
+from scipy import sparse
+from collections.abc import Mapping
+from FBTP import instrument
 
 
 
 
+@instrument.timed("similarity")
 def cal_similarity(network_name, player_attributes):
     """
     :params player_attributes --> dict()
@@ -35,6 +39,320 @@ def cal_similarity(network_name, player_attributes):
     return similarity
 
 
+@instrument.timed("similarity")
+def cal_similarity_sparse(network_name, player_attributes):
+    """
+    FUNCTION: the sparse counterpart of <cal_similarity>
+    Players are grouped by attribute value through an inverted index
+    (club --> players, nationality --> players), so only the pairs sharing at
+    least one value are ever generated. The Jaccard values of these pairs are
+    computed with sparse matrix products instead of a Python double loop.
+
+    :params player_attributes --> dict()
+        player id : [team, nationality]
+
+    :return a symmetric scipy.sparse.csr_matrix, sim[i, j] = jaccard(i, j),
+            including the diagonal (sim[i, i] = 1)
+    """
+
+    no = len(player_attributes)
+    mul, occ = token_matrices(player_attributes)
+
+    # the intersection and the number of distinct shared values of every pair
+    # sharing a value, <jaccard> counts the repeated values of the first list
+    inter = (mul @ occ.T).tocsr()
+    common = (occ @ occ.T).tocsr()
+    inter.sort_indices()
+    common.sort_indices()
+
+    # |union| = |set(i)| + |set(j)| - |set(i) & set(j)|
+    distinct = np.asarray(occ.sum(axis=1)).ravel()
+    row = np.repeat(np.arange(no), np.diff(common.indptr))
+    union = distinct[row] + distinct[common.indices] - common.data
+
+    similarity = sparse.csr_matrix((inter.data / union, common.indices, common.indptr),
+                                   shape=(no, no))
+    # sim(i,j) = sim(j,i) = jaccard(i, j) for i <= j, as in <cal_similarity>
+    upper = sparse.triu(similarity)
+    similarity = (upper + sparse.triu(upper, k=1).T).tocsr()
+    similarity.sort_indices()
+
+    no, edge, density = cal_similarity_stats(similarity)
+    print("The %s network includes %d vertex and %d edges, the density is %f" 
+          % (network_name, no, edge, density)
+         )
+
+    return similarity
+
+
+def token_matrices(player_attributes):
+    """
+    The inverted index of the attribute values (value --> token) as two sparse matrices:
+    mul[i, t] = the number of times token t appears in the attributes of i,
+    occ[i, t] = 1 if token t appears in the attributes of i
+    """
+    no = len(player_attributes)
+    token_id = {}
+    rows = []
+    cols = []
+    for i in range(0, no):
+        for val in player_attributes[i]:
+            rows.append(i)
+            cols.append(token_id.setdefault(val, len(token_id)))
+
+    mul = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(no, len(token_id)))
+    mul.sum_duplicates()
+    occ = mul.copy()
+    occ.data[:] = 1
+
+    return mul, occ
+
+
+MINHASH_PRIME = (1 << 31) - 1  # the modulus of the MinHash hash functions
+MINHASH_MAX_BUCKET = 200  # the largest LSH bucket of a band, see <cal_similarity_minhash>
+
+
+@instrument.timed("similarity")
+def cal_similarity_minhash(network_name, player_attributes, bands=32, rows=4, threshold=0.0, seed=0,
+                           chunk=1 << 15, max_bucket=MINHASH_MAX_BUCKET):
+    """
+    FUNCTION: the approximate counterpart of <cal_similarity_sparse>, MinHash signatures with LSH banding
+    STEP 1:
+        the signature of a player is the minimum of <bands> x <rows> random hash functions
+        over its attribute values (any number of values: club, nationality, league, tags...)
+    STEP 2:
+        the signatures are cut into <bands> bands of <rows> values, the players with the
+        same band are candidate pairs (a pair of Jaccard J is a candidate with the
+        probability 1-(1-J^rows)^bands, see <lsh_threshold>); a bucket of more than
+        <max_bucket> players is split at random into buckets of <max_bucket>, so a band
+        gives at most about <max_bucket>/2 pairs per player
+    STEP 3:
+        the similarity of a candidate pair is the fraction of equal signature values, an
+        estimate of its Jaccard; band by band, the new candidates are estimated and the
+        ones at <threshold> or below are dropped before the next band
+    More bands: a higher recall and more candidates; more rows: fewer false candidates
+    and a lower recall of the weak pairs. See <cal_similarity_error> for the error.
+    The edges found are mostly the pairs near or above <lsh_threshold>, 0.42 with the
+    default 32 x 4: <threshold>=0.0 keeps every candidate, but most of the weaker exact
+    edges are not candidates (31% of the exact edges of FIFA Back are found). Fewer rows
+    find more of them, e.g. 64 x 2 (threshold 0.125), for more candidates.
+
+    :params player_attributes --> dict()
+        player id : [team, nationality, ...]
+    :params chunk --> the number of (player, value) entries hashed at a time
+    :params max_bucket --> the largest bucket of a band (None: no limit, quadratic in the
+                           bucket size, e.g. the players of a common nationality)
+
+    :return a symmetric scipy.sparse.csr_matrix in the layout of <cal_similarity_sparse>
+            (sim[i, j] = the estimated Jaccard, sim[i, i] = 1)
+    """
+
+    no = len(player_attributes)
+    _, occ = token_matrices(player_attributes)
+    occ.sort_indices()
+    signature = minhash_signatures(occ, bands * rows, seed, chunk)
+    has_tokens = np.diff(occ.indptr) > 0
+
+    # the edges (i < j) kept so far, keyed i*no + j and sorted, and their estimates
+    players = np.flatnonzero(has_tokens)
+    rng = np.random.default_rng(seed)
+    pairs = np.zeros(0, dtype=np.int64)
+    estimate = np.zeros(0)
+    step = max(1, chunk * 64 // (bands * rows))  # the pairs compared at a time
+    for band in range(0, bands):
+        # the band as a 64-bit key: a collision only adds a candidate, estimated in STEP 3
+        key = np.zeros(len(players), dtype=np.uint64)
+        for value in signature[players, band*rows:(band+1)*rows].T:
+            key = key * np.uint64(MINHASH_PRIME) + value
+        candidates = np.unique(_bucket_pairs(players, key, no, max_bucket, rng))
+        # only the candidates not kept by an earlier band
+        if len(pairs):
+            at = np.minimum(np.searchsorted(pairs, candidates), len(pairs) - 1)
+            candidates = candidates[pairs[at] != candidates]
+        instrument.count("minhash_candidates", len(candidates))
+
+        first, second = candidates // no, candidates % no
+        value = np.empty(len(candidates))
+        for start in range(0, len(candidates), step):
+            end = start + step
+            value[start:end] = (signature[first[start:end]] == signature[second[start:end]]).mean(axis=1)
+        keep = value > threshold
+        at = np.searchsorted(pairs, candidates[keep])
+        pairs = np.insert(pairs, at, candidates[keep])
+        estimate = np.insert(estimate, at, value[keep])
+
+    first, second = pairs // no, pairs % no
+
+    loops = np.flatnonzero(has_tokens)
+    similarity = sparse.csr_matrix((np.concatenate([estimate, estimate, np.ones(len(loops))]),
+                                    (np.concatenate([first, second, loops]),
+                                     np.concatenate([second, first, loops]))),
+                                   shape=(no, no))
+    similarity.sort_indices()
+
+    no, edge, density = cal_similarity_stats(similarity)
+    print("The %s network includes %d vertex and %d edges, the density is %f"
+          " (MinHash, %d bands x %d rows, threshold %.3f)"
+          % (network_name, no, edge, density, bands, rows, lsh_threshold(bands, rows))
+         )
+
+    return similarity
+
+
+def minhash_signatures(occ, num_perm, seed=0, chunk=1 << 15):
+    """
+    The MinHash signatures of the rows of a sparse 0/1 matrix (e.g. <token_matrices>):
+    players x num_perm, min over the tokens t of (a*t + b) mod MINHASH_PRIME,
+    MINHASH_PRIME for a player without tokens
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MINHASH_PRIME, num_perm, dtype=np.uint64)
+    b = rng.integers(0, MINHASH_PRIME, num_perm, dtype=np.uint64)
+
+    no = occ.shape[0]
+    signature = np.full((no, num_perm), MINHASH_PRIME, dtype=np.uint32)
+    counts = np.diff(occ.indptr)
+    start = 0
+    while start < no:
+        # the players of the chunk, at least one
+        end = max(start + 1, int(np.searchsorted(occ.indptr, occ.indptr[start] + chunk, side='right')) - 1)
+        end = min(end, no)
+        lo, hi = occ.indptr[start], occ.indptr[end]
+        if hi > lo:
+            tokens = occ.indices[lo:hi].astype(np.uint64)
+            hashed = (tokens[:, None] * a[None, :] + b[None, :]) % MINHASH_PRIME
+            filled = np.flatnonzero(counts[start:end] > 0)
+            signature[start + filled] = np.minimum.reduceat(hashed, occ.indptr[start:end][filled] - lo, axis=0)
+        start = end
+
+    return signature
+
+
+def _bucket_pairs(players, group, no, max_bucket=None, rng=None):
+    """
+    The pairs (i < j) of the <players> with the same <group> key, keyed i*no + j;
+    a group of more than <max_bucket> players is split at random (by <rng>) into
+    buckets of <max_bucket> players, and only the pairs within a bucket are given
+    """
+    if max_bucket is None:
+        order = np.argsort(group, kind='stable')
+    else:
+        order = np.lexsort((rng.random(len(group)), group))  # the players of a group shuffled
+    sorted_group = group[order]
+    run_start = np.concatenate([[0], np.flatnonzero(np.diff(sorted_group)) + 1])
+    run_length = np.diff(np.concatenate([run_start, [len(order)]]))
+    position = np.arange(len(order)) - np.repeat(run_start, run_length)
+    if max_bucket is not None and len(order) and run_length.max() > max_bucket:
+        instrument.count("minhash_split_buckets", int((run_length > max_bucket).sum()))
+        run_start = np.flatnonzero(position % max_bucket == 0)
+        run_length = np.diff(np.concatenate([run_start, [len(order)]]))
+        position = np.arange(len(order)) - np.repeat(run_start, run_length)
+    # the number of partners after each player in its run
+    after = np.repeat(run_length, run_length) - position - 1
+    total = int(after.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    left = np.repeat(np.arange(len(order)), after)
+    right = left + np.arange(total) - np.repeat(np.cumsum(after) - after, after) + 1
+    first, second = players[order[left]], players[order[right]]
+    return np.minimum(first, second).astype(np.int64) * no + np.maximum(first, second)
+
+
+def lsh_threshold(bands, rows):
+    """ The Jaccard at which a pair has about a 50% chance to be an LSH candidate, (1/bands)^(1/rows) """
+    return (1 / bands) ** (1 / rows)
+
+
+def cal_similarity_error(similarity, player_attributes, sample=1000, seed=0, above=None):
+    """
+    FUNCTION: the error of an approximate similarity matrix (e.g. <cal_similarity_minhash>)
+    against the exact Jaccard (<jaccard>, the lower player number first), over the
+    rows of <sample> random players
+    MinHash estimates the Jaccard of the sets of values: <jaccard> differs when a list
+    repeats a value (e.g. a national team as the club, 2.0 for two of its players).
+
+    :params above --> also give the recall of the exact edges of similarity >= above
+                      (e.g. <lsh_threshold>)
+
+    :return dict(): players (sampled), pairs (the exact edges of the sample), recall (the
+            exact edges found), precision (the edges found that are exact edges), mae and
+            max_error (the absolute error of the similarity of the edges found),
+            and recall_above with <above>
+    """
+
+    no = len(player_attributes)
+    mul, occ = token_matrices(player_attributes)
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(no, min(sample, no), replace=False))
+
+    # the exact Jaccard of the sampled rows, as in <cal_similarity_sparse>: the intersection
+    # counts the repeated values of the list of the lower player number
+    as_first = (mul[rows] @ occ.T).tocsr()
+    as_second = (occ[rows] @ mul.T).tocsr()
+    common = (occ[rows] @ occ.T).tocsr()
+    for matrix in (as_first, as_second, common):
+        matrix.sort_indices()
+    distinct = np.asarray(occ.sum(axis=1)).ravel()
+    row = rows[np.repeat(np.arange(len(rows)), np.diff(common.indptr))]
+    col = common.indices
+    inter = np.where(row <= col, as_first.data, as_second.data)
+    exact = inter / (distinct[row] + distinct[col] - common.data)
+    edge = (row != col) & (exact > 0)
+    exact_key, exact = row[edge].astype(np.int64) * no + col[edge], exact[edge]
+
+    approx = sparse.csr_matrix(similarity)[rows].tocoo()
+    approx_row = rows[approx.row]
+    edge = (approx_row != approx.col) & (approx.data > 0)
+    approx_key = approx_row[edge].astype(np.int64) * no + approx.col[edge]
+    approx_value = approx.data[edge]
+
+    _, found_exact, found_approx = np.intersect1d(exact_key, approx_key, assume_unique=True,
+                                                  return_indices=True)
+    error = np.abs(exact[found_exact] - approx_value[found_approx])
+    report = {"players": len(rows), "pairs": len(exact_key),
+              "recall": len(found_exact) / len(exact_key) if len(exact_key) else 1.0,
+              "precision": len(found_approx) / len(approx_key) if len(approx_key) else 1.0,
+              "mae": float(error.mean()) if len(error) else 0.0,
+              "max_error": float(error.max()) if len(error) else 0.0}
+    if above is not None:
+        strong = exact >= above
+        report["recall_above"] = float(np.isin(exact_key[strong], approx_key).mean()) if strong.any() else 1.0
+
+    print("The similarity error over %d players (%d exact edges): recall %.3f, precision %.3f, "
+          "mean absolute error %.4f (max %.4f)"
+          % (report["players"], report["pairs"], report["recall"], report["precision"],
+             report["mae"], report["max_error"])
+         )
+    if above is not None:
+        print("The recall of the exact edges of similarity >= %.3f is %.3f" % (above, report["recall_above"]))
+
+    return report
+
+
+def cal_similarity_stats(similarity):
+    """
+    FUNCTION: the statistics printed by <cal_similarity>
+    Works on both the dense and the sparse similarity matrices.
+
+    :return the number of vertices, the number of edges (self loops excluded)
+            and the density of the adjacent matrix (self loops included)
+    """
+
+    no = similarity.shape[0]
+    if sparse.issparse(similarity):
+        nnz = similarity.count_nonzero()
+        loops = np.count_nonzero(similarity.diagonal())
+    else:
+        nnz = np.count_nonzero(similarity)
+        loops = np.count_nonzero(np.diagonal(similarity))
+
+    edge = int(nnz + loops) // 2  # the pairs (i, j) with i <= j
+    density = (edge*2) / (no*no)
+    edge = edge - no
+
+    return no, edge, density
+
+
 def jaccard(array_1, array_2):
     inter = [val for val in array_1 if val in array_2] 
     union = list(set(array_1).union(set(array_2)))
@@ -54,4 +372,84 @@ def cal_ability_avg(player_abilities_name):
             c += 1
         ability_avg[ability] = total / c
 
-    return ability_avg
\ No newline at end of file
+    return ability_avg
+
+def compact_abilities(abilities):
+    """ The abilities as int16 when they are all integers, float32 otherwise """
+    if not np.isnan(abilities).any() and (abilities == np.round(abilities)).all():
+        return abilities.astype(np.int16)
+    return abilities.astype(np.float32)
+
+
+def info_views(columns, ability_names):
+    """
+    The outputs of <read_info> (FIFApre / PESpre) as read-only views over the arrays
+    of <read_info_columns>: ability_name_id, player_attributes, player_abilities_name,
+    player_position, player_rating, player_no_id
+    """
+    from collections import OrderedDict
+
+    ability_name_id = {name: i for i, name in enumerate(ability_names)}
+    player_abilities_name = OrderedDict()
+    for c, name in enumerate(ability_names):
+        player_abilities_name[name] = ColumnView(columns['abilities'][:, c])
+
+    return ability_name_id,                                          \
+           RowView(columns['club'], columns['nationality']),         \
+           player_abilities_name,                                    \
+           ColumnView(columns['position']),                          \
+           ColumnView(columns['rating']),                            \
+           ColumnView(columns['ids'])
+
+
+class ColumnView(Mapping):
+    """
+    A read-only {player number: value} dict over one column (a 1-D array),
+    the legacy layout of the outputs of <read_info> without copying the data
+    """
+
+    def __init__(self, column):
+        self.column = column
+
+    def __getitem__(self, key):
+        if not isinstance(key, (int, np.integer)) or not 0 <= key < len(self.column):
+            raise KeyError(key)
+        return _scalar(self.column[key])
+
+    def __contains__(self, key):
+        return isinstance(key, (int, np.integer)) and 0 <= key < len(self.column)
+
+    def __iter__(self):
+        return iter(range(0, len(self.column)))
+
+    def __len__(self):
+        return len(self.column)
+
+    def values(self):
+        return self.column.tolist()
+
+    def items(self):
+        return zip(range(0, len(self.column)), self.column.tolist())
+
+
+class RowView(ColumnView):
+    """ A read-only {player number: [value, ...]} dict over the rows of several columns """
+
+    def __init__(self, *columns):
+        super().__init__(columns[0])
+        self.columns = columns
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return [_scalar(column[key]) for column in self.columns]
+
+    def values(self):
+        return [list(row) for row in zip(*[column.tolist() for column in self.columns])]
+
+    def items(self):
+        return zip(range(0, len(self.column)), self.values())
+
+
+def _scalar(value):  # numpy scalar --> Python scalar, as in the dicts built row by row
+    return value.item() if isinstance(value, np.generic) else value
@@ -0,0 +1,210 @@
+# coding=utf-8
+
+"""
+Per-vertex statistics of a players' graph, cached for the centre player selection
+"""
+
+import sys
+import numpy as np
+from FBTP import instrument
+
+
+class NodeStats:
+    """
+    The statistics of every vertex of a graph for one criteria set
+    - ability: the criteria-weighted ability (see players.Graph.ability_scores);
+    - degree: the number of neighbors (greedy.cal_player_degree);
+    - weighted degree: the sum of the similarities to the neighbors;
+    - the min/max bounds of the three, as <greedy.select_star> takes them
+      (the minimum starts from sys.maxsize and the maximum from 0);
+    - core: the k-core number of each vertex, computed on first use.
+    The arrays follow <keys>, the vertices in the order of the vertex list.
+    Built by players.Graph.node_stats / players.CSRGraph.node_stats and cached on the graph.
+    """
+
+    def __init__(self, keys, ability, degree, weighted_degree, neighbors=None, criteria_key=None):
+        """
+        :params neighbors --> function, the position of a vertex in <keys> --> the positions of
+                              its neighbors (for the k-core numbers)
+        """
+        self.keys = np.asarray(keys, dtype=np.int64)
+        self.ability = np.asarray(ability, dtype=np.float64)
+        self.degree = np.asarray(degree, dtype=np.int64)
+        self.weighted_degree = np.asarray(weighted_degree, dtype=np.float64)
+        self.neighbors = neighbors
+        self.criteria_key = criteria_key
+        self._core = None
+        self._balance = {}  # alpha --> the balance of every vertex
+        self._star = {}  # alpha --> the centre player
+
+    @classmethod
+    def from_csr(cls, pg, scores, criteria_key=None):
+        """ The statistics of a players.CSRGraph, over its active vertices """
+        instrument.count("node_stats_builds")
+        keys = np.flatnonzero(pg.active)
+        stats = cls(keys, np.asarray(scores)[keys], pg.degrees()[keys], weighted_degrees(pg, keys),
+                    criteria_key=criteria_key)
+        stats.neighbors = csr_neighbors(pg, keys)
+        return stats
+
+    @classmethod
+    def from_graph(cls, pg, scores, criteria_key=None):
+        """ The statistics of a players.Graph """
+        instrument.count("node_stats_builds")
+        keys = list(pg.vertexList.keys())
+        position = {key: i for i, key in enumerate(keys)}
+        degree = [len(pg.vertexList[key].connectedTo) for key in keys]
+        weighted_degree = [sum(pg.vertexList[key].connectedTo.values()) for key in keys]
+
+        def neighbors(i):
+            return [position[nbr.id] for nbr in pg.vertexList[keys[i]].connectedTo]
+
+        return cls(keys, np.asarray(scores)[keys], degree, weighted_degree,
+                   neighbors=neighbors, criteria_key=criteria_key)
+
+    def with_ability(self, scores, criteria_key=None):
+        """ The statistics for another criteria set, sharing the structural ones """
+        instrument.count("node_stats_builds")
+        stats = NodeStats(self.keys, np.asarray(scores)[self.keys], self.degree, self.weighted_degree,
+                          neighbors=self.neighbors, criteria_key=criteria_key)
+        stats._core = self._core
+        return stats
+
+    def refresh(self, pg, vertices):
+        """
+        Update the statistics of the players.CSRGraph <pg> after a change of the <vertices>
+        (their degrees, abilities or activity, see players.CSRGraph.patch): only their entries
+        are recomputed. The bounds and the balance are recomputed over the cached arrays,
+        the k-core numbers on the next use (a core can change beyond the touched vertices).
+        """
+        instrument.count("node_stats_refreshed", len(vertices))
+        keys = np.flatnonzero(pg.active)
+        if not np.array_equal(keys, self.keys):  # added or removed vertices
+            index = np.full(len(pg.active), -1)  # the vertices are only appended, never renumbered
+            index[self.keys] = np.arange(len(self.keys))
+            old = index[keys]
+            kept = old >= 0
+            ability = np.zeros(len(keys))
+            degree = np.zeros(len(keys), dtype=np.int64)
+            weighted_degree = np.zeros(len(keys))
+            ability[kept] = self.ability[old[kept]]
+            degree[kept] = self.degree[old[kept]]
+            weighted_degree[kept] = self.weighted_degree[old[kept]]
+            self.keys, self.ability, self.degree, self.weighted_degree = keys, ability, degree, weighted_degree
+        else:
+            self.ability, self.degree = self.ability.copy(), self.degree.copy()
+            self.weighted_degree = self.weighted_degree.copy()
+
+        touched = np.array(sorted(vertices), dtype=np.int64)
+        position = np.searchsorted(self.keys, touched)
+        live = (position < len(self.keys)) & (self.keys[np.minimum(position, len(self.keys)-1)] == touched)
+        position, touched = position[live], touched[live]
+        scores = pg._scores[1] if pg._scores is not None and pg._scores[0] == self.criteria_key else None
+        if scores is not None:
+            self.ability[position] = np.asarray(scores)[touched]
+        self.degree[position] = pg.degrees()[touched]
+        self.weighted_degree[position] = weighted_degrees(pg, touched)
+
+        self.neighbors = csr_neighbors(pg, self.keys)
+        self._core = None
+        self._balance = {}
+        self._star = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def bounds(self, name):
+        """ The (min, max) of "ability", "degree" or "weighted_degree", as in <greedy.select_star> """
+        values = getattr(self, name)
+        if len(values) == 0:
+            return sys.maxsize, 0
+        return min(sys.maxsize, values.min()), max(0, values.max())
+
+    def balance(self, alpha=0.8):
+        """ The balance alpha*φ(i)+(1-alpha)*s(i) of <greedy.select_star> of every vertex """
+        if alpha not in self._balance:
+            pa_min, pa_max = self.bounds("ability")
+            de_min, de_max = self.bounds("degree")
+            self._balance[alpha] = alpha*(self.ability-pa_min)/(pa_max-pa_min) + \
+                                   (1-alpha)*(self.degree-de_min)/(de_max-de_min)
+        return self._balance[alpha]
+
+    def star(self, alpha=0.8):
+        """ The centre player of <greedy.select_star>: the first maximum balance, None if not positive """
+        if alpha not in self._star:
+            balance = self.balance(alpha)
+            best = int(np.argmax(balance)) if len(balance) else None
+            if best is None or not balance[best] > 0:
+                self._star[alpha] = None
+            else:
+                self._star[alpha] = int(self.keys[best])
+        return self._star[alpha]
+
+    def top(self, k, alpha=0.8):
+        """
+        The <k> vertices with the highest balance, best first (on a tie the first in <keys>,
+        so the first one is <star>); only the vertices with a positive balance
+        """
+        balance = self.balance(alpha)
+        if len(balance) == 0 or k <= 0:
+            return []
+        balance = np.where(balance > 0, balance, -np.inf)  # NaN (a constant column) never leads
+        k = min(k, len(balance))
+        top = np.argpartition(-balance, k-1)[:k]
+        top = np.union1d(top, [np.argmax(balance)])  # a tie on the maximum may leave it out
+        top = top[np.lexsort((top, -balance[top]))][:k]
+        return [int(self.keys[i]) for i in top if balance[i] > 0]
+
+    @property
+    def core(self):
+        """ The k-core number of every vertex (the largest k of a k-core containing it) """
+        if self._core is None:
+            self._core = core_numbers(self.degree, self.neighbors)
+        return self._core
+
+
+def weighted_degrees(pg, keys):
+    """ The sums of the similarities of the vertices <keys> of a players.CSRGraph, row by row """
+    degrees = pg.degrees()[keys]
+    if len(keys) == pg.numVertices:
+        return np.bincount(np.repeat(np.arange(len(keys)), degrees), weights=pg.weights, minlength=len(keys))
+    entries = np.concatenate([np.arange(pg.indptr[key], pg.indptr[key+1]) for key in keys.tolist()]) \
+        if len(keys) else np.zeros(0, dtype=np.int64)
+    return np.bincount(np.repeat(np.arange(len(keys)), degrees), weights=pg.weights[entries], minlength=len(keys))
+
+
+def csr_neighbors(pg, keys):
+    """ The function, position in <keys> --> the positions of its neighbors (for <core_numbers>) """
+    if len(keys) == pg.numVertices:
+        return pg.neighbors
+    position = np.full(pg.numVertices, -1)
+    position[keys] = np.arange(len(keys))
+    return lambda i: position[pg.neighbors(keys[i])]
+
+
+def core_numbers(degree, neighbors):
+    """
+    The k-core numbers by peeling: the vertices of minimum remaining degree are removed
+    level by level, the degrees of their neighbors decreasing as they go
+    :params degree --> the degree array
+    :params neighbors --> function, vertex --> the array (or list) of its neighbors
+    """
+    instrument.count("core_computations")
+    no = len(degree)
+    remaining = np.array(degree, dtype=np.int64)
+    alive = np.ones(no, dtype=bool)
+    core = np.zeros(no, dtype=np.int64)
+    k = 0
+    while alive.any():
+        k = max(k, int(remaining[alive].min()))
+        while True:
+            peel = np.flatnonzero(alive & (remaining <= k))
+            if len(peel) == 0:
+                break
+            core[peel] = k
+            alive[peel] = False
+            nbrs = [np.asarray(neighbors(v), dtype=np.int64) for v in peel.tolist()]
+            nbrs = np.concatenate(nbrs) if nbrs else np.zeros(0, dtype=np.int64)
+            remaining -= np.bincount(nbrs, minlength=no)
+
+    return core
@@ -1,5 +1,9 @@
 # coding=utf-8
 
+import numpy as np
+from collections.abc import Mapping
+from FBTP import nodestats, posindex, positions
+
 
 class Player:
 
@@ -56,6 +60,69 @@ class Goalkeeper:
         return self.salary
 
 
+class GoalkeeperTable:
+    """
+    The goalkeepers as columnar arrays (ID, rating, salary, abilities and mean ability)
+    with an index sorted by salary and the prefix maximum of the mean ability, so
+    "the best goalkeeper cheaper than S" is a binary search.
+    """
+
+    def __init__(self, ids, rating, salary, abilities):
+        self.ids = np.asarray(ids)
+        self.rating = np.asarray(rating, dtype=np.float64)
+        self.salary = np.asarray(salary, dtype=np.float64)
+        self.abilities = np.asarray(abilities, dtype=np.float64)  # goalkeepers x abilities
+        # the personal ability, sum(gk.ability)/len(gk.ability)
+        self.ability = np.array([sum(row)/len(row) for row in self.abilities.tolist()])
+        self.row = {gk_id: r for r, gk_id in reversed(list(enumerate(self.ids.tolist())))}
+
+        # sorted by salary; best[i] = the best goalkeeper among the i+1 cheapest ones,
+        # on a tie the one listed first
+        self.by_salary = np.argsort(self.salary, kind='stable')
+        rank = np.empty(len(self.ids), dtype=np.int64)
+        rank[np.lexsort((np.arange(len(self.ids)), -self.ability))] = np.arange(len(self.ids))
+        best_rank = np.minimum.accumulate(rank[self.by_salary])
+        self.best_by_salary = np.argsort(rank)[best_rank]
+
+    @classmethod
+    def from_goalkeepers(cls, gks):
+        """ Load the output of FIFApre.get_goalkeepers / PESpre.get_goalkeepers """
+        return cls([gk.id for gk in gks], [gk.rating for gk in gks],
+                   [gk.salary for gk in gks], [list(gk.ability) for gk in gks])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):  # the <Goalkeeper> objects, in order
+        return (self.get(gk_id) for gk_id in self.ids.tolist())
+
+    def get(self, gk_id):
+        """ The <Goalkeeper> of an ID """
+        r = self.row[gk_id]
+        gk = Goalkeeper(gk_id)
+        gk.ability = self.abilities[r].tolist()
+        gk.rating = float(self.rating[r])
+        gk.salary = float(self.salary[r])
+        return gk
+
+    def get_salary(self, gk_id):
+        return float(self.salary[self.row[gk_id]])
+
+    def get_ability(self, gk_id):  # the personal ability
+        return float(self.ability[self.row[gk_id]])
+
+    def best(self):
+        """ The ID of the goalkeeper with the highest personal ability """
+        return self.ids[int(np.argmax(self.ability))].item()
+
+    def best_under_salary(self, salary):
+        """ The ID of the best goalkeeper whose salary < <salary>, None if there is none """
+        n = int(np.searchsorted(self.salary[self.by_salary], salary, side='left'))
+        if n == 0:
+            return None
+        return self.ids[self.best_by_salary[n-1]].item()
+
+
 class CutPlayer:
     """
     The player to be pruning
@@ -85,6 +152,10 @@ class Graph:
     def __init__(self):
         self.vertexList = {}
         self.numVertices = 0
+        self._scores = None  # the cached ability scores --> (criteria key, scores)
+        self._abilities = None  # the cached ability matrix --> (matrix, ability IDs)
+        self._node_stats = None  # the cached nodestats.NodeStats
+        self._position_index = None  # the cached posindex.PositionIndex
 
     def add_vertex(self, key):
         self.numVertices = self.numVertices + 1
@@ -114,5 +185,453 @@ class Graph:
     def get_vertices(self):  # get all vertex
         return self.vertexList.keys()
 
+    def neighbors(self, key):  # the neighbors' IDs of a player
+        return [nbr.id for nbr in self.vertexList[key].connectedTo]
+
+    def ability_matrix(self):
+        """
+        The players x abilities matrix, row i holds the abilities of vertex i
+        (NaN if missing) and the columns follow the returned ability IDs.
+        It is cached, the abilities are assumed not to change once the graph is built.
+        """
+        if self._abilities is not None:
+            return self._abilities
+
+        no = max(self.vertexList) + 1 if self.vertexList else 0
+        ability_ids = []
+        for vertex in self.vertexList.values():
+            for abi_id in vertex.abilities:
+                if abi_id not in ability_ids:
+                    ability_ids.append(abi_id)
+
+        abilities = np.full((no, len(ability_ids)), np.nan)
+        for key, vertex in self.vertexList.items():
+            for c, abi_id in enumerate(ability_ids):
+                abilities[key, c] = vertex.abilities.get(abi_id, np.nan)
+
+        self._abilities = (abilities, ability_ids)
+        return self._abilities
+
+    def ability_scores(self, criteria, abi_name_id):
+        """
+        The criteria-weighted ability of every vertex, cached until the criteria change
+        """
+        weights = criteria_vector(criteria, abi_name_id)
+        key = weights.tobytes()
+        if self._scores is None or self._scores[0] != key:
+            abilities, ability_ids = self.ability_matrix()
+            self._scores = (key, weighted_abilities(abilities, ability_ids, weights, abi_name_id))
+        return self._scores[1]
+
+    def node_stats(self, criteria, abi_name_id):
+        """
+        The nodestats.NodeStats of the graph for the criteria, cached until the criteria change
+        (the degrees are kept across criteria sets)
+        """
+        scores = self.ability_scores(criteria, abi_name_id)
+        key = self._scores[0]
+        if self._node_stats is None:
+            self._node_stats = nodestats.NodeStats.from_graph(self, scores, key)
+        elif self._node_stats.criteria_key != key:
+            self._node_stats = self._node_stats.with_ability(scores, key)
+        return self._node_stats
+
+    def position_index(self):
+        """ The neighbors bucketed by position (posindex.PositionIndex), cached as <ability_matrix> """
+        if self._position_index is None:
+            self._position_index = posindex.PositionIndex.from_graph(self)
+        return self._position_index
+
+    def __iter__(self):
+        return iter(self.vertexList.values())
+
+
+class CSRGraph:
+    """
+    A compact players' graph backed by CSR arrays
+    - the neighbors of player i are indices[indptr[i]:indptr[i+1]] (sorted)
+      and their similarities are weights[indptr[i]:indptr[i+1]];
+    - position codes, salary and abilities are stored as columnar arrays.
+    The <vertexList> / <connectedTo> surface of <Graph> is kept through
+    lightweight views, so the code written for <Graph> works unchanged.
+    """
+
+    def __init__(self, indptr, indices, weights, position, salary, abilities, ability_ids,
+                 position_names=None):
+        """
+        <position> are the players' positions, or their codes into <position_names>.
+        The arrays are used as they are when their dtypes match (e.g. memory-mapped).
+        """
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.numVertices = len(self.indptr) - 1
+
+        # position --> (code, name)
+        if position_names is None:
+            names, codes = np.unique(np.asarray(position, dtype=object).astype(str), return_inverse=True)
+            position_names, position = names.tolist(), codes
+        self.position_names = list(position_names)
+        self.position_code = np.asarray(position, dtype=np.int16)
+
+        self.salary = np.asarray(salary, dtype=np.float64)
+        self.abilities = np.asarray(abilities, dtype=np.float64)  # players x abilities
+        self.ability_ids = list(ability_ids)  # the ability ID of each column
+        self._scores = None  # the cached ability scores --> (criteria key, scores, abi_name_id)
+        self._node_stats = None  # the cached nodestats.NodeStats
+        self._position_index = None  # the cached posindex.PositionIndex
+        self._position_groups = {}  # datasource --> the cached position group codes
+        self.active = np.ones(self.numVertices, dtype=bool)  # False for the removed players (see <patch>)
+        self.graph_key = None  # the key of the graph in the artifact cache, if loaded from it
+
+        self.vertexList = CSRVertexList(self)
+
+    @classmethod
+    def from_similarity(cls, sim, position, salary, abilities, ability_ids):
+        """
+        Build the graph from a (sparse or dense) similarity matrix,
+        the self loops are dropped; every row is a vertex, the last one included
+        (greedy.players_graph_construction leaves the last player out)
+        """
+        from scipy import sparse
+
+        adj = sparse.csr_matrix(sim, dtype=np.float64, copy=True)
+        adj.setdiag(0)
+        adj.eliminate_zeros()
+        adj.sort_indices()
+
+        return cls(adj.indptr, adj.indices, adj.data, position, salary, abilities, ability_ids)
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Convert a <Graph> whose vertex keys are 0...n-1
+        """
+        no = max(graph.get_vertices()) + 1
+        ability_ids = []
+        for vertex in graph:
+            for abi_id in vertex.abilities:
+                if abi_id not in ability_ids:
+                    ability_ids.append(abi_id)
+
+        indptr = np.zeros(no + 1, dtype=np.int64)
+        indices = []
+        weights = []
+        position = [""] * no
+        salary = np.zeros(no)
+        abilities = np.full((no, len(ability_ids)), np.nan)
+        for i in range(0, no):
+            vertex = graph.get_vertex(i)
+            if vertex is not None:
+                nbrs = sorted((nbr.id, w) for nbr, w in vertex.connectedTo.items())
+                indices.extend(nbr for nbr, _ in nbrs)
+                weights.extend(w for _, w in nbrs)
+                position[i] = vertex.position
+                salary[i] = vertex.salary
+                for c, abi_id in enumerate(ability_ids):
+                    abilities[i, c] = vertex.abilities.get(abi_id, np.nan)
+            indptr[i+1] = len(indices)
+
+        return cls(indptr, indices, weights, position, salary, abilities, ability_ids)
+
+    def neighbors(self, key):  # the neighbors' IDs of a player
+        return self.indices[self.indptr[key]:self.indptr[key+1]]
+
+    def neighbor_weights(self, key):  # the similarities to the neighbors
+        return self.weights[self.indptr[key]:self.indptr[key+1]]
+
+    def degrees(self):
+        return np.diff(self.indptr)
+
+    def position_of(self, key):
+        return self.position_names[self.position_code[key]]
+
+    def ability_matrix(self):
+        return self.abilities, self.ability_ids
+
+    def ability_scores(self, criteria, abi_name_id):
+        """
+        The criteria-weighted ability of every vertex, cached until the criteria change
+        """
+        weights = criteria_vector(criteria, abi_name_id)
+        key = weights.tobytes()
+        if self._scores is None or self._scores[0] != key:
+            self._scores = (key, weighted_abilities(self.abilities, self.ability_ids, weights, abi_name_id),
+                            abi_name_id)
+        return self._scores[1]
+
+    def node_stats(self, criteria, abi_name_id):
+        """
+        The nodestats.NodeStats of the graph for the criteria, cached until the criteria change
+        (the degrees and the k-core numbers are kept across criteria sets)
+        """
+        scores = self.ability_scores(criteria, abi_name_id)
+        key = self._scores[0]
+        if self._node_stats is None:
+            self._node_stats = nodestats.NodeStats.from_csr(self, scores, key)
+        elif self._node_stats.criteria_key != key:
+            self._node_stats = self._node_stats.with_ability(scores, key)
+        return self._node_stats
+
+    def position_index(self):
+        """ The neighbors bucketed by position code (posindex.PositionIndex), cached until <patch> """
+        if self._position_index is None:
+            self._position_index = posindex.PositionIndex.from_csr(self)
+        return self._position_index
+
+    def position_groups(self, datasource):
+        """
+        The position group code of every vertex (positions.group_codes), cached until <patch>:
+        the raw positions are translated once per code, not once per vertex
+        """
+        if datasource not in self._position_groups:
+            codes = positions.group_codes(self.position_names, datasource)
+            self._position_groups[datasource] = codes[self.position_code] if len(codes) else \
+                np.full(self.numVertices, positions.NO_GROUP, dtype=np.int8)
+        return self._position_groups[datasource]
+
+    def patch(self, rows, vertices=None, no=None, removed=()):
+        """
+        Update the graph in place, e.g. for the roster changes of roster.Roster
+        :params rows --> (keys, indptr, indices, weights), the new neighbor rows of the vertices <keys>
+                         (sorted) as CSR arrays, the other rows are kept as they are
+        :params vertices --> {vertex: (position, salary, abilities row)}, the new attributes
+        :params no --> the new number of vertices (the new ones are appended)
+        :params removed --> the vertices removed from the graph (their rows must be empty):
+                            they keep their number but are no longer <active>
+        The cached ability scores and node statistics are updated for the touched vertices only,
+        the position index and group codes are rebuilt on their next use.
+        """
+        vertices = vertices or {}
+        no = self.numVertices if no is None else no
+        if no > self.numVertices:
+            grow = no - self.numVertices
+            self.indptr = np.concatenate([self.indptr, np.full(grow, self.indptr[-1])])
+            self.position_code = np.concatenate([self.position_code, np.zeros(grow, dtype=np.int16)])
+            self.salary = np.concatenate([self.salary, np.zeros(grow)])
+            self.abilities = np.vstack([self.abilities, np.full((grow, self.abilities.shape[1]), np.nan)])
+            self.active = np.concatenate([self.active, np.ones(grow, dtype=bool)])
+            self.numVertices = no
+        else:
+            self.salary = np.array(self.salary)  # writable (e.g. memory-mapped)
+            self.abilities = np.array(self.abilities)
+            self.position_code = np.array(self.position_code)
+
+        for key, (position, salary, abilities) in vertices.items():
+            if position not in self.position_names:
+                self.position_names.append(position)
+            self.position_code[key] = self.position_names.index(position)
+            self.salary[key] = salary
+            self.abilities[key] = abilities
+            self.active[key] = True
+        for key in removed:
+            self.active[key] = False
+
+        touched = set()
+        if rows is not None:
+            self._splice(*rows)
+            touched = set(np.asarray(rows[0]).tolist())
+
+        if self._scores is not None:
+            changed = np.array(sorted(vertices), dtype=np.int64)
+            key, scores, abi_name_id = self._scores
+            scores = np.concatenate([np.asarray(scores, dtype=np.float64),
+                                     np.zeros(no - len(scores))]) if len(scores) < no else np.array(scores)
+            weights = np.frombuffer(key, dtype=np.float64)  # the criteria were checked when the scores were built
+            if len(changed):
+                scores[changed] = weighted_abilities(self.abilities[changed], self.ability_ids, weights,
+                                                     abi_name_id)
+            self._scores = (key, scores, abi_name_id)
+        if self._node_stats is not None:
+            self._node_stats.refresh(self, touched | set(vertices) | set(removed))
+        self._position_index = None
+        self._position_groups = {}
+        self.graph_key = None  # no longer the graph of the artifact cache
+
+    def _splice(self, keys, row_indptr, row_indices, row_weights):
+        """ Replace the neighbor rows of <keys> in the CSR arrays, the other rows are moved as they are """
+        no = self.numVertices
+        keys = np.asarray(keys, dtype=np.int64)
+        degrees = np.diff(self.indptr)
+        touched = np.zeros(no, dtype=bool)
+        touched[keys] = True
+        new_degrees = degrees.copy()
+        new_degrees[keys] = np.diff(row_indptr)
+        indptr = np.zeros(no + 1, dtype=np.int64)
+        np.cumsum(new_degrees, out=indptr[1:])
+
+        indices = np.empty(indptr[-1], dtype=np.int32)
+        weights = np.empty(indptr[-1], dtype=np.float64)
+        # the kept rows: each entry moves by the shift of its row
+        row = np.repeat(np.arange(no), degrees)
+        keep = ~touched[row]
+        target = (indptr[:-1] - self.indptr[:-1])[row[keep]] + np.flatnonzero(keep)
+        indices[target] = self.indices[keep]
+        weights[target] = self.weights[keep]
+        # the new rows
+        row = np.repeat(np.arange(len(keys)), np.diff(row_indptr))
+        target = indptr[keys[row]] + np.arange(len(row)) - np.asarray(row_indptr)[row]
+        indices[target] = row_indices
+        weights[target] = row_weights
+
+        self.indptr, self.indices, self.weights = indptr, indices, weights
+
+    def set_ability_scores(self, criteria, abi_name_id, scores):
+        """ Seed the cache of <ability_scores>, e.g. with precomputed (memory-mapped) scores """
+        self._scores = (criteria_vector(criteria, abi_name_id).tobytes(), scores, abi_name_id)
+
+    def get_vertex(self, key):
+        if key in self:
+            return CSRPlayer(self, key)
+        else:
+            return None
+
+    def __contains__(self, key):
+        return isinstance(key, (int, np.integer)) and 0 <= key < self.numVertices
+
+    def get_vertices(self):  # get all vertex
+        return range(self.numVertices)
+
+    def __iter__(self):
+        return iter(self.vertexList.values())
+
+
+class CSRVertexList(Mapping):
+    """
+    {player id: CSRPlayer} view of a <CSRGraph>, the views are created on access
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, key):
+        if key not in self.graph:
+            raise KeyError(key)
+        return CSRPlayer(self.graph, int(key))
+
+    def __contains__(self, key):
+        return key in self.graph
+
     def __iter__(self):
-        return iter(self.vertexList.values())
\ No newline at end of file
+        return iter(range(self.graph.numVertices))
+
+    def __len__(self):
+        return self.graph.numVertices
+
+
+class CSRPlayer:
+    """
+    A <Player>-like view of one vertex of a <CSRGraph>
+    """
+
+    __slots__ = ("graph", "id")
+
+    def __init__(self, graph, key):
+        self.graph = graph
+        self.id = key  # player's ID
+
+    @property
+    def connectedTo(self):  # {CSRPlayer: similarity}
+        return CSRNeighbors(self.graph, self.id)
+
+    @property
+    def abilities(self):  # {ability ID: value}
+        values = self.graph.abilities[self.id]
+        return {abi_id: float(v) for abi_id, v in zip(self.graph.ability_ids, values) if v == v}
+
+    @property
+    def position(self):
+        return self.graph.position_of(self.id)
+
+    @property
+    def salary(self):
+        return float(self.graph.salary[self.id])
+
+    def __eq__(self, other):
+        return isinstance(other, CSRPlayer) and other.graph is self.graph and other.id == self.id
+
+    def __hash__(self):
+        return hash((id(self.graph), self.id))
+
+    def __str__(self):
+        return str(self.id) + ' connectedTo : ' + str(self.graph.neighbors(self.id).tolist())
+
+    def get_connection(self):  # get the neighbors
+        return self.connectedTo.keys()
+
+    def get_id(self):
+        return self.id
+
+    def get_abilities(self):
+        return self.abilities
+
+    def get_position(self):
+        return self.position
+
+    def get_salary(self):
+        return self.salary
+
+    def get_weight(self, nbr):  # get the weight of a neighbor
+        return self.connectedTo[nbr]
+
+
+class CSRNeighbors(Mapping):
+    """
+    {CSRPlayer: similarity} view of the neighbors of a player
+    """
+
+    def __init__(self, graph, key):
+        self.graph = graph
+        self.nbrs = graph.neighbors(key)
+        self.weights = graph.neighbor_weights(key)
+
+    def _locate(self, nbr):
+        key = nbr.id if isinstance(nbr, CSRPlayer) else nbr
+        pos = int(np.searchsorted(self.nbrs, key))
+        if pos < len(self.nbrs) and self.nbrs[pos] == key:
+            return pos
+        return -1
+
+    def __getitem__(self, nbr):
+        pos = self._locate(nbr)
+        if pos < 0:
+            raise KeyError(nbr)
+        return float(self.weights[pos])
+
+    def __contains__(self, nbr):
+        return self._locate(nbr) >= 0
+
+    def __iter__(self):
+        for key in self.nbrs.tolist():
+            yield CSRPlayer(self.graph, key)
+
+    def __len__(self):
+        return len(self.nbrs)
+
+
+def criteria_vector(criteria, abi_name_id):
+    """
+    The criteria weights aligned to the ability IDs of <abi_name_id>,
+    NaN for the abilities without a criterion
+    """
+    weights = np.full(max(abi_name_id.values()) + 1, np.nan)
+    for name, abi_id in abi_name_id.items():
+        if name in criteria:
+            weights[abi_id] = criteria[name]
+    return weights
+
+
+def weighted_abilities(abilities, ability_ids, weights, abi_name_id):
+    """
+    The matrix-vector product abilities @ weights[ability_ids], where the
+    missing abilities count for nothing. The columns are accumulated one by one
+    so the result is identical to the per-player sum of <cal_player_ability>.
+    """
+    scores = np.zeros(abilities.shape[0])
+    for c, abi_id in enumerate(ability_ids):
+        if np.isnan(weights[abi_id]):
+            # same as <cal_player_ability>, the ability must have a criterion
+            raise KeyError([name for name, i in abi_name_id.items() if i == abi_id][0])
+        column = abilities[:, c]
+        scores += np.where(np.isnan(column), 0, weights[abi_id] * column)
+    return scores
@@ -0,0 +1,105 @@
+# coding=utf-8
+
+"""
+Position-partitioned adjacency of a players' graph, for the candidate searches
+"""
+
+import numpy as np
+from FBTP import instrument
+
+
+class PositionIndex:
+    """
+    The neighbors of every vertex bucketed by their position
+    - bucket (i, p) holds the neighbors of vertex i at the position code p, in the order of
+      the neighbor list of i, with their offsets in that list;
+    - the neighbors of a vertex at some positions are the union of a few small buckets,
+      instead of a scan of all its edges filtered by position;
+    - the buckets are by raw position (e.g. "LCB", "RWB"), a translated position
+      (greedy.position_trans, e.g. "LB") is the union of the buckets of its raw positions.
+    Built by players.Graph.position_index / players.CSRGraph.position_index and cached on the graph.
+    """
+
+    def __init__(self, bucket_ptr, indices, offsets, degrees, position_names):
+        """
+        :params bucket_ptr --> bucket (i, p) is indices[bucket_ptr[i*P+p]:bucket_ptr[i*P+p+1]],
+                               P the number of positions
+        :params offsets --> the offset of each entry of <indices> in the neighbor list of its vertex
+        :params degrees --> the length of the neighbor list of each vertex
+        :params position_names --> the position of each code
+        """
+        self.bucket_ptr = np.asarray(bucket_ptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.degrees = np.asarray(degrees, dtype=np.int64)
+        self.position_names = list(position_names)
+        self.width = len(self.position_names)
+
+    @classmethod
+    def from_csr(cls, pg):
+        """ The index of a players.CSRGraph, by its position codes """
+        return cls.from_arrays(pg.indptr, pg.indices, pg.position_code, pg.position_names)
+
+    @classmethod
+    def from_graph(cls, pg):
+        """ The index of a players.Graph whose vertex keys are 0...n-1, in the order of <connectedTo> """
+        no = max(pg.get_vertices()) + 1 if pg.numVertices else 0
+        names = sorted({str(vertex.position) for vertex in pg})
+        code = {name: c for c, name in enumerate(names)}
+        position_code = np.zeros(no, dtype=np.int64)
+        degrees = np.zeros(no, dtype=np.int64)
+        indices = []
+        for key, vertex in pg.vertexList.items():
+            position_code[key] = code[str(vertex.position)]
+            degrees[key] = len(vertex.connectedTo)
+        for key in range(no):
+            if key in pg:
+                indices.extend(pg.neighbors(key))
+        indptr = np.concatenate([[0], np.cumsum(degrees)])
+        return cls.from_arrays(indptr, np.array(indices, dtype=np.int64), position_code, names)
+
+    @classmethod
+    def from_arrays(cls, indptr, indices, position_code, position_names):
+        """ The index of the CSR rows (indptr, indices) """
+        instrument.count("position_index_builds")
+        indptr = np.asarray(indptr, dtype=np.int64)
+        no = len(indptr) - 1
+        width = max(len(position_names), 1)
+        degrees = np.diff(indptr)
+        row = np.repeat(np.arange(no, dtype=np.int64), degrees)
+        bucket = row * width + np.asarray(position_code, dtype=np.int64)[indices]
+        order = np.argsort(bucket, kind='stable')  # the neighbor list order within a bucket
+        bucket_ptr = np.concatenate([[0], np.cumsum(np.bincount(bucket, minlength=no*width))])
+        offsets = np.arange(len(indices), dtype=np.int64) - indptr[row]
+        return cls(bucket_ptr, np.asarray(indices)[order], offsets[order], degrees, position_names)
+
+    def __len__(self):
+        return len(self.degrees)
+
+    def codes(self, position_group=None):
+        """
+        The codes of each position group, dict(), group: [codes]
+        :params position_group --> function, position --> group (the position itself by default)
+        """
+        groups = {}
+        for code, name in enumerate(self.position_names):
+            group = name if position_group is None else position_group(name)
+            groups.setdefault(group, []).append(code)
+        return groups
+
+    def bucket(self, key, code):
+        """ The neighbors of vertex <key> at the position <code>, and their offsets in its neighbor list """
+        start = key * self.width + code
+        lo, hi = self.bucket_ptr[start], self.bucket_ptr[start+1]
+        return self.indices[lo:hi], self.offsets[lo:hi]
+
+    def neighbors(self, key, codes):
+        """ The neighbors of vertex <key> at the positions <codes>, in the order of its neighbor list """
+        buckets = [self.bucket(key, code) for code in codes]
+        if not buckets:
+            return np.zeros(0, dtype=np.int64)
+        if len(buckets) == 1:
+            return buckets[0][0]
+        indices = np.concatenate([nbrs for nbrs, _ in buckets])
+        offsets = np.concatenate([offs for _, offs in buckets])
+        return indices[np.argsort(offsets, kind='stable')]
@@ -0,0 +1,55 @@
+# coding=utf-8
+
+"""
+Integer codes of the positions and the position quotas of a sub-team
+
+The raw positions of the data files (e.g. "LCB", "DMF") are coded per graph
+(players.CSRGraph.position_code); each raw code is translated once into the code of
+its position group (the translated positions of <greedy.position_trans>), and the
+number of players still needed in each group is an integer array indexed by that code.
+"""
+
+import numpy as np
+
+
+# the position groups of a sub-team and the number of players in each, in code order
+GROUPS = {
+    'PES': ("CB", "LB", "RB", "CF/SS", "LWF", "RWF", "*MF"),
+    'FIFA': ("CB", "LB", "RB", "MID", "FOR"),
+}
+QUOTA = {
+    'PES': (2, 1, 1, 1, 1, 1, 3),
+    'FIFA': (2, 1, 1, 3, 3),
+}
+NO_GROUP = -1  # the code of a position outside the groups (e.g. "GK")
+
+# raw position --> position group, the positions not listed are their own group
+_FIFA_GROUP = {}
+_FIFA_GROUP.update((position, 'FOR') for position in ['LS', 'LF', 'CF', 'RF', 'RS', 'ST', 'LW', 'SS', 'RW'])
+_FIFA_GROUP.update((position, 'MID') for position in ['LAM', 'CAM', 'RAM', 'CM', 'LM', 'LCM', 'RCM', 'RM',
+                                                      'LDM', 'CDM', 'RDM'])
+_FIFA_GROUP.update((position, 'RB') for position in ['RWB', 'RCB', 'RB'])
+_FIFA_GROUP.update((position, 'LB') for position in ['LWB', 'LCB', 'LB'])
+
+
+def translate(position, datasource):
+    """ The position group of a raw position (see greedy.position_trans) """
+    if datasource == 'PES':
+        if "MF" in position[1:]:  # re.match(r".+MF", position)
+            return "*MF"
+        if position == "CF" or position == "SS":
+            return "CF/SS"
+    elif datasource == 'FIFA':
+        return _FIFA_GROUP.get(position, position)
+    return position
+
+
+def group_codes(position_names, datasource):
+    """ The group code of each raw position of <position_names>, NO_GROUP if outside the groups """
+    code = {group: c for c, group in enumerate(GROUPS[datasource])}
+    return np.array([code.get(translate(name, datasource), NO_GROUP) for name in position_names], dtype=np.int8)
+
+
+def quota(datasource):
+    """ The number of players in each position group of a sub-team, as a new integer array """
+    return np.array(QUOTA[datasource], dtype=np.int64)
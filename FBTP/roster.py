@@ -0,0 +1,256 @@
+# coding=utf-8
+
+"""
+Incremental maintenance of a players' graph under roster changes
+(transfers, rating updates, new signings, departures)
+
+    arrays, meta = artifacts.load_info(cache, DATASET, FILE_PATH + FILE_BACK)
+    abi_name_id, p_no_id_back, pg_back = artifacts.load_graph(cache, DATASET, FILE_PATH + FILE_BACK, 'Back')
+    roster = Roster.from_info(pg_back, arrays, meta)
+    with roster.batch():
+        roster.modify(158023, club="FC Barcelona")
+        roster.add(264240, "Manchester City", "England", "CB", 71, {"defending_marking": 70, ...})
+        roster.remove(20801)
+
+Instead of re-running read_info, cal_similarity and players_graph_construction,
+only the similarity rows of the players sharing a club or a nationality with a
+changed player are recomputed, and the graph is patched in place.
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import contextlib
+
+import numpy as np
+
+from FBTP import greedy, modules, instrument
+from FBTP import players as ps
+
+
+class Roster:
+    """
+    The players of a players.CSRGraph and the inverted index of their attributes
+    (club / nationality value --> players), as in modules.cal_similarity_sparse
+    - the players are addressed by their IDs (the values of player_no_id), <ids> is the
+      player number --> ID list of the graph to use as player_no_id after the changes;
+    - a change stages the new similarities of the affected pairs, and <flush> patches
+      the graph once (players.CSRGraph.patch): the neighbor rows, salary, abilities,
+      the cached ability scores and the node statistics of the touched players only;
+    - a new player is appended to the graph, a removed one keeps its number but loses
+      its edges and is no longer active (so it is never selected);
+    - the ability columns of the graph (the 10 with the highest average when it was
+      built) are kept: rebuild the graph to select them again.
+    """
+
+    def __init__(self, pg, ids, club, nationality, rating, abi_name_id):
+        """
+        :params pg --> the players.CSRGraph of the players
+        :params ids, club, nationality, rating --> per player number, as in read_info
+        :params abi_name_id --> dict(), ability name: ability ID
+        """
+        if not isinstance(pg, ps.CSRGraph):
+            raise TypeError("a Roster maintains a players.CSRGraph, not %s" % type(pg).__name__)
+        self.pg = pg
+        self.ids = list(ids)
+        self.number = {player_id: i for i, player_id in enumerate(self.ids) if pg.active[i]}
+        self.attributes = [[c, n] for c, n in zip(club, nationality)]  # player number: [club, nationality]
+        self.rating = list(rating)
+        self.abi_name_id = abi_name_id
+        self.ability_name = {i: name for name, i in abi_name_id.items()}
+
+        self.tokens = {}  # attribute value --> the players with that value
+        for i in self.number.values():
+            for val in self.attributes[i]:
+                self.tokens.setdefault(val, set()).add(i)
+
+        self._delta = {}  # player number --> {neighbor: new similarity, 0 if the edge is dropped}
+        self._vertices = {}  # player number --> (position, salary, abilities row)
+        self._removed = set()
+        self._depth = 0
+
+    @classmethod
+    def from_info(cls, pg, arrays, meta):
+        """ The roster of a graph from artifacts.load_graph and the arrays of artifacts.load_info """
+        return cls(pg, arrays["ids"].tolist(), arrays["club"].tolist(), arrays["nationality"].tolist(),
+                   arrays["rating"].tolist(), {name: i for i, name in enumerate(meta["abilities"])})
+
+    def __len__(self):
+        return len(self.number)
+
+    def __contains__(self, player_id):
+        return player_id in self.number
+
+    def add(self, player_id, club, nationality, position, rating, abilities):
+        """
+        Sign a new player
+        :params abilities --> dict(), ability name: value (the missing ones are NaN)
+        """
+        if player_id in self.number:
+            raise ValueError("player %s is already in the roster" % player_id)
+        i = len(self.ids)
+        self.ids.append(player_id)
+        self.attributes.append(None)
+        self.rating.append(rating)
+        self.number[player_id] = i
+        instrument.count("roster_added")
+        self._set(i, [club, nationality], position, rating, self._ability_row(abilities))
+
+    def modify(self, player_id, club=None, nationality=None, position=None, rating=None, abilities=None):
+        """
+        Change some attributes of a player (the others are kept)
+        :params abilities --> dict(), ability name: new value, for the changed abilities only
+        """
+        i = self.number[player_id]
+        club = self.attributes[i][0] if club is None else club
+        nationality = self.attributes[i][1] if nationality is None else nationality
+        position = self._position(i) if position is None else position
+        rating = self.rating[i] if rating is None else rating
+        row = self._abilities(i)
+        if abilities is not None:
+            update = self._ability_row(abilities)
+            row = np.where(np.isnan(update), row, update)
+        instrument.count("roster_modified")
+        self._set(i, [club, nationality], position, rating, row)
+
+    def remove(self, player_id):
+        """ Remove a player: its edges are dropped, its number is not reused """
+        i = self.number.pop(player_id)
+        for val in self.attributes[i]:
+            self.tokens[val].discard(i)
+        for j in self._neighbors(i):
+            self._stage(j, i, 0)
+            self._stage(i, j, 0)
+        self._vertices.pop(i, None)
+        self._removed.add(i)
+        instrument.count("roster_removed")
+        self._flush_if_idle()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """ Apply the changes of the block with a single patch of the graph """
+        self._depth += 1
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+            self._flush_if_idle()
+
+    def flush(self):
+        """ Patch the graph with the staged changes """
+        if not (self._delta or self._vertices or self._removed):
+            return
+        with instrument.timer("roster_flush"):
+            # the staged changes as (row, column, similarity) entries
+            d_row, d_col, d_sim = [], [], []
+            for i, delta in self._delta.items():
+                d_row.extend([i] * len(delta))
+                d_col.extend(delta.keys())
+                d_sim.extend(delta.values())
+            d_row = np.array(d_row, dtype=np.int64)
+            d_col = np.array(d_col, dtype=np.int64)
+            d_sim = np.array(d_sim, dtype=np.float64)
+            keys = np.unique(d_row)
+            # the current entries of the touched rows, without the changed ones
+            old = keys[keys < self.pg.numVertices]
+            counts = np.diff(self.pg.indptr)[old]
+            entries = np.repeat(self.pg.indptr[old] - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts) + \
+                np.arange(counts.sum())
+            e_row = np.repeat(old, counts)
+            e_col = self.pg.indices[entries].astype(np.int64)
+            no = len(self.ids)
+            keep = ~np.isin(e_row * no + e_col, d_row * no + d_col)
+            new = d_sim > 0
+            row = np.concatenate([e_row[keep], d_row[new]])
+            col = np.concatenate([e_col[keep], d_col[new]])
+            sim = np.concatenate([self.pg.weights[entries][keep], d_sim[new]])
+            order = np.lexsort((col, row))
+            row_indptr = np.concatenate([[0], np.cumsum(np.bincount(np.searchsorted(keys, row[order]),
+                                                                    minlength=len(keys)))])
+            rows = (keys, row_indptr, col[order], sim[order])
+            instrument.count("roster_rows_patched", len(keys))
+            removed = self._removed - set(self._vertices)
+            self.pg.patch(rows if len(keys) else None, self._vertices, no=no, removed=removed)
+        self._delta, self._vertices, self._removed = {}, {}, set()
+
+    def _flush_if_idle(self):
+        if self._depth == 0:
+            self.flush()
+
+    def _set(self, i, attributes, position, rating, abilities):
+        """ Stage the new attributes of player <i> and the similarities they change """
+        old = self.attributes[i]
+        if old != attributes:
+            if old is not None:
+                for val in old:
+                    self.tokens[val].discard(i)
+            before = self._neighbors(i) if old is not None else set()
+            self.attributes[i] = attributes
+            after = self.similarities(i)
+            for val in attributes:
+                self.tokens.setdefault(val, set()).add(i)
+            for j in before | set(after):
+                self._stage(j, i, after.get(j, 0))
+                self._stage(i, j, after.get(j, 0))
+
+        self.rating[i] = rating
+        # vectorised as in greedy.players_csr_graph_construction
+        salary = float(greedy.cal_player_salary(np.array([0]), np.array([rating], dtype=np.float64))[0])
+        self._vertices[i] = (position, salary, abilities)
+        self._removed.discard(i)
+        self._flush_if_idle()
+
+    def similarities(self, i):
+        """
+        The similarities of player <i> to the players sharing a value with it
+        (modules.jaccard of the [club, nationality] lists, the lower number first)
+        """
+        others = set()
+        for val in self.attributes[i]:
+            others |= self.tokens.get(val, set())
+        others.discard(i)
+        sims = {}
+        memo = {}  # the similarity only depends on the two attribute lists
+        for j in others:
+            first, second = (i, j) if i < j else (j, i)
+            pair = (tuple(self.attributes[first]), tuple(self.attributes[second]))
+            if pair not in memo:
+                memo[pair] = modules.jaccard(self.attributes[first], self.attributes[second])
+            if memo[pair] > 0:
+                sims[j] = memo[pair]
+        return sims
+
+    def _stage(self, i, j, sim):
+        self._delta.setdefault(i, {})[j] = sim
+
+    def _row(self, i):
+        """ The neighbors and similarities of player <i> in the graph (before the staged changes) """
+        if i >= self.pg.numVertices:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        return self.pg.neighbors(i).astype(np.int64), self.pg.neighbor_weights(i)
+
+    def _neighbors(self, i):
+        """ The neighbors of player <i>, with the staged changes """
+        nbrs = set(self._row(i)[0].tolist())
+        for j, sim in self._delta.get(i, {}).items():
+            if sim > 0:
+                nbrs.add(j)
+            else:
+                nbrs.discard(j)
+        return nbrs
+
+    def _position(self, i):
+        if i in self._vertices:
+            return self._vertices[i][0]
+        return self.pg.position_of(i)
+
+    def _abilities(self, i):
+        if i in self._vertices:
+            return self._vertices[i][2]
+        return self.pg.abilities[i].copy()
+
+    def _ability_row(self, abilities):
+        """ dict(), ability name: value --> the row of the ability columns of the graph """
+        return np.array([abilities.get(self.ability_name[abi_id], np.nan) for abi_id in self.pg.ability_ids],
+                        dtype=np.float64)
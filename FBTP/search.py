@@ -0,0 +1,260 @@
+# coding=utf-8
+
+"""
+Searches wider than the single greedy path of <greedy.player_opt_subgraph>
+
+- beam_search: keep the <width> best partial teams at each step instead of one,
+  the expansions of a step are spread across a worker pool;
+- multi_start: run the greedy selection from each of the <k> best centre players
+  in a worker pool, and keep the best team.
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import contextlib
+import io
+import multiprocessing as mp
+
+import numpy as np
+
+from FBTP import greedy, positions, teamstats, instrument
+from FBTP import players as ps
+
+
+# the graph and the parameters shared (read-only) by the workers of a search
+_SHARED = {}
+
+
+class SearchError(RuntimeError):
+    """ No start of a search gave a team, <results> are the results (and errors) of every start """
+
+    def __init__(self, results):
+        self.results = results
+        errors = ["%s: %s" % (result["star"], result["error"]) for result in results]
+        super().__init__("no start gave a team (%d starts): %s" % (len(results), "; ".join(errors)))
+
+
+@instrument.timed("beam_search")
+def beam_search(player_no_id, pg, scores, alpha, beta, star, network_name, datasource, width=4, processes=1):
+    """
+    FUNCTION: a beam search for the sub-team of <greedy.select_opt_players>
+    STEP 1:
+        start from the team [star]
+    STEP 2:
+        expand each partial team with its <width> best candidates by the score of the
+        greedy selection (team ability + density + homogeneity over its frontier);
+        the partial teams with the same players are merged (canonical key: the sorted
+        players), and the <width> best by <team_objective> are kept
+    STEP 3:
+        return the best complete team by <team_objective>
+    With width=1 the team is the one of the greedy selection.
+
+    :params width --> the number of partial teams kept at each step
+    :params processes --> the number of workers expanding the partial teams
+                          (1: in this process, None: os.cpu_count())
+
+    :return the players of the best team, the star first and then in the order of selection
+    """
+    if not isinstance(pg, ps.CSRGraph):
+        pg = ps.CSRGraph.from_graph(pg)
+    scores = np.asarray(scores, dtype=np.float64)
+    pg.position_groups(datasource)  # built before the workers start, so it is shared
+
+    threshold = 4  # the maximum number of players to be selected
+    if network_name == "Forward":
+        threshold = 6
+
+    shared = {"pg": pg, "scores": scores, "alpha": alpha, "beta": beta,
+              "network_name": network_name, "datasource": datasource, "width": width}
+    beams = [(star,)]
+    with _workers(shared, processes) as map_:
+        for k in range(1, threshold):
+            expansions = map_(_expand, beams)
+            instrument.count("beam_expansions", len(beams))
+
+            teams = {}  # canonical key --> (objective, team), in the order of the beams
+            for members, children in zip(beams, expansions):
+                for player, objective in children:
+                    team = members + (player,)
+                    key = tuple(sorted(team))
+                    if key in teams:
+                        instrument.count("beam_duplicates")
+                        continue
+                    teams[key] = (objective, team)
+            if not teams:
+                break  # no partial team can grow, keep the last ones
+            ranked = sorted(teams.values(), key=lambda item: -item[0])  # stable: the first beam on a tie
+            beams = [team for _, team in ranked[:width]]
+
+    opt_players = list(beams[0])
+    print("The best players are:", [player_no_id[player] for player in opt_players])
+    print("The positions of each players are:",
+          {player_no_id[player]: pg.position_of(player) for player in opt_players})
+
+    return opt_players
+
+
+@instrument.timed("multi_start")
+def multi_start(player_no_id, pg, criteria, abi_name_id, alpha, beta, network_name, datasource, k=32, processes=1,
+                star_alpha=0.8):
+    """
+    FUNCTION: the greedy selection from several centre players
+    STEP 1:
+        take the <k> best centre players by the balance of <greedy.select_star>
+        (nodestats.NodeStats.top: the first is the one of select_star)
+    STEP 2:
+        run <greedy.select_opt_players_batch> from each of them, in <processes> workers
+    STEP 3:
+        return the best team by <team_objective>, the first start on a tie
+
+    :params k --> the number of centre players
+    :params processes --> the number of workers (1: in this process, None: os.cpu_count())
+    :params star_alpha --> the alpha of <greedy.select_star>
+
+    :return the players of the best team, and the results of every start: dicts star,
+            team, objective, error (None or the message of the exception)
+            SearchError (with the errors of every start) if no start gave a team
+    """
+    if not isinstance(pg, ps.CSRGraph):
+        pg = ps.CSRGraph.from_graph(pg)
+    scores = np.asarray(pg.ability_scores(criteria, abi_name_id), dtype=np.float64)
+
+    stars = pg.node_stats(criteria, abi_name_id).top(k, star_alpha)
+    pg.position_groups(datasource)  # built before the workers start, so it is shared
+    instrument.count("multi_start_starts", len(stars))
+
+    shared = {"pg": pg, "scores": scores, "alpha": alpha, "beta": beta,
+              "network_name": network_name, "datasource": datasource, "player_no_id": player_no_id}
+    with _workers(shared, processes) as map_:
+        results = map_(_start, stars)
+
+    best = None
+    for result in results:
+        if result["error"] is None and (best is None or result["objective"] > best["objective"]):
+            best = result
+    if best is None:
+        raise SearchError(results)
+
+    opt_players = best["team"]
+    print("The best of %d starts, from the centre player %s" % (len(stars), player_no_id[best["star"]]))
+    print("The best players are:", [player_no_id[player] for player in opt_players])
+    print("The positions of each players are:",
+          {player_no_id[player]: pg.position_of(player) for player in opt_players})
+
+    return opt_players, results
+
+
+def expand(pg, members, scores, alpha, beta, network_name, datasource, width):
+    """
+    The <width> best extensions of the partial team <members>, by the score of
+    <greedy.select_opt_players_batch> (the first one is its choice)
+
+    :return [(player, the <team_objective> of "members + player")], best score first
+    """
+    neighbors = greedy.position_frontier(pg, datasource, positions.quota(datasource))
+    for player in members:
+        neighbors.accept(player)
+    team_stats = teamstats.TeamHomogeneity(pg.abilities, members)
+
+    neighbor = neighbors.candidate_array()
+    density, team_ability, team_gini = greedy.score_frontier(pg, neighbor, list(members), scores, team_stats)
+    if network_name == "Back":
+        team_homo = 1/team_gini  # homogeneity
+    elif network_name == "Forward":
+        team_homo = team_gini  # heterogeneity
+    score = alpha * greedy.normalize_min_max_array(team_ability) + \
+            beta * density + \
+            (1-alpha-beta) * greedy.normalize_min_max_array(team_homo)
+
+    order = np.argsort(-score, kind='stable')[:width]
+    children = []
+    for i in order.tolist():
+        if not score[i] > 0:
+            break
+        team = list(members) + [int(neighbor[i])]
+        children.append((int(neighbor[i]), team_objective(pg, team, scores, alpha, beta, network_name)))
+
+    return children
+
+
+def team_objective(pg, team, scores, alpha, beta, network_name):
+    """
+    The objective of a whole team, comparable between teams:
+    alpha * the average ability (min-max normalised over the graph)
+    + beta * the density (the average similarity over the pairs of the team)
+    + (1-alpha-beta) * the homogeneity (1 - Gini coefficient) for "Back",
+      the heterogeneity (Gini coefficient) for "Forward"
+    """
+    ability = float(np.mean(scores[team]))
+    score_min, score_max = float(scores.min()), float(scores.max())
+    ability_nor = (ability-score_min)/(score_max-score_min) if score_max > score_min else 0.0
+
+    weight = 0.0
+    for r, player in enumerate(team):
+        row = pg.neighbors(player)
+        others = np.array(team[r+1:], dtype=row.dtype)
+        pos = np.minimum(np.searchsorted(row, others), len(row)-1)
+        if len(row):
+            weight += float(np.where(row[pos] == others, pg.neighbor_weights(player)[pos], 0).sum())
+    pairs = len(team) * (len(team)-1) / 2
+    density = weight / pairs if pairs else 0.0
+
+    gini = teamstats.TeamHomogeneity(pg.abilities, team).team_gini()
+    homo = 1-gini if network_name == "Back" else gini
+
+    return alpha * ability_nor + beta * density + (1-alpha-beta) * homo
+
+
+@contextlib.contextmanager
+def _workers(shared, processes):
+    """
+    Yield a map(function, tasks) over <processes> workers sharing <shared>
+    (inherited with the "fork" start method, sent once per worker otherwise),
+    the built-in map in this process if processes == 1
+    """
+    if processes == 1:
+        _init_worker(shared)
+        try:
+            yield lambda function, tasks: list(map(function, tasks))
+        finally:
+            _SHARED.clear()
+        return
+
+    if "fork" in mp.get_all_start_methods():
+        _SHARED.update(shared)  # inherited by the forked workers
+        ctx, initargs = mp.get_context("fork"), (None,)
+    else:
+        ctx, initargs = mp.get_context(), (shared,)
+
+    try:
+        with ctx.Pool(processes=processes, initializer=_init_worker, initargs=initargs) as pool:
+            yield lambda function, tasks: pool.map(function, tasks, chunksize=1)
+    finally:
+        _SHARED.clear()
+
+
+def _init_worker(shared):
+    if shared is not None:
+        _SHARED.update(shared)
+
+
+def _start(star):
+    s = _SHARED
+    result = {"star": star, "team": None, "objective": None, "error": None}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            team = greedy.select_opt_players_batch(s["player_no_id"], s["pg"], s["scores"], s["alpha"], s["beta"],
+                                                   star, s["network_name"], s["datasource"])
+        result["team"] = team
+        result["objective"] = team_objective(s["pg"], team, s["scores"], s["alpha"], s["beta"], s["network_name"])
+    except Exception as e:  # e.g. a frontier without any candidate
+        result["error"] = "%s: %s" % (type(e).__name__, e)
+    return result
+
+
+def _expand(members):
+    s = _SHARED
+    return expand(s["pg"], members, s["scores"], s["alpha"], s["beta"],
+                  s["network_name"], s["datasource"], s["width"])
@@ -0,0 +1,189 @@
+# coding=utf-8
+
+"""
+Parallel sensitivity analysis of the FBTP model over (ALPHA, BETA, BUDGET)
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import contextlib
+import csv
+import io
+import multiprocessing as mp
+import time
+from collections import OrderedDict
+
+from FBTP import batch, fbtp, players
+
+
+# the networks shared (read-only) by the workers of a sweep
+_SHARED = {}
+
+
+def alpha_beta_grid(step=0.1):
+    """
+    All the (alpha, beta) pairs with alpha, beta in [0, 1] and alpha + beta <= 1,
+    the grid of the sensitivity analysis in main.py for step = 0.1
+    """
+    n = int(round(1 / step))
+    grid = []
+    for a in range(0, n+1):
+        for b in range(0, n+1-a):
+            grid.append((round(a*step, 10), round(b*step, 10)))
+    return grid
+
+
+def run_sweep(gks, abi_name_id,
+              p_no_id_back, pg_back, cri_back,
+              p_no_id_forward, pg_forward, cri_forward,
+              budgets, datasource, grid=None, processes=None, quiet=True):
+    """
+    FUNCTION: run <fbtp.FBTP> over the grid of (alpha, beta) for each budget in a process pool
+
+    On players.CSRGraph networks the runs are composed by <batch.compose_batch> instead:
+    each (alpha, beta) is pruned once, from the highest budget down, and the pool runs
+    one such chain per task. The seconds of a run are the time spent on it: the highest
+    budget of a chain also builds the team without budget constraint, a lower budget
+    only adds its rounds of pruning.
+
+    The networks, their ability matrices / scores and the goalkeeper table are prepared
+    once in the parent. With the "fork" start method the workers inherit them as
+    copy-on-write memory, so nothing is pickled per worker or per task; otherwise
+    they are pickled once to each worker by the pool initializer: every worker holds a
+    full copy of the networks and their caches (the memory-mapped arrays of the artifact
+    cache are copied too), so without fork a sweep of large networks is best run with
+    processes=1.
+
+    :params budgets --> the budget constraints
+    :params grid --> the (alpha, beta) pairs, <alpha_beta_grid> by default
+    :params processes --> the number of workers, os.cpu_count() by default
+    :params quiet --> hide the output of each run
+
+    :return the results table, one dict per (budget, alpha, beta):
+        budget, alpha, beta, GK, Back, Forward, cost, ability, homo_back, homo_forward,
+        pruning, seconds, error
+    """
+
+    if grid is None:
+        grid = alpha_beta_grid()
+    if not isinstance(gks, players.GoalkeeperTable):
+        gks = players.GoalkeeperTable.from_goalkeepers(gks)
+
+    # build the caches before the workers start, so they are shared instead of rebuilt
+    for pg, cri in ((pg_back, cri_back), (pg_forward, cri_forward)):
+        pg.ability_matrix()
+        pg.node_stats(cri, abi_name_id)
+        pg.position_index()
+        if isinstance(pg, players.CSRGraph):
+            pg.position_groups(datasource)
+
+    shared = {"gks": gks, "abi_name_id": abi_name_id,
+              "p_no_id_back": p_no_id_back, "pg_back": pg_back, "cri_back": cri_back,
+              "p_no_id_forward": p_no_id_forward, "pg_forward": pg_forward, "cri_forward": cri_forward,
+              "datasource": datasource, "quiet": quiet}
+    tasks = [(budget, alpha, beta) for budget in budgets for alpha, beta in grid]
+
+    chains = None
+    run, work = _run_one, tasks
+    if isinstance(pg_back, players.CSRGraph) and isinstance(pg_forward, players.CSRGraph):
+        # the (alpha, beta) chains of batch.compose_batch do not depend on each other
+        chains = OrderedDict()
+        for i, (budget, alpha, beta) in enumerate(tasks):
+            chains.setdefault((alpha, beta), []).append(i)
+        run, work = _run_batch, [[tasks[i] for i in chain] for chain in chains.values()]
+
+    if processes == 1:
+        _init_worker(shared)
+        return _gather(chains, [run(task) for task in work], len(tasks))
+
+    if "fork" in mp.get_all_start_methods():
+        _SHARED.update(shared)  # inherited by the forked workers
+        ctx, initargs = mp.get_context("fork"), (None,)
+    else:
+        ctx, initargs = mp.get_context(), (shared,)
+
+    try:
+        with ctx.Pool(processes=processes, initializer=_init_worker, initargs=initargs) as pool:
+            results = pool.map(run, work, chunksize=1)
+    finally:
+        _SHARED.clear()
+
+    return _gather(chains, results, len(tasks))
+
+
+def _init_worker(shared):
+    if shared is not None:
+        _SHARED.update(shared)
+
+
+def _gather(chains, results, no):
+    """ The rows of the tasks, in order, from the results of the runs (one list of rows per chain) """
+    if chains is None:
+        return results
+    rows = [None] * no
+    for chain, chain_rows in zip(chains.values(), results):
+        for i, row in zip(chain, chain_rows):
+            rows[i] = row
+    return rows
+
+
+def _row(budget, alpha, beta):
+    """ An empty row of the results table """
+    return {"budget": budget, "alpha": alpha, "beta": beta,
+            "GK": None, "Back": None, "Forward": None,
+            "cost": None, "ability": None, "homo_back": None, "homo_forward": None,
+            "pruning": None, "seconds": None, "error": None}
+
+
+def _run_batch(tasks):
+    s = _SHARED
+    timings = []
+    results = batch.compose_batch(tasks, s["gks"], s["abi_name_id"],
+                                  s["p_no_id_back"], s["pg_back"], s["cri_back"],
+                                  s["p_no_id_forward"], s["pg_forward"], s["cri_forward"],
+                                  s["datasource"], quiet=s["quiet"], timings=timings)
+
+    rows = []
+    for (budget, alpha, beta), (team, metrics), seconds in zip(tasks, results, timings):
+        row = _row(budget, alpha, beta)
+        if team is not None:
+            row.update(team)
+        row.update(metrics)
+        row["seconds"] = seconds
+        rows.append(row)
+
+    return rows
+
+
+def _run_one(task):
+    budget, alpha, beta = task
+    s = _SHARED
+    row = _row(budget, alpha, beta)
+
+    start = time.perf_counter()
+    out = io.StringIO() if s["quiet"] else sys.stdout
+    try:
+        with contextlib.redirect_stdout(out):
+            team, metrics = fbtp.FBTP(s["gks"], s["abi_name_id"],
+                                      s["p_no_id_back"], s["pg_back"], s["cri_back"],
+                                      s["p_no_id_forward"], s["pg_forward"], s["cri_forward"],
+                                      budget, alpha, beta, s["datasource"], details=True)
+        row.update(team)
+        row.update(metrics)
+    except Exception as e:
+        row["error"] = "%s: %s" % (type(e).__name__, e)
+    row["seconds"] = time.perf_counter() - start
+
+    return row
+
+
+def save_table(rows, filepath):
+    """ Write the results table of <run_sweep> to a CSV file """
+    if not rows:
+        return
+    with open(filepath, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,174 @@
+# coding=utf-8
+
+"""
+Incremental team statistics for the greedy selection and the FBTP pruning
+"""
+
+import heapq
+import numpy as np
+from FBTP import players, instrument
+
+
+class TeamHomogeneity:
+    """
+    The running state of the Gini coefficient computed by <greedy.cal_homogeneity>
+    - sums[a]: the sum of ability a over the team;
+    - diffs[a]: the sum of |x_i - x_j| of ability a over all ordered pairs (i, j) of the team.
+    Scoring "team + candidate" costs O(k*A) instead of O(k^2*A), and accepting
+    a player updates the state in place. For integer-valued abilities (FIFA, PES)
+    the results are identical to <greedy.cal_homogeneity>.
+    """
+
+    def __init__(self, abilities, members=()):
+        """
+        :params abilities --> the players x abilities matrix (see players.Graph.ability_matrix)
+        :params members --> the initial team
+        """
+        self.abilities = abilities
+        self.members = []
+        self.values = np.empty((0, abilities.shape[1]))  # the abilities of the members
+        self.sums = np.zeros(abilities.shape[1])
+        self.diffs = np.zeros(abilities.shape[1])
+
+        for player in members:
+            self.add(player)
+
+    def __len__(self):
+        return len(self.members)
+
+    def add(self, player):
+        """ Accept a player into the team """
+        x = self.abilities[player]
+        self.diffs = self.diffs + 2 * np.abs(self.values - x).sum(axis=0)
+        self.sums = self.sums + x
+        self.values = np.vstack([self.values, x])
+        self.members.append(player)
+
+    def remove(self, player):
+        """ Remove a player from the team """
+        r = self.members.index(player)
+        x = self.values[r]
+        self.values = np.delete(self.values, r, axis=0)
+        self.members.pop(r)
+        self.diffs = self.diffs - 2 * np.abs(self.values - x).sum(axis=0)
+        self.sums = self.sums - x
+
+    def gini(self, candidate):
+        """ The Gini coefficient of "team + candidate" """
+        return float(self.gini_batch(np.array([candidate]))[0])
+
+    def gini_batch(self, candidates):
+        """ The Gini coefficients of "team + candidate" for an array of candidates """
+        instrument.count("gini_evaluations", len(candidates))
+        x = self.abilities[candidates]  # candidates x abilities
+        diffs = self.diffs + 2 * np.abs(x[:, None, :] - self.values[None, :, :]).sum(axis=1)
+        sums = self.sums + x
+        return gini_coefficient(diffs, sums, len(self.members) + 1)
+
+    def team_gini(self):
+        """ The Gini coefficient of the current team """
+        return float(gini_coefficient(self.diffs[None, :], self.sums[None, :], len(self.members))[0])
+
+
+def gini_coefficient(diffs, sums, no):
+    """
+    The average Gini coefficient over the abilities (columns), as in <greedy.cal_homogeneity>
+    :params diffs --> the sums of the pairwise differences, one row per team
+    :params sums --> the sums of the abilities, one row per team
+    :params no --> the team size
+    """
+    homo = np.zeros(diffs.shape[0])
+    for a in range(0, diffs.shape[1]):
+        avg = sums[:, a] / no
+        homo += (1/(2*pow(no, 2)*avg)) * diffs[:, a]
+
+    return homo / diffs.shape[1]
+
+
+class TeamState:
+    """
+    The metrics of a team under pruning, updated by delta when one player is swapped
+    - the total cost, the total ability and the cost performance of every player;
+    - the Gini state of the Back and Forward/Midfielder sub-teams (see <TeamHomogeneity>);
+    - a min-heap on the cost performance, so the next player to cut is found in O(log n).
+    The values are those of <fbtp.cal_cost_abi_homo>, except that the players are
+    identified by (position, ID), so a Back and a Forward player with the same number
+    no longer share one cost performance entry.
+    """
+
+    GROUPS = ("GK", "Back", "Forward")
+
+    def __init__(self, team, gks, pg_back, pg_forward, cri_back, cri_for, abi_name_id):
+        if not isinstance(gks, players.GoalkeeperTable):
+            gks = players.GoalkeeperTable.from_goalkeepers(gks)
+        self.gks = gks
+        self.graphs = {"Back": pg_back, "Forward": pg_forward}
+        self.scores = {"Back": pg_back.ability_scores(cri_back, abi_name_id),
+                       "Forward": pg_forward.ability_scores(cri_for, abi_name_id)}
+        self.homo = {"Back": TeamHomogeneity(pg_back.ability_matrix()[0]),
+                     "Forward": TeamHomogeneity(pg_forward.ability_matrix()[0])}
+
+        self.team = {pos: [] for pos in self.GROUPS}
+        self.cost = 0
+        self.total_ability = 0
+        self.cf = {}  # (position, ID) --> cost performance
+        self.live = {}  # (position, ID) --> sequence number of the valid heap entry
+        self.heap = []  # (cost performance, position rank, sequence, position, ID)
+        self.seq = 0
+
+        for pos in self.GROUPS:
+            for player in team[pos]:
+                self.add(pos, player)
+
+    def player_cost_ability(self, pos, player):
+        if pos == "GK":
+            return self.gks.get_salary(player), self.gks.get_ability(player)
+        return self.graphs[pos].vertexList[player].salary, float(self.scores[pos][player])
+
+    def add(self, pos, player):
+        cost, abi = self.player_cost_ability(pos, player)
+        self.team[pos].append(player)
+        self.cost += cost
+        self.total_ability += abi
+        if pos in self.homo:
+            self.homo[pos].add(player)
+
+        cf = round(abi/cost, 3)
+        self.cf[(pos, player)] = cf
+        self.live[(pos, player)] = self.seq
+        heapq.heappush(self.heap, (cf, self.GROUPS.index(pos), self.seq, pos, player))
+        self.seq += 1
+
+    def remove(self, pos, player):
+        cost, abi = self.player_cost_ability(pos, player)
+        self.team[pos].remove(player)
+        self.cost -= cost
+        self.total_ability -= abi
+        if pos in self.homo:
+            self.homo[pos].remove(player)
+        del self.cf[(pos, player)]
+        del self.live[(pos, player)]  # the heap entry is dropped lazily
+
+    def swap(self, pos, player_out, player_in):
+        """ Replace <player_out> with <player_in> at position <pos> """
+        self.remove(pos, player_out)
+        self.add(pos, player_in)
+
+    def next_cut(self):
+        """ The (position, ID) of the player with the lowest cost performance """
+        while self.heap:
+            cf, _, seq, pos, player = self.heap[0]
+            if self.live.get((pos, player)) == seq:
+                return pos, player
+            heapq.heappop(self.heap)
+        return None
+
+    def ability(self):  # the average team ability
+        return self.total_ability / 11
+
+    def homogeneity(self, pos):  # the Gini coefficient of a sub-team
+        return self.homo[pos].team_gini()
+
+    def cost_performance(self):
+        """ {ID: cost performance}, in the layout of <fbtp.cal_cost_abi_homo> """
+        return {player: self.cf[(pos, player)] for pos in self.GROUPS for player in self.team[pos]}
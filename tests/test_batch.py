@@ -0,0 +1,108 @@
+# coding=utf-8
+
+"""
+batch.compose_batch against one fbtp.FBTP run per request
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import contextlib
+import io
+
+import pytest
+
+from FBTP import batch, benchmark, fbtp, greedy, modules, sweep
+
+
+def build(div, n, seed):
+    """ abi_name_id, p_no_id and the players.CSRGraph of a synthetic network, as artifacts.load_graph """
+    columns, names = benchmark.synthetic_columns(n, div, seed=seed)
+    abi_name_id, p_attrs, p_abis_name, p_pos, p_r, p_no_id = modules.info_views(columns, names)
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim = modules.cal_similarity_sparse(div, p_attrs)
+        pg = greedy.players_csr_graph_construction(sim, modules.cal_ability_avg(p_abis_name), p_abis_name,
+                                                   abi_name_id, p_pos, p_r)
+    return abi_name_id, p_no_id, pg
+
+
+def compose(gks, abi_name_id, back, forward, budget, alpha, beta, cri_back=None, cri_forward=None):
+    """ The (team_real, metrics) of <fbtp.FBTP>, as compose_batch gives them """
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            team, metrics = fbtp.FBTP(gks, abi_name_id, back[0], back[1], cri_back or back[2],
+                                      forward[0], forward[1], cri_forward or forward[2],
+                                      budget, alpha, beta, 'FIFA', details=True)
+    except Exception as e:
+        return None, {"error": "%s: %s" % (type(e).__name__, e)}
+    metrics["error"] = None
+    return team, metrics
+
+
+def test_compose_batch_matches_fbtp():
+    abi_name_id, p_no_id_back, pg_back = build('Back', 300, seed=1)
+    _, p_no_id_forward, pg_forward = build('Forward', 300, seed=1)
+    cri_back = benchmark.synthetic_criteria('Back', abi_name_id)
+    cri_forward = benchmark.synthetic_criteria('Forward', abi_name_id)
+    gks = benchmark.synthetic_goalkeepers(60, seed=1)
+    back = (p_no_id_back, pg_back, cri_back)
+    forward = (p_no_id_forward, pg_forward, cri_forward)
+
+    # the budgets around the cost of the unconstrained team
+    cost = compose(gks, abi_name_id, back, forward, float('inf'), 0.5, 0.3)[1]["cost"]
+    cri_other = dict(cri_back, **{name: 0.0 for name in list(cri_back)[:3]})
+    requests = [batch.CompositionRequest(budget * cost, alpha, beta)
+                for budget in (1.5, 0.9, 0.7, 0.5) for alpha, beta in sweep.alpha_beta_grid(0.25)]
+    requests += [batch.CompositionRequest(0.8 * cost, 0.6, 0.2, cri_back=cri_other),
+                 batch.CompositionRequest(0.6 * cost, 0.6, 0.2, cri_back=cri_other)]
+
+    timings = []
+    results = batch.compose_batch(requests, gks, abi_name_id,
+                                  p_no_id_back, pg_back, cri_back,
+                                  p_no_id_forward, pg_forward, cri_forward, 'FIFA', timings=timings)
+
+    assert len(results) == len(requests)
+    assert len(timings) == len(requests) and min(timings) >= 0
+    assert any(team is not None for team, _ in results)
+    for r, (team, metrics) in zip(requests, results):
+        expected_team, expected = compose(gks, abi_name_id, back, forward, r.budget, r.alpha, r.beta,
+                                          cri_back=r.cri_back)
+        assert team == expected_team, r
+        assert metrics == pytest.approx(expected), r
+
+
+def test_run_sweep_matches_fbtp():
+    abi_name_id, p_no_id_back, pg_back = build('Back', 200, seed=2)
+    _, p_no_id_forward, pg_forward = build('Forward', 200, seed=2)
+    cri_back = benchmark.synthetic_criteria('Back', abi_name_id)
+    cri_forward = benchmark.synthetic_criteria('Forward', abi_name_id)
+    gks = benchmark.synthetic_goalkeepers(40, seed=2)
+    back = (p_no_id_back, pg_back, cri_back)
+    forward = (p_no_id_forward, pg_forward, cri_forward)
+
+    cost = compose(gks, abi_name_id, back, forward, float('inf'), 0.5, 0.3)[1]["cost"]
+    budgets, grid = [1.2 * cost, 0.6 * cost], sweep.alpha_beta_grid(0.5)
+    expected = []
+    for budget in budgets:
+        for alpha, beta in grid:
+            team, metrics = compose(gks, abi_name_id, back, forward, budget, alpha, beta)
+            row = sweep._row(budget, alpha, beta)
+            row.update(team or {})
+            row.update(metrics)
+            del row["seconds"]
+            expected.append(row)
+
+    # one (alpha, beta) chain per task, in the parent and in a pool of two workers
+    for processes in (1, 2):
+        rows = sweep.run_sweep(gks, abi_name_id, p_no_id_back, pg_back, cri_back,
+                               p_no_id_forward, pg_forward, cri_forward, budgets, 'FIFA',
+                               grid=grid, processes=processes)
+        assert len(rows) == len(expected)
+        for row, exp in zip(rows, expected):
+            assert row.pop("seconds") >= 0
+            if exp["error"] is not None:
+                # a constant term: a ZeroDivisionError of FBTP, no candidate for compose_batch
+                assert row["error"] is not None
+                continue
+            assert row == pytest.approx(exp), processes
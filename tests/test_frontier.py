@@ -0,0 +1,90 @@
+# coding=utf-8
+
+"""
+The incremental frontiers of frontier.py against the neighbor list rebuilt from scratch
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import numpy as np
+
+from FBTP import frontier, greedy, players, positions
+
+
+POSITIONS = ['CB', 'LCB', 'RCB', 'LB', 'RB', 'LWB', 'RWB', 'CM', 'CDM', 'ST', 'GK']
+QUOTA = {"CB": 2, "LB": 1, "RB": 1, "MID": 2, "FOR": 0}
+
+
+def graph(n, degree=8, seed=0):
+    """ A random players.Graph of <n> FIFA players, with about <degree> neighbors each """
+    rng = np.random.default_rng(seed)
+    pg = players.Graph()
+    for i in range(0, n):
+        vertex = pg.add_vertex(i)
+        vertex.position = POSITIONS[rng.integers(len(POSITIONS))]
+        vertex.abilities = {0: 50}
+        vertex.salary = 1.0
+    weights = {}
+    for _ in range(0, n * degree // 2):
+        f, t = sorted(rng.choice(n, 2, replace=False).tolist())
+        weights[f, t] = weights[t, f] = float(rng.random())
+    for f, t in sorted(weights):  # the neighbors in the order of the players, as players_graph_construction
+        pg.add_edge(f, t, weights[f, t])
+    return pg
+
+
+def rescan(pg, team, excluded, quota):
+    """ The neighbors of <team>, as <greedy.select_opt_players> listed them before the frontier """
+    neighbor = []
+    for player in team:
+        for key in pg.vertexList[player].connectedTo:
+            if key.id not in neighbor and key.id not in team and key.id not in excluded and \
+                    quota(greedy.position_trans(key.position, 'FIFA')) != 0:
+                neighbor.append(key.id)
+    return neighbor
+
+
+def frontiers(pg):
+    """ Every kind of frontier over <pg>, with a function, position group --> the quota left """
+    group_of = lambda p: greedy.position_trans(pg.vertexList[p].position, 'FIFA')
+    for index in (None, pg.position_index()):
+        quota = dict(QUOTA)
+        yield frontier.Frontier(pg.neighbors, group_of, quota, index=index,
+                                position_group=lambda name: greedy.position_trans(name, 'FIFA')), \
+            lambda group, quota=quota: quota.get(group, 0)
+
+    csr = players.CSRGraph.from_graph(pg)
+    groups = list(positions.GROUPS['FIFA'])
+    group_positions = [[] for _ in groups]
+    for code, group in enumerate(positions.group_codes(csr.position_names, 'FIFA').tolist()):
+        if group != positions.NO_GROUP:
+            group_positions[group].append(code)
+    for index in (None, csr.position_index()):
+        quota = np.array([QUOTA[group] for group in groups], dtype=np.int64)
+        yield frontier.CodedFrontier(csr.neighbors, csr.position_groups('FIFA'), quota,
+                                     index=index, group_positions=group_positions), \
+            lambda group, quota=quota: quota[groups.index(group)] if group in groups else 0
+
+
+def test_frontier_matches_rescan():
+    rng = np.random.default_rng(1)
+    for seed in range(0, 5):
+        pg = graph(120, seed=seed)
+        for neighbors, quota in frontiers(pg):
+            excluded = rng.choice(120, 5, replace=False).tolist()
+            for player in excluded:
+                neighbors.exclude(player)
+            team = [next(p for p in range(0, 120) if p not in excluded and
+                         QUOTA.get(greedy.position_trans(pg.vertexList[p].position, 'FIFA'), 0))]
+            neighbors.accept(team[0])
+            while True:
+                expected = rescan(pg, team, excluded, quota)
+                assert neighbors.candidates() == expected
+                assert neighbors.candidate_array().tolist() == expected
+                assert len(neighbors) == len(expected)
+                if not expected:
+                    break
+                team.append(expected[rng.integers(len(expected))])
+                neighbors.accept(team[-1])
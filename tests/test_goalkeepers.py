@@ -0,0 +1,57 @@
+# coding=utf-8
+
+"""
+players.GoalkeeperTable against the linear scans over the goalkeepers
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import numpy as np
+
+from FBTP import greedy, players
+
+
+def goalkeepers(n, seed=0):
+    """ Goalkeepers with few distinct ratings, so the abilities and the salaries tie """
+    rng = np.random.default_rng(seed)
+    gks = []
+    for g in range(0, n):
+        gk = players.Goalkeeper(1000 + g)
+        gk.ability = rng.integers(60, 64, 4).tolist()
+        gk.rating = int(rng.integers(70, 76))
+        gk.salary = greedy.cal_player_salary(0, [gk.rating])
+        gks.append(gk)
+    return gks
+
+
+def scan_best(gks):
+    """ The goalkeeper of the greedy selection: the first one with the highest personal ability """
+    score_max, best = 0, None
+    for gk in gks:
+        score = sum(gk.ability)/len(gk.ability)
+        if score_max < score:
+            score_max, best = score, gk.id
+    return best
+
+
+def scan_under_salary(gks, salary):
+    """ The goalkeeper of the pruning: the first best one whose salary < <salary> """
+    opt_abi, candidate = 0, None
+    for gk in gks:
+        abi = sum(gk.ability)/len(gk.ability)
+        if opt_abi < abi and gk.get_salary() < salary:
+            opt_abi, candidate = abi, gk.id
+    return candidate
+
+
+def test_best_under_salary_matches_scan():
+    for seed in range(0, 5):
+        gks = goalkeepers(40, seed=seed)
+        table = players.GoalkeeperTable.from_goalkeepers(gks)
+        assert table.best() == scan_best(gks)
+
+        salaries = sorted({gk.salary for gk in gks})
+        for salary in salaries + [s + 1 for s in salaries] + [0, salaries[0], float('inf')]:
+            assert table.best_under_salary(salary) == scan_under_salary(gks, salary), salary
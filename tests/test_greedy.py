@@ -0,0 +1,118 @@
+# coding=utf-8
+
+"""
+The batched greedy selection (greedy.select_opt_players_batch) against the
+legacy one (greedy.select_opt_players)
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from FBTP import greedy, modules, players, search
+
+
+POSITIONS = {
+    'Back': ['CB', 'LCB', 'RCB', 'LB', 'RB', 'LWB', 'RWB'],
+    'Forward': ['ST', 'CF', 'LW', 'RW', 'CAM', 'CM', 'CDM', 'LM', 'RM'],
+}
+
+
+def network(div, n, seed=0, abilities=12):
+    """
+    A random network in the layout of FIFApre.read_info, as a players.Graph and its players.CSRGraph
+    :return player_no_id, abi_name_id, the Graph, the CSRGraph
+    """
+    rng = np.random.default_rng(seed)
+    player_attributes = {i: ["Club %d" % rng.integers(n // 6), "Nation %d" % rng.integers(n // 20)]
+                         for i in range(0, n)}
+    player_attributes[n - 1] = ["Club -1", "Nation -1"]  # the dense loop skips the last player
+    abi_name_id = {"ability %d" % a: a for a in range(0, abilities)}
+    abis_name = {name: {i: int(rng.integers(30, 99)) for i in range(0, n)} for name in abi_name_id}
+    position = {i: POSITIONS[div][rng.integers(len(POSITIONS[div]))] for i in range(0, n)}
+    rating = {i: int(rng.integers(55, 90)) for i in range(0, n)}
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim = modules.cal_similarity(div, player_attributes)
+        pg = greedy.players_graph_construction(sim, modules.cal_ability_avg(abis_name), abis_name,
+                                               abi_name_id, position, rating)
+    player_no_id = {i: 10000 + i for i in range(0, n)}
+
+    return player_no_id, abi_name_id, pg, players.CSRGraph.from_graph(pg)
+
+
+def test_batch_matches_legacy():
+    for div in ('Back', 'Forward'):
+        player_no_id, abi_name_id, pg, csr = network(div, 160, seed=len(div))
+        criteria = {name: 0.05 * (a % 5 + 1) for name, a in abi_name_id.items()}
+        scores = pg.ability_scores(criteria, abi_name_id)
+        stars = sorted(pg.get_vertices(), key=lambda p: -len(pg.vertexList[p].connectedTo))[:8]
+        for star in stars:
+            for alpha, beta in ((0.6, 0.2), (0.3, 0.3), (0.1, 0.8), (0.0, 0.0)):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    legacy = greedy.select_opt_players(player_no_id, pg.vertexList, criteria, abi_name_id,
+                                                       alpha, beta, star, div, 'FIFA', scores=scores,
+                                                       abilities=pg.ability_matrix()[0])
+                    batch = greedy.select_opt_players_batch(player_no_id, csr,
+                                                            csr.ability_scores(criteria, abi_name_id),
+                                                            alpha, beta, star, div, 'FIFA')
+                assert batch == legacy, (div, star, alpha, beta)
+
+
+def path():
+    """ A players.Graph of the path 0-1-2-3-4: every frontier from 0 has a single candidate """
+    pg = players.Graph()
+    for i, position in enumerate(['CB', 'LB', 'CB', 'RB', 'CM']):
+        vertex = pg.add_vertex(i)
+        vertex.position = position
+        vertex.abilities = {0: 40 + 7 * i, 1: 60 - 3 * i}
+        vertex.salary = 1.0
+    for i in range(0, 4):
+        pg.add_edge(i, i + 1, 0.5)
+        pg.add_edge(i + 1, i, 0.5)
+    return pg
+
+
+def test_constant_term():
+    pg = path()
+    player_no_id = {i: 100 + i for i in range(0, 5)}
+    abi_name_id = {"ability 0": 0, "ability 1": 1}
+    criteria = {"ability 0": 0.5, "ability 1": 0.5}
+    csr = players.CSRGraph.from_graph(pg)
+
+    # the constant team ability and homogeneity are normalised to 0, the legacy selection divides by 0
+    assert greedy.normalize_min_max_array(np.array([0.4])).tolist() == [0.0]
+    assert np.isnan(greedy.normalize_min_max_array(np.array([0.4, 0.4]), constant=np.nan)).all()
+    for alpha, beta in ((0.6, 0.2), (0.0, 0.0)):
+        with contextlib.redirect_stdout(io.StringIO()), pytest.raises(ZeroDivisionError):
+            greedy.select_opt_players(player_no_id, pg.vertexList, criteria, abi_name_id, alpha, beta, 0,
+                                      'Back', 'FIFA', scores=pg.ability_scores(criteria, abi_name_id),
+                                      abilities=pg.ability_matrix()[0])
+    with contextlib.redirect_stdout(io.StringIO()):
+        # the batch selection picks by the density alone
+        assert greedy.select_opt_players_batch(player_no_id, csr, csr.ability_scores(criteria, abi_name_id),
+                                               0.6, 0.2, 0, 'Back', 'FIFA') == [0, 1, 2, 3]
+        # and finds no candidate without it
+        with pytest.raises(KeyError):
+            greedy.select_opt_players_batch(player_no_id, csr, csr.ability_scores(criteria, abi_name_id),
+                                            0.0, 0.0, 0, 'Back', 'FIFA')
+
+
+def test_multi_start_without_team():
+    pg = path()
+    player_no_id = {i: 100 + i for i in range(0, 5)}
+    abi_name_id = {"ability 0": 0, "ability 1": 1}
+    criteria = {"ability 0": 0.5, "ability 1": 0.5}
+
+    # alpha = beta = 0: no score is positive, no start gives a team
+    with pytest.raises(search.SearchError) as e:
+        greedy.player_opt_subgraph(player_no_id, pg, criteria, abi_name_id, 0.0, 0.0, 'Back', 'FIFA', starts=3)
+    assert len(e.value.results) == 3
+    assert all(result["error"] == "KeyError: None" for result in e.value.results)
+    assert str(e.value).count("KeyError: None") == 3
@@ -0,0 +1,58 @@
+# coding=utf-8
+
+"""
+The recall of modules.cal_similarity_minhash against the exact Jaccard, for a fixed seed
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import contextlib
+import io
+
+import numpy as np
+
+from FBTP import modules
+
+
+def attributes(n, seed=0):
+    """ {player: [club, nationality, league, tag]} of a random roster, no value shared by two attributes """
+    rng = np.random.default_rng(seed)
+    return {i: ["club %d" % rng.integers(n // 8), "nation %d" % rng.integers(40),
+                "league %d" % rng.integers(12), "tag %d" % rng.integers(6)] for i in range(0, n)}
+
+
+def minhash(player_attributes, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return modules.cal_similarity_minhash('Back', player_attributes, seed=0, **kwargs)
+
+
+def error(similarity, player_attributes):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return modules.cal_similarity_error(similarity, player_attributes, above=modules.lsh_threshold(32, 4))
+
+
+def test_minhash_recall():
+    player_attributes = attributes(3000)
+    sim = minhash(player_attributes)
+    err = error(sim, player_attributes)
+
+    # the edges found are exact edges, and nearly all the ones above the LSH threshold are found
+    assert err["precision"] == 1.0
+    assert err["recall_above"] >= 0.95
+    assert err["mae"] < 0.05
+    # a fixed seed gives the same graph
+    again = minhash(player_attributes)
+    np.testing.assert_array_equal(sim.indptr, again.indptr)
+    np.testing.assert_array_equal(sim.indices, again.indices)
+    np.testing.assert_array_equal(sim.data, again.data)
+
+
+def test_minhash_max_bucket():
+    player_attributes = attributes(3000)
+    sim = minhash(player_attributes, max_bucket=20)
+
+    # at most <max_bucket>-1 partners per player and band
+    assert np.diff(sim.indptr).max() <= 32 * 19
+    assert error(sim, player_attributes)["recall_above"] >= 0.95
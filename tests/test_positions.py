@@ -0,0 +1,68 @@
+# coding=utf-8
+
+"""
+positions.translate against the regular expression and lists of the original greedy.position_trans
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import re
+
+from FBTP import greedy, positions
+
+
+def position_trans(player_position, datasource):
+    """ greedy.position_trans before positions.py """
+    if datasource == 'PES':
+        if re.match(r".+MF", player_position):
+            player_position = "*MF"
+        elif player_position == "CF" or player_position == "SS":
+            player_position = "CF/SS"
+    elif datasource == 'FIFA':
+        FOR = ['LS','LF','CF','RF','RS','ST','LW','SS','RW']  # Forward
+        MID = ['LAM','CAM','RAM','CM','LM','LCM','RCM','RM','LDM','CDM','RDM']  # Midfielder
+        RBS = ['RWB','RCB','RB']  # RB
+        LBS = ['LWB','LCB','LB']  # LB
+        if player_position in FOR:
+            player_position = 'FOR'
+        elif player_position in MID:
+            player_position = 'MID'
+        elif player_position in RBS:
+            player_position = 'RB'
+        elif player_position in LBS:
+            player_position = 'LB'
+
+    return player_position
+
+
+POSITIONS = ['GK', 'CB', 'LB', 'RB', 'LCB', 'RCB', 'LWB', 'RWB', 'SWP',
+             'DMF', 'CMF', 'AMF', 'LMF', 'RMF', 'MF', 'MFX', 'XMFY', 'MFMF', 'FMF',
+             'LS', 'LF', 'CF', 'RF', 'RS', 'ST', 'LW', 'SS', 'RW', 'LWF', 'RWF',
+             'LAM', 'CAM', 'RAM', 'CM', 'LM', 'LCM', 'RCM', 'RM', 'LDM', 'CDM', 'RDM', 'SUB', 'RES', '']
+
+
+def test_translate_matches_position_trans():
+    for datasource in ('PES', 'FIFA', 'other'):
+        for position in POSITIONS:
+            expected = position_trans(position, datasource)
+            assert positions.translate(position, datasource) == expected, (datasource, position)
+            assert greedy.position_trans(position, datasource) == expected, (datasource, position)
+
+
+def test_group_codes():
+    for datasource in ('PES', 'FIFA'):
+        codes = positions.group_codes(POSITIONS, datasource).tolist()
+        for position, code in zip(POSITIONS, codes):
+            group = position_trans(position, datasource)
+            if group in positions.GROUPS[datasource]:
+                assert positions.GROUPS[datasource][code] == group
+            else:
+                assert code == positions.NO_GROUP
+
+    # the position numbers of greedy.select_opt_players
+    position_num = {'PES': {"CB": 2, "LB": 1, "RB": 1, "CF/SS": 1, "LWF": 1, "RWF": 1, "*MF": 3},
+                    'FIFA': {"CB": 2, "LB": 1, "RB": 1, "MID": 3, "FOR": 3}}
+    for datasource, quota in position_num.items():
+        assert dict(zip(positions.GROUPS[datasource], positions.quota(datasource).tolist())) == quota
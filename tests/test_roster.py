@@ -0,0 +1,136 @@
+# coding=utf-8
+
+"""
+The incremental maintenance of roster.Roster against a full rebuild of the graph
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from FBTP import benchmark, delta, greedy, modules, roster, FIFApre
+
+
+def build(columns, names):
+    """ abi_name_id, p_no_id and the players.CSRGraph of the columns, as artifacts.load_graph """
+    abi_name_id, p_attrs, p_abis_name, p_pos, p_r, p_no_id = modules.info_views(columns, names)
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim = modules.cal_similarity_sparse('Back', p_attrs)
+        pg = greedy.players_csr_graph_construction(sim, modules.cal_ability_avg(p_abis_name), p_abis_name,
+                                                   abi_name_id, p_pos, p_r)
+    return abi_name_id, p_no_id, pg
+
+
+def take(columns, rows):
+    return {name: column[rows] for name, column in columns.items()}
+
+
+def stats_by_key(stats, values):
+    return dict(zip(stats.keys.tolist(), np.asarray(values).tolist()))
+
+
+def test_roster_matches_rebuild():
+    columns, names = benchmark.synthetic_columns(405, 'Back', seed=3)
+    columns['abilities'] = columns['abilities'].astype(np.float64)
+    n = 400
+    abi_name_id, _, pg = build(take(columns, np.arange(n)), names)
+    criteria = benchmark.synthetic_criteria('Back', abi_name_id)
+    pg.node_stats(criteria, abi_name_id).core
+    ro = roster.Roster.from_info(pg, take(columns, np.arange(n)), {"abilities": names})
+
+    # the expected columns: the changes are applied to <final>, then the graph is rebuilt
+    final = {name: column.copy() for name, column in columns.items()}
+    row_of = {player_id: i for i, player_id in enumerate(columns['ids'].tolist())}
+    rng = np.random.default_rng(7)
+    clubs = sorted(set(columns['club'].tolist()))
+    nationalities = sorted(set(columns['nationality'].tolist()))
+    kept = columns['ids'][:n].tolist()
+    top = [name for name in names if abi_name_id[name] in pg.ability_ids]  # kept the top 10 columns
+    with ro.batch():
+        for player_id in rng.choice(kept, 45, replace=False).tolist():
+            i = row_of[player_id]
+            final['club'][i] = clubs[rng.integers(len(clubs))]
+            if rng.random() < 0.3:
+                final['nationality'][i] = nationalities[rng.integers(len(nationalities))]
+            if rng.random() < 0.3:
+                final['position'][i] = FIFApre.POSITIONS['Back'][rng.integers(len(FIFApre.POSITIONS['Back']))]
+            final['rating'][i] += 2
+            name = top[rng.integers(len(top))]
+            final['abilities'][i, abi_name_id[name]] += 3
+            ro.modify(player_id, club=final['club'][i], nationality=final['nationality'][i],
+                      position=final['position'][i], rating=final['rating'][i],
+                      abilities={name: final['abilities'][i, abi_name_id[name]]})
+        for player_id in rng.choice(kept, 5, replace=False).tolist():
+            ro.remove(player_id)
+        for i in range(n, n + 5):
+            ro.add(int(final['ids'][i]), final['club'][i], final['nationality'][i], final['position'][i],
+                   final['rating'][i], dict(zip(names, final['abilities'][i].tolist())))
+
+    # the rebuild keeps the order of the roster numbers, without the removed players
+    order = [player_id for player_id in ro.ids if player_id in ro]
+    _, p_no_id, ref = build(take(final, np.array([row_of[player_id] for player_id in order])), names)
+    assert list(ref.ability_ids) == list(pg.ability_ids)
+    number = [ro.number[player_id] for player_id in order]
+
+    for a, v in enumerate(number):
+        expected = {order[j]: w for j, w in zip(ref.neighbors(a).tolist(), ref.neighbor_weights(a).tolist())}
+        found = {ro.ids[j]: w for j, w in zip(pg.neighbors(v).tolist(), pg.neighbor_weights(v).tolist())}
+        assert found == pytest.approx(expected)
+        assert pg.salary[v] == pytest.approx(ref.salary[a])
+        assert pg.position_of(v) == ref.position_of(a)
+        np.testing.assert_allclose(pg.abilities[v], ref.abilities[a])
+    np.testing.assert_allclose(pg.ability_scores(criteria, abi_name_id)[number],
+                               ref.ability_scores(criteria, abi_name_id))
+
+    stats, ref_stats = pg.node_stats(criteria, abi_name_id), ref.node_stats(criteria, abi_name_id)
+    core, ref_core = stats_by_key(stats, stats.core), stats_by_key(ref_stats, ref_stats.core)
+    assert [core[v] for v in number] == [ref_core[a] for a in range(len(order))]
+    assert ro.ids[stats.star()] == order[ref_stats.star()]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        team = greedy.player_opt_subgraph(dict(enumerate(ro.ids)), pg, criteria, abi_name_id,
+                                          0.5, 0.3, 'Back', 'FIFA', batch=True)
+        ref_team = greedy.player_opt_subgraph(p_no_id, ref, criteria, abi_name_id,
+                                              0.5, 0.3, 'Back', 'FIFA', batch=True)
+    assert [ro.ids[v] for v in team] == [order[a] for a in ref_team]
+
+
+def test_patch_names_the_missing_criterion():
+    columns, names = benchmark.synthetic_columns(50, 'Back', seed=4)
+    columns['abilities'] = columns['abilities'].astype(np.float64)
+    abi_name_id, _, pg = build(columns, names)
+    criteria = benchmark.synthetic_criteria('Back', abi_name_id)
+    missing = [name for name, abi_id in abi_name_id.items() if abi_id == pg.ability_ids[0]][0]
+    partial = {name: weight for name, weight in criteria.items() if name != missing}
+    pg.set_ability_scores(partial, abi_name_id, np.zeros(pg.numVertices))
+
+    # the patched vertices are scored as in ability_scores, with the same KeyError
+    with pytest.raises(KeyError) as e:
+        pg.patch(None, {0: (pg.position_of(0), pg.salary[0], pg.abilities[0] + 1)})
+    assert e.value.args == (missing,)
+
+
+def test_delta_rejects_with_line_numbers(tmp_path):
+    columns, names = benchmark.synthetic_columns(50, 'Back', seed=5)
+    columns['abilities'] = columns['abilities'].astype(np.float64)
+    _, _, pg = build(columns, names)
+    stream = delta.DeltaStream(roster.Roster.from_info(pg, columns, {"abilities": names}), 'Back', names)
+
+    header = FIFApre.INFO_COLUMNS + names
+    abilities = ",".join(["50"] * len(names))
+    path = tmp_path / "delta.csv"
+    path.write_text(",".join(header) + "\n"
+                    + 'x,70,"Club\nwith a newline",Spain,CB,' + abilities + "\n"  # lines 2-3
+                    + "\n"  # line 4, an empty row
+                    + "7,seventy,Club,Spain,CB," + abilities + "\n", encoding="utf-8")  # line 5
+    stats = stream.ingest(str(path))
+
+    assert stats["added"] == 0
+    assert [(line, reason.split(":")[0]) for _, line, reason in stream.rejected] == \
+        [(2, "sofifa_id"), (4, "sofifa_id"), (5, "overall")]
@@ -0,0 +1,40 @@
+# coding=utf-8
+
+"""
+modules.cal_similarity_sparse against the dense modules.cal_similarity
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import contextlib
+import io
+
+import numpy as np
+
+from FBTP import modules
+
+
+def attributes(n, seed=0):
+    """ {player: [club, nationality]} of a random roster, a few clubs named after a nationality """
+    rng = np.random.default_rng(seed)
+    clubs = ["Club %d" % c for c in range(0, n // 5)] + ["Spain", "Brazil"]
+    nationalities = ["Spain", "Brazil", "France", "Japan", "Chile", "Ghana"]
+    return {i: [clubs[rng.integers(len(clubs))], nationalities[rng.integers(len(nationalities))]]
+            for i in range(0, n)}
+
+
+def test_sparse_matches_dense():
+    player_attributes = attributes(80)
+    with contextlib.redirect_stdout(io.StringIO()):
+        dense = modules.cal_similarity('Back', player_attributes)
+        sim = modules.cal_similarity_sparse('Back', player_attributes)
+
+    sim = sim.toarray()
+    # the dense loop skips the last player, the sparse one does not
+    np.testing.assert_array_equal(sim[:-1, :-1], dense[:-1, :-1])
+    np.testing.assert_array_equal(sim, sim.T)
+    last = len(player_attributes) - 1
+    expected = [modules.jaccard(player_attributes[i], player_attributes[last]) for i in range(0, last + 1)]
+    np.testing.assert_array_equal(sim[last], expected)
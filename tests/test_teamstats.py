@@ -0,0 +1,96 @@
+# coding=utf-8
+
+"""
+The incremental team statistics of teamstats.py against the Gini coefficient and
+the team metrics computed from scratch
+"""
+
+import os, sys
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import numpy as np
+import pytest
+
+from FBTP import fbtp, greedy, players, teamstats
+
+
+def graph(n, abilities=6, seed=0):
+    """ A players.Graph of <n> players with integer abilities, without edges """
+    rng = np.random.default_rng(seed)
+    pg = players.Graph()
+    for i in range(0, n):
+        vertex = pg.add_vertex(i)
+        vertex.abilities = {a: int(rng.integers(30, 99)) for a in range(0, abilities)}
+        vertex.position = "CB"
+        vertex.salary = greedy.cal_player_salary(i, {i: int(rng.integers(55, 90))})
+    return pg
+
+
+def test_gini_matches_cal_homogeneity():
+    pg = graph(40)
+    abilities = pg.ability_matrix()[0]
+    rng = np.random.default_rng(1)
+    for size in (1, 2, 5):
+        team = rng.choice(40, size, replace=False).tolist()
+        stats = teamstats.TeamHomogeneity(abilities, team)
+        candidates = [p for p in range(0, 40) if p not in team]
+        expected = [greedy.cal_homogeneity(pg.vertexList, c, team) for c in candidates]
+
+        assert [stats.gini(c) for c in candidates] == expected
+        assert stats.gini_batch(np.array(candidates)).tolist() == expected
+
+
+def test_remove_matches_cal_homogeneity():
+    pg = graph(30)
+    stats = teamstats.TeamHomogeneity(pg.ability_matrix()[0], [3, 8, 12, 20, 25])
+    stats.remove(12)
+    stats.remove(3)
+    team = [8, 20, 25]
+    candidates = [p for p in range(0, 30) if p not in team]
+
+    assert stats.members == team
+    assert [stats.gini(c) for c in candidates] == \
+        pytest.approx([greedy.cal_homogeneity(pg.vertexList, c, team) for c in candidates], rel=1e-12)
+
+
+def goalkeepers(n, seed=0):
+    rng = np.random.default_rng(seed)
+    gks = []
+    for g in range(0, n):
+        gk = players.Goalkeeper(1000 + g)
+        gk.ability = rng.integers(40, 90, 6).tolist()
+        gk.rating = int(rng.integers(55, 90))
+        gk.salary = greedy.cal_player_salary(0, [gk.rating])
+        gks.append(gk)
+    return gks
+
+
+def test_team_state_matches_cal_cost_abi_homo():
+    # the Back and Forward teams are drawn from different numbers, so the cost performance
+    # of <fbtp.cal_cost_abi_homo> (keyed by number) has one entry per player
+    pg_back, pg_forward = graph(30, seed=2), graph(30, seed=3)
+    gks = goalkeepers(8)
+    abi_name_id = {"ability %d" % a: a for a in range(0, 6)}
+    cri_back = {name: 0.1 * (a + 1) for name, a in abi_name_id.items()}
+    cri_forward = {name: 0.1 * (6 - a) for name, a in abi_name_id.items()}
+    team = {"GK": [1000], "Back": [0, 1, 2, 3], "Forward": [15, 16, 17, 18, 19, 20]}
+    state = teamstats.TeamState(team, gks, pg_back, pg_forward, cri_back, cri_forward, abi_name_id)
+
+    rng = np.random.default_rng(4)
+    pool = {"GK": [gk.id for gk in gks], "Back": list(range(0, 15)), "Forward": list(range(15, 30))}
+    for step in range(0, 25):
+        cost, ability, homo_back, homo_forward, cf = fbtp.cal_cost_abi_homo(
+            state.team, gks, pg_back, pg_forward, cri_back, cri_forward, abi_name_id)
+        assert state.cost == pytest.approx(cost)
+        assert state.ability() == pytest.approx(ability)
+        assert state.homogeneity("Back") == pytest.approx(homo_back)
+        assert state.homogeneity("Forward") == pytest.approx(homo_forward)
+        assert state.cost_performance() == cf
+        # the player <fbtp.cut_base_cf> cuts: the first lowest cost performance
+        assert state.next_cut()[1] == min(cf, key=cf.get)
+
+        pos = ("GK", "Back", "Forward")[step % 3]
+        player_out = state.team[pos][rng.integers(len(state.team[pos]))]
+        player_in = rng.choice([p for p in pool[pos] if p not in state.team[pos]])
+        state.swap(pos, player_out, int(player_in))